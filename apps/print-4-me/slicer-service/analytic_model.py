@@ -0,0 +1,156 @@
+"""
+Analytic grams / print-time model for instant quotes.
+Predicts from mesh geometry and slicing settings; coefficients are refit
+against real PrusaSlicer results recorded by the exact estimate path.
+"""
+
+import json
+import math
+import logging
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+logger = logging.getLogger("slicer-api.analytic")
+
+FEATURES = ("shell_mm3", "infill_mm3", "support_mm3", "layers", "bias")
+MIN_SAMPLES = 10
+MAX_SAMPLES = 5000
+REFIT_EVERY = 10
+RIDGE = 1.0
+
+
+@dataclass
+class PrintSettings:
+    perimeters: int = 2
+    extrusion_width_mm: float = 0.45
+    top_bottom_layers: int = 4
+    filament_density: float = 1.24  # g/cm3 (PLA)
+    filament_diameter_mm: float = 1.75
+
+
+def features(stats: dict, layer_height: float, infill_percent: int, supports: bool,
+             settings: PrintSettings) -> np.ndarray:
+    """Approximate extruded volumes per feature class from mesh stats."""
+    volume = stats["volume_mm3"]
+    horizontal = stats["horizontal_area_mm2"]
+    side = max(stats["surface_area_mm2"] - horizontal, 0.0)
+
+    shell = side * settings.perimeters * settings.extrusion_width_mm
+    shell += horizontal * settings.top_bottom_layers * layer_height / 2  # top + bottom faces
+    shell = min(shell, volume)
+    infill = (volume - shell) * infill_percent / 100.0
+
+    support = 0.0
+    if supports:
+        x, y, z = stats["bbox_mm"]
+        support = max(x * y * z - volume, 0.0)
+
+    return np.array([shell, infill, support, stats["layers"] or 0, 1.0])
+
+
+class AnalyticModel:
+    """
+    Linear model over FEATURES for grams and seconds.
+    Samples are appended to a JSONL file and the model is ridge-fit towards
+    the physical defaults, so a handful of samples cannot produce nonsense.
+    """
+
+    def __init__(self, samples_path: Path, settings: PrintSettings):
+        self.samples_path = samples_path
+        self.settings = settings
+        grams_per_mm3 = settings.filament_density / 1000.0
+        # Shell ~8 mm3/s, infill/support ~15 mm3/s, ~2 s travel per layer, 1 min warm-up
+        self.default_grams = np.array([grams_per_mm3, grams_per_mm3, 0.1 * grams_per_mm3, 0.0, 0.0])
+        self.default_seconds = np.array([1 / 8, 1 / 15, 0.1 / 15, 2.0, 60.0])
+        self.coef_grams = self.default_grams.copy()
+        self.coef_seconds = self.default_seconds.copy()
+        self.samples: list[tuple[list[float], float, float]] = []
+        self._since_fit = 0
+        self._lock = threading.Lock()
+        self._load()
+
+    @property
+    def calibrated(self) -> bool:
+        return len(self.samples) >= MIN_SAMPLES
+
+    def _load(self) -> None:
+        if not self.samples_path.exists():
+            return
+        with open(self.samples_path) as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                    self.samples.append((rec["features"], rec["grams"], rec["seconds"]))
+                except (ValueError, KeyError):
+                    continue
+        self.samples = self.samples[-MAX_SAMPLES:]
+        self.fit()
+        logger.info(f"Loaded {len(self.samples)} calibration samples from {self.samples_path}")
+
+    @staticmethod
+    def _ridge(X: np.ndarray, y: np.ndarray, prior: np.ndarray) -> np.ndarray:
+        scale = np.sqrt((X ** 2).mean(axis=0))
+        scale[scale == 0] = 1.0
+        Xs = X / scale
+        A = Xs.T @ Xs + RIDGE * np.eye(X.shape[1])
+        b = Xs.T @ y + RIDGE * prior * scale
+        return np.linalg.solve(A, b) / scale
+
+    def fit(self) -> None:
+        if not self.calibrated:
+            return
+        X = np.array([s[0] for s in self.samples])
+        grams = np.array([s[1] for s in self.samples])
+        seconds = np.array([s[2] for s in self.samples])
+        self.coef_grams = self._ridge(X, grams, self.default_grams)
+        self.coef_seconds = self._ridge(X, seconds, self.default_seconds)
+        self._since_fit = 0
+
+    def predict(self, stats: dict, layer_height: float, infill_percent: int, supports: bool,
+                settings: Optional[PrintSettings] = None) -> dict:
+        """settings overrides the defaults, e.g. with values from the selected profiles."""
+        settings = settings or self.settings
+        f = features(stats, layer_height, infill_percent, supports, settings)
+        grams = max(float(f @ self.coef_grams), 0.0)
+        seconds = max(float(f @ self.coef_seconds), 0.0)
+        filament_mm3 = grams / (settings.filament_density / 1000.0)
+        filament_area = math.pi * (settings.filament_diameter_mm / 2) ** 2
+        return {
+            "grams_used": round(grams, 2),
+            "print_time_seconds": int(seconds),
+            "layers": stats["layers"],
+            "filament_length_mm": round(filament_mm3 / filament_area, 2),
+        }
+
+    def record(self, stats: dict, layer_height: float, infill_percent: int, supports: bool,
+               actual: dict, settings: Optional[PrintSettings] = None) -> None:
+        """Add a real slicer result as a calibration sample."""
+        if not actual.get("grams_used") or not actual.get("print_time_seconds"):
+            return
+        f = features(stats, layer_height, infill_percent, supports, settings or self.settings).tolist()
+        sample = (f, float(actual["grams_used"]), float(actual["print_time_seconds"]))
+        with self._lock:
+            self.samples.append(sample)
+            self.samples = self.samples[-MAX_SAMPLES:]
+            try:
+                self.samples_path.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.samples_path, "a") as out:
+                    out.write(json.dumps({"features": f, "grams": sample[1], "seconds": sample[2]}) + "\n")
+            except OSError as e:
+                logger.warning(f"Failed to persist calibration sample: {e}")
+            self._since_fit += 1
+            if self._since_fit >= REFIT_EVERY:
+                self.fit()
+
+    def stats(self) -> dict:
+        return {
+            "samples": len(self.samples),
+            "calibrated": self.calibrated,
+            "features": list(FEATURES),
+            "coef_grams": [round(float(c), 6) for c in self.coef_grams],
+            "coef_seconds": [round(float(c), 6) for c in self.coef_seconds],
+        }
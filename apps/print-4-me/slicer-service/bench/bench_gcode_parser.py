@@ -0,0 +1,81 @@
+"""
+Benchmark G-code metadata parsing on large synthetic files.
+
+    python bench/bench_gcode_parser.py --size-mb 50 200
+
+Compares the previous header-only line scan against the mmap footer scan,
+and times the optional single-pass per-layer analysis.
+"""
+
+import re
+import sys
+import time
+import argparse
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from gcode_parser import analyze_layers, parse_gcode_metadata  # noqa: E402
+from synthetic import write_gcode  # noqa: E402
+
+
+def legacy_parse(gcode_path: Path) -> dict:
+    """The pre-mmap implementation: line scan of the leading comment block."""
+    result = {"grams_used": 0.0, "print_time_seconds": 0, "layers": None, "filament_length_mm": None}
+    with open(gcode_path, "r", errors="ignore") as f:
+        header_lines = []
+        for line in f:
+            if not line.startswith(";"):
+                if header_lines:
+                    break
+                continue
+            header_lines.append(line)
+        header = "\n".join(header_lines)
+        m = re.search(r"filament used \[g\]\s*=\s*([\d.]+)", header)
+        if m:
+            result["grams_used"] = round(float(m.group(1)), 2)
+        m = re.search(r"total layers count\s*=\s*(\d+)", header)
+        if m:
+            result["layers"] = int(m.group(1))
+    return result
+
+
+def timed(fn, *args, repeat: int = 3):
+    best = float("inf")
+    value = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, value
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=float, nargs="+", default=[10, 100])
+    parser.add_argument("--skip-layers", action="store_true", help="skip the per-layer pass")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for size_mb in args.size_mb:
+            path = Path(tmp) / f"bench_{size_mb:g}mb.gcode"
+            expected = write_gcode(path, size_mb=size_mb)
+            actual_mb = path.stat().st_size / (1024 * 1024)
+            print(f"\n== {actual_mb:.1f} MB, {expected['layers']} layers ==")
+
+            t, legacy = timed(legacy_parse, path)
+            print(f"legacy header scan   {t * 1000:9.2f} ms  grams={legacy['grams_used']}")
+
+            t, meta = timed(parse_gcode_metadata, path)
+            ok = meta == expected
+            print(f"mmap footer scan     {t * 1000:9.2f} ms  grams={meta['grams_used']}  matches={ok}")
+
+            if not args.skip_layers:
+                t, layers = timed(analyze_layers, path, repeat=1)
+                print(f"per-layer analysis   {t * 1000:9.2f} ms  layers={len(layers)}  "
+                      f"({actual_mb / t:.1f} MB/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Stand-in for PRUSA_SLICER_BIN in benchmarks and load tests.
+
+    PRUSA_SLICER_BIN=bench/fake_slicer.py uvicorn slicer_api:app
+
+Accepts the PrusaSlicer CLI used by slicer_api, emulates runtime and memory
+proportional to the input STL and writes G-code with realistic header,
+layers and footer stats. Several STLs with --merge produce one plate with
+labelled objects, like PrusaSlicer. Tuned via env:
+
+    FAKE_SLICER_SECONDS         base runtime (default 0.5)
+    FAKE_SLICER_SECONDS_PER_MB  extra runtime per MB of STL (default 0.2)
+    FAKE_SLICER_BUSY            1 = burn CPU instead of sleeping
+    FAKE_SLICER_MEMORY_MB       resident memory to hold while "slicing"
+    FAKE_SLICER_GCODE_MB        G-code output size (default 2)
+    FAKE_SLICER_FAIL_RATE       fraction of runs that exit non-zero
+"""
+
+import os
+import sys
+import time
+import zlib
+import random
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from synthetic import write_gcode  # noqa: E402
+
+# PrusaSlicer's console progress lines, printed as the emulated run advances
+STAGES = [
+    (10, "Processing triangulated mesh"),
+    (20, "Generating perimeters"),
+    (30, "Preparing infill"),
+    (45, "Making infill"),
+    (70, "Generating skirt and brim"),
+    (88, "Exporting G-code"),
+]
+
+
+def arg_value(args: list[str], name: str, default=None):
+    if name in args:
+        return args[args.index(name) + 1]
+    return default
+
+
+def main() -> int:
+    args = sys.argv[1:]
+    output = arg_value(args, "--output")
+    if output is None or not args:
+        print("fake_slicer: --output is required", file=sys.stderr)
+        return 2
+    stls = [Path(a) for a in args if a.lower().endswith(".stl")]
+    sizes = [stl.stat().st_size / (1024 * 1024) for stl in stls]
+    stl_mb = sum(sizes)
+
+    # Derive stable "results" from the input so repeated runs agree
+    seed = 0
+    for stl in stls:
+        with open(stl, "rb") as f:
+            seed = zlib.crc32(f.read(1024 * 1024), seed)
+    rng = random.Random(seed)
+    if rng.random() < float(os.getenv("FAKE_SLICER_FAIL_RATE", "0")):
+        print("Error: emulated slicing failure", file=sys.stderr)
+        return 1
+
+    ballast = bytearray(int(float(os.getenv("FAKE_SLICER_MEMORY_MB", "0")) * 1024 * 1024))
+    for i in range(0, len(ballast), 4096):
+        ballast[i] = 1  # touch each page so it counts towards RSS
+
+    runtime = float(os.getenv("FAKE_SLICER_SECONDS", "0.5"))
+    runtime += stl_mb * float(os.getenv("FAKE_SLICER_SECONDS_PER_MB", "0.2"))
+    busy = os.getenv("FAKE_SLICER_BUSY", "0") == "1"
+    for percent, message in STAGES:
+        print(f"{percent} => {message}", flush=True)
+        deadline = time.monotonic() + runtime / len(STAGES)
+        if busy:
+            while time.monotonic() < deadline:
+                pass
+        else:
+            time.sleep(runtime / len(STAGES))
+
+    layer_height = float(arg_value(args, "--layer-height", "0.2"))
+    meta = write_gcode(
+        Path(output),
+        size_mb=float(os.getenv("FAKE_SLICER_GCODE_MB", "2")),
+        layer_height=layer_height,
+        grams=round(5 + stl_mb * 10 + rng.uniform(0, 5), 2),
+        print_time_seconds=int(600 + stl_mb * 1800 + rng.uniform(0, 300)),
+        seed=seed,
+        objects=[(stl.name, size) for stl, size in zip(stls, sizes)] if "--merge" in args else None,
+    )
+    print(f"Slicing result exported to {output}")
+    print(f"Done. {meta['layers']} layers, {meta['grams_used']} g")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,317 @@
+"""
+Load test /estimate and /slice against a local slicer service.
+
+    python bench/load_test.py --concurrency 1 4 16 --requests 40 \
+        --env SLICER_WORKERS=4 --output bench-results/$(git rev-parse --short HEAD).json
+    python bench/load_test.py ... --compare bench-results/<baseline>.json
+
+By default this starts the synthetic STL server and the API (uvicorn, with
+bench/fake_slicer.py as PRUSA_SLICER_BIN) in throwaway directories, so runs
+are reproducible across commits. Pass --base-url to hit a running service
+instead (peak memory is then only reported with --server-pid).
+
+Reports p50/p95/p99 latency of successful requests, requests/sec, status
+counts and the peak RSS of the service process tree per endpoint and
+concurrency level.
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import signal
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+import threading
+from pathlib import Path
+from typing import Optional
+
+import httpx
+
+BENCH_DIR = Path(__file__).resolve().parent
+SERVICE_DIR = BENCH_DIR.parent
+sys.path.insert(0, str(BENCH_DIR))
+
+from stl_server import start_server  # noqa: E402
+
+
+def percentile(values: list[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile; None for no samples."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(q / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def tree_rss_bytes(root_pid: int) -> int:
+    """Sum of VmRSS over root_pid and all its descendants, from /proc."""
+    children: dict[int, list[int]] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # Field 4 is the ppid; comm may contain spaces, so split after ')'
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+
+    total = 0
+    stack = [root_pid]
+    while stack:
+        pid = stack.pop()
+        stack.extend(children.get(pid, []))
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+                        break
+        except OSError:
+            continue
+    return total
+
+
+class MemorySampler:
+    """Polls the RSS of a process tree in a background thread and keeps the peak."""
+
+    def __init__(self, pid: Optional[int], interval: float = 0.05):
+        self.pid = pid
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, tree_rss_bytes(self.pid))
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        if self.pid:
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self.pid:
+            self._thread.join()
+
+
+def start_service(port: int, env_overrides: dict, workdir: Path, verbose: bool = False) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.update({
+        "PRUSA_SLICER_BIN": str(BENCH_DIR / "fake_slicer.py"),
+        "SLICER_WORKDIR": str(workdir / "work"),
+        "SLICER_CACHE_DIR": str(workdir / "cache"),
+        "PROFILES_DIR": str(workdir / "profiles"),
+    })
+    env.update(env_overrides)
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "slicer_api:app", "--port", str(port), "--log-level", "warning"],
+        cwd=SERVICE_DIR, env=env,
+        stdout=None if verbose else subprocess.DEVNULL,
+        stderr=None if verbose else subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"Service exited with {proc.returncode}")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health", timeout=1).status_code == 200:
+                return proc
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("Service did not become healthy within 30s")
+
+
+def make_payload(endpoint: str, stl_url: str, mode: str) -> dict:
+    if endpoint == "slice":
+        return {"stl_url": stl_url, "order_id": uuid.uuid4().hex[:16]}
+    return {"stl_url": stl_url, "mode": mode}
+
+
+async def run_level(client: httpx.AsyncClient, base_url: str, endpoint: str, concurrency: int,
+                    total: int, stl_url_for, mode: str) -> dict:
+    latencies: list[float] = []
+    statuses: dict[str, int] = {}
+    queue: asyncio.Queue = asyncio.Queue()
+    for i in range(total):
+        queue.put_nowait(i)
+
+    async def worker():
+        while True:
+            try:
+                i = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            payload = make_payload(endpoint, stl_url_for(i), mode)
+            start = time.perf_counter()
+            try:
+                resp = await client.post(f"{base_url}/{endpoint}", json=payload)
+                status = str(resp.status_code)
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            elapsed = time.perf_counter() - start
+            statuses[status] = statuses.get(status, 0) + 1
+            if status.startswith("2"):
+                latencies.append(elapsed)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - start
+
+    def ms(value):
+        return None if value is None else round(value * 1000, 1)
+
+    return {
+        "endpoint": endpoint,
+        "concurrency": concurrency,
+        "requests": total,
+        "ok": len(latencies),
+        "statuses": dict(sorted(statuses.items())),
+        "wall_seconds": round(wall, 3),
+        "rps": round(len(latencies) / wall, 3) if wall else None,
+        "p50_ms": ms(percentile(latencies, 50)),
+        "p95_ms": ms(percentile(latencies, 95)),
+        "p99_ms": ms(percentile(latencies, 99)),
+        "max_ms": ms(max(latencies) if latencies else None),
+    }
+
+
+def git_revision() -> Optional[str]:
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=SERVICE_DIR,
+                             capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--", "."], cwd=SERVICE_DIR,
+                               capture_output=True, text=True).stdout.strip()
+        return rev + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_table(results: list[dict], baseline: Optional[dict] = None) -> None:
+    base = {}
+    if baseline:
+        base = {(r["endpoint"], r["concurrency"]): r for r in baseline["results"]}
+        print(f"\nComparing against {baseline.get('commit')} ({baseline.get('timestamp')})")
+
+    def fmt(row, key):
+        value = row.get(key)
+        if value is None:
+            return "-"
+        old = base.get((row["endpoint"], row["concurrency"]), {}).get(key)
+        if not old:
+            return f"{value}"
+        change = (value - old) / old * 100
+        return f"{value} ({change:+.0f}%)"
+
+    header = f"{'endpoint':<10}{'conc':>5}{'ok':>6}  {'rps':<16}{'p50 ms':<18}{'p95 ms':<18}{'p99 ms':<18}{'peak MB':<14}statuses"
+    print("\n" + header)
+    print("-" * len(header))
+    for row in results:
+        print(f"{row['endpoint']:<10}{row['concurrency']:>5}{row['ok']:>6}  "
+              f"{fmt(row, 'rps'):<16}{fmt(row, 'p50_ms'):<18}{fmt(row, 'p95_ms'):<18}"
+              f"{fmt(row, 'p99_ms'):<18}{fmt(row, 'peak_rss_mb'):<14}{row['statuses']}")
+
+
+async def run(args, base_url: str, stl_base: str, server_pid: Optional[int]) -> list[dict]:
+    results = []
+    limits = httpx.Limits(max_connections=max(args.concurrency) + 4)
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        level = 0
+        for endpoint in args.endpoints:
+            for concurrency in args.concurrency:
+                level += 1
+
+                def stl_url_for(i, level=level):
+                    # Distinct seeds defeat the result cache unless --same-stl is given
+                    seed = 0 if args.same_stl else level * 1_000_000 + i
+                    return f"{stl_base}/model.stl?size_mb={args.stl_mb:g}&seed={seed}"
+
+                with MemorySampler(server_pid) as mem:
+                    row = await run_level(client, base_url, endpoint, concurrency, args.requests,
+                                          stl_url_for, args.mode)
+                row["peak_rss_mb"] = round(mem.peak / (1024 * 1024), 1) if server_pid else None
+                results.append(row)
+                print(f"{endpoint} x{concurrency}: {row['ok']}/{row['requests']} ok, "
+                      f"{row['rps']} rps, p95 {row['p95_ms']} ms", flush=True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoints", nargs="+", choices=["estimate", "slice"], default=["estimate", "slice"])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=40, help="requests per endpoint and level")
+    parser.add_argument("--stl-mb", type=float, default=2.0)
+    parser.add_argument("--same-stl", action="store_true", help="reuse one STL (measures cache hits)")
+    parser.add_argument("--mode", choices=["exact", "fast"], default="exact", help="/estimate mode")
+    parser.add_argument("--timeout", type=float, default=900)
+    parser.add_argument("--base-url", help="existing service; skips starting one")
+    parser.add_argument("--server-pid", type=int, help="pid to sample memory from with --base-url")
+    parser.add_argument("--port", type=int, default=8799, help="port for the spawned service")
+    parser.add_argument("--env", nargs="*", default=[], metavar="KEY=VALUE",
+                        help="extra env for the spawned service, e.g. SLICER_WORKERS=4 FAKE_SLICER_SECONDS=1")
+    parser.add_argument("--verbose", action="store_true", help="show the spawned service's log")
+    parser.add_argument("--output", type=Path, help="write results as JSON")
+    parser.add_argument("--compare", type=Path, help="baseline JSON from an earlier run")
+    args = parser.parse_args()
+
+    env_overrides = dict(item.split("=", 1) for item in args.env)
+    stl_server = start_server(0)
+    stl_base = f"http://127.0.0.1:{stl_server.server_port}"
+
+    service = None
+    with tempfile.TemporaryDirectory(prefix="slicer-bench-") as tmp:
+        try:
+            if args.base_url:
+                base_url, server_pid = args.base_url.rstrip("/"), args.server_pid
+            else:
+                service = start_service(args.port, env_overrides, Path(tmp), args.verbose)
+                base_url, server_pid = f"http://127.0.0.1:{args.port}", service.pid
+            results = asyncio.run(run(args, base_url, stl_base, server_pid))
+        finally:
+            if service is not None:
+                service.send_signal(signal.SIGINT)
+                try:
+                    service.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    service.kill()
+            stl_server.shutdown()
+
+    report = {
+        "commit": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "host": {"python": platform.python_version(), "cpus": os.cpu_count(), "machine": platform.machine()},
+        "config": {
+            "requests": args.requests,
+            "stl_mb": args.stl_mb,
+            "same_stl": args.same_stl,
+            "mode": args.mode,
+            "base_url": args.base_url,
+            "env": env_overrides,
+        },
+        "results": results,
+    }
+    baseline = json.loads(args.compare.read_text()) if args.compare else None
+    if baseline and baseline.get("config") != report["config"]:
+        print("warning: baseline was run with a different config", file=sys.stderr)
+    print_table(results, baseline)
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(report, indent=2) + "\n")
+        print(f"\nWrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Local HTTP server for synthetic STLs.
+
+    python bench/stl_server.py --port 8765
+
+GET /model.stl?size_mb=5&seed=3 returns a binary sphere STL of about that
+size. Bodies are generated once per (size, seed) and kept in memory, so the
+server itself is not the bottleneck under load.
+"""
+
+import sys
+import argparse
+import threading
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from synthetic import stl_bytes  # noqa: E402
+
+
+@lru_cache(maxsize=256)
+def cached_stl(size_mb: float, seed: int) -> bytes:
+    return stl_bytes(size_mb, seed=seed)
+
+
+class STLHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if not url.path.endswith(".stl"):
+            self.send_error(404)
+            return
+        query = parse_qs(url.query)
+        try:
+            size_mb = float(query.get("size_mb", ["5"])[0])
+            seed = int(query.get("seed", ["0"])[0])
+        except ValueError:
+            self.send_error(400, "size_mb and seed must be numbers")
+            return
+        body = cached_stl(size_mb, seed)
+        self.send_response(200)
+        self.send_header("Content-Type", "model/stl")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(port: int = 0) -> ThreadingHTTPServer:
+    """Serve in a daemon thread; port 0 picks a free port (see server.server_port)."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), STLHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), STLHandler)
+    print(f"Serving synthetic STLs on http://127.0.0.1:{args.port}/model.stl?size_mb=5&seed=0")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Synthetic PrusaSlicer-style artifacts for benchmarks.
+"""
+
+import math
+import random
+import struct
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+CONFIG_KEYS = 1200  # PrusaSlicer dumps ~1000+ settings after the stats block
+STL_FACET_BYTES = 50
+
+
+def write_gcode(
+    path: Path,
+    size_mb: float = 10.0,
+    layer_height: float = 0.2,
+    grams: float = 42.17,
+    print_time_seconds: int = 3 * 3600 + 25 * 60 + 7,
+    seed: int = 0,
+    objects: Optional[list[tuple[str, float]]] = None,
+) -> dict:
+    """
+    Write a G-code file of roughly size_mb with PrusaSlicer's header, layer
+    markers, relative extrusion moves and trailing stats/config block.
+    objects, as (name, weight) pairs, splits each layer's moves between
+    labelled objects like a multi-object plate. Returns the values written
+    into the stats block.
+    """
+    rng = random.Random(seed)
+    target = int(size_mb * 1024 * 1024)
+    moves_per_layer = 400
+    length_mm = grams / 1.24 * 1000 / (math.pi * 0.875 ** 2)
+
+    with open(path, "w") as f:
+        f.write("; generated by PrusaSlicer 2.7.4+linux-x64-GTK3 on 2024-03-27 at 14:17:00 UTC\n\n")
+        f.write(";\n; external perimeters extrusion width = 0.45mm\n; perimeters extrusion width = 0.45mm\n")
+        f.write("; infill extrusion width = 0.45mm\n;\n\n")
+        f.write("M73 P0 R205\nM107\nM190 S60\nM109 S215\nG21\nG90\nM83\nG92 E0\n")
+
+        layer = 0
+        while f.tell() < target:
+            layer += 1
+            z = round(layer * layer_height, 3)
+            f.write(f";LAYER_CHANGE\n;Z:{z}\n;HEIGHT:{layer_height}\n")
+            f.write(f"G1 Z{z:.3f} F720\n")
+            x, y = 100.0, 100.0
+            labelled = objects or [(None, 1.0)]
+            total_weight = sum(w for _, w in labelled)
+            for obj_id, (name, weight) in enumerate(labelled):
+                if name is not None:
+                    f.write(f"; printing object {name} id:{obj_id} copy 0\n")
+                for i in range(max(1, int(moves_per_layer * weight / total_weight))):
+                    x += rng.uniform(-2, 2)
+                    y += rng.uniform(-2, 2)
+                    if i % 25 == 0:
+                        f.write(f"G1 X{x:.3f} Y{y:.3f} F9000\n")
+                    else:
+                        f.write(f"G1 X{x:.3f} Y{y:.3f} E{rng.uniform(0.01, 0.09):.5f} F2400\n")
+                if name is not None:
+                    f.write(f"; stop printing object {name} id:{obj_id} copy 0\n")
+            f.write(f"M73 P{min(99, layer)} R{max(0, 205 - layer)}\n")
+
+        hours, rem = divmod(print_time_seconds, 3600)
+        minutes, seconds = divmod(rem, 60)
+        f.write("M107\nM104 S0\nM140 S0\nM84\n\n")
+        f.write(f"; filament used [mm] = {length_mm:.2f}\n")
+        f.write(f"; filament used [cm3] = {grams / 1.24:.2f}\n")
+        f.write(f"; filament used [g] = {grams:.2f}\n")
+        f.write(f"; filament cost = {grams * 0.025:.2f}\n")
+        f.write(f"; total filament used [g] = {grams:.2f}\n")
+        f.write(f"; total layers count = {layer}\n")
+        f.write(f"; estimated printing time (normal mode) = {hours}h {minutes}m {seconds}s\n")
+        f.write("; estimated first layer printing time (normal mode) = 1m 12s\n\n")
+        f.write("; prusaslicer_config = begin\n")
+        for i in range(CONFIG_KEYS):
+            f.write(f"; setting_{i:04d} = value_{rng.randint(0, 10 ** 6)}\n")
+        f.write("; prusaslicer_config = end\n")
+
+    return {
+        "grams_used": round(grams, 2),
+        "print_time_seconds": print_time_seconds,
+        "layers": layer,
+        "filament_length_mm": round(length_mm, 2),
+    }
+
+
+def stl_bytes(size_mb: float = 5.0, radius_mm: float = 30.0, seed: int = 0) -> bytes:
+    """
+    Binary STL of a closed, slightly perturbed UV sphere with roughly
+    size_mb worth of facets. Different seeds give different content (and
+    therefore different cache keys) at the same size.
+    """
+    facets = max(8, int(size_mb * 1024 * 1024) // STL_FACET_BYTES)
+    # A UV sphere with n rings and 2n segments has ~4n^2 triangles
+    rings = max(2, int(math.sqrt(facets / 4)))
+    segments = 2 * rings
+    rng = np.random.default_rng(seed)
+
+    theta = np.linspace(0, math.pi, rings + 1)
+    phi = np.linspace(0, 2 * math.pi, segments + 1)
+    r = radius_mm * (1 + 0.02 * rng.standard_normal((rings + 1, segments + 1)))
+    r[:, -1] = r[:, 0]  # close the seam
+    r[0, :], r[-1, :] = r[0, 0], r[-1, 0]  # single pole vertices
+    t, p = np.meshgrid(theta, phi, indexing="ij")
+    verts = np.stack([r * np.sin(t) * np.cos(p), r * np.sin(t) * np.sin(p), r * np.cos(t) + radius_mm], axis=-1)
+
+    a, b = verts[:-1, :-1], verts[1:, :-1]
+    c, d = verts[1:, 1:], verts[:-1, 1:]
+    tris = np.concatenate([np.stack([a, b, c], axis=2), np.stack([a, c, d], axis=2)]).reshape(-1, 3, 3)
+
+    data = np.zeros(len(tris), dtype=[("normal", "<f4", 3), ("v", "<f4", (3, 3)), ("attr", "<u2")])
+    data["v"] = tris
+    header = f"synthetic sphere seed={seed}".encode().ljust(80, b" ")
+    return header + struct.pack("<I", len(tris)) + data.tobytes()
+
+
+def write_stl(path: Path, size_mb: float = 5.0, seed: int = 0) -> int:
+    """Write stl_bytes() to path; returns the file size."""
+    data = stl_bytes(size_mb, seed=seed)
+    path.write_bytes(data)
+    return len(data)
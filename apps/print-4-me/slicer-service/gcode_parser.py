@@ -0,0 +1,400 @@
+"""
+Fast G-code metadata extraction for PrusaSlicer output.
+The file is memory-mapped; statistics are found by reverse-scanning the
+trailing comment block (where PrusaSlicer writes them) and then the header,
+so a multi-hundred-MB file costs a few page faults instead of a full read.
+"""
+
+import re
+import mmap
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+# PrusaSlicer writes stats just before its ~50 KB config dump at the end
+TAIL_WINDOW = 512 * 1024
+HEAD_WINDOW = 64 * 1024
+
+# Comment keys located with rfind; values are parsed by the patterns below
+KEY_GRAMS_TOTAL = b"; total filament used [g] ="
+KEY_GRAMS = b"; filament used [g] ="
+KEY_MM = b"; filament used [mm] ="
+KEY_TIME = b"; estimated printing time (normal mode) ="
+KEY_LAYERS = b"; total layers count ="
+
+NUMBER_LIST_RE = re.compile(rb"[\d.]+")
+DURATION_RE = re.compile(rb"(\d+)\s*([dhms])")
+DURATION_UNITS = {b"d": 86400, b"h": 3600, b"m": 60, b"s": 1}
+STDOUT_GRAMS_RE = re.compile(r"([\d.]+)\s*g")
+# PrusaSlicer console progress ("30 => Generating perimeters") and export line
+STDOUT_PROGRESS_RE = re.compile(r"^\s*(\d{1,3})\s*=>\s*(.+?)\s*$")
+STDOUT_EXPORTED = "Slicing result exported to"
+
+# Per-layer analysis works on line-aligned chunks of the mapped file
+LAYER_CHUNK = 8 * 1024 * 1024
+NUMBER_WIDTH = 16
+POWERS = 10.0 ** np.arange(NUMBER_WIDTH + 1)
+NEWLINE, CR, SPACE, SEMICOLON = ord("\n"), ord("\r"), ord(" "), ord(";")
+ZERO, DOT, MINUS = ord("0"), ord("."), ord("-")
+AXIS_LETTERS = np.frombuffer(b"XYZEF", dtype=np.uint8)
+AXIS_INDEX = np.zeros(256, dtype=np.intp)
+AXIS_INDEX[AXIS_LETTERS] = np.arange(AXIS_LETTERS.size)
+
+# Object labels: "; printing object <name> id:N copy 0" ... "; stop printing object",
+# or Marlin/Prusa firmware labels "M486 S<N>" ... "M486 S-1"
+OBJECT_START = b"; printing object "
+OBJECT_STOP = b"; stop printing object "
+OBJECT_FIRMWARE = b"\nM486 S"
+OBJECT_ID_RE = re.compile(rb"id:(\d+)")
+M486_ID_RE = re.compile(rb"M486 S(-?\d+)\s*$")
+
+
+def _line_value(buf, key: bytes, start: int, end: int) -> Optional[bytes]:
+    """Return the text after key on its last occurrence within [start, end)."""
+    pos = buf.rfind(key, start, end)
+    if pos < 0:
+        return None
+    value_start = pos + len(key)
+    eol = buf.find(b"\n", value_start, end)
+    return bytes(buf[value_start:eol if eol >= 0 else end]).strip()
+
+
+def _find(buf, key: bytes) -> Optional[bytes]:
+    size = len(buf)
+    tail_start = max(0, size - TAIL_WINDOW)
+    value = _line_value(buf, key, tail_start, size)
+    if value is None and tail_start > 0:
+        value = _line_value(buf, key, 0, min(HEAD_WINDOW, tail_start))
+    return value
+
+
+def _sum_numbers(value: Optional[bytes]) -> Optional[float]:
+    if not value:
+        return None
+    numbers = NUMBER_LIST_RE.findall(value)
+    return sum(float(n) for n in numbers) if numbers else None
+
+
+def parse_duration(value: bytes) -> int:
+    """'1d 2h 3m 4s' -> seconds."""
+    return sum(int(n) * DURATION_UNITS[u] for n, u in DURATION_RE.findall(value))
+
+
+def parse_gcode_metadata(gcode_path: Path) -> dict:
+    """Extract grams, filament length, print time and layer count."""
+    result = {
+        "grams_used": 0.0,
+        "print_time_seconds": 0,
+        "layers": None,
+        "filament_length_mm": None,
+    }
+    if gcode_path.stat().st_size == 0:
+        return result
+
+    with open(gcode_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        grams = _sum_numbers(_find(mm, KEY_GRAMS_TOTAL)) or _sum_numbers(_find(mm, KEY_GRAMS))
+        if grams:
+            result["grams_used"] = round(grams, 2)
+
+        length = _sum_numbers(_find(mm, KEY_MM))
+        if length is not None:
+            result["filament_length_mm"] = round(length, 2)
+
+        duration = _find(mm, KEY_TIME)
+        if duration:
+            result["print_time_seconds"] = parse_duration(duration)
+
+        layers = _find(mm, KEY_LAYERS)
+        if layers and layers.isdigit():
+            result["layers"] = int(layers)
+
+    return result
+
+
+def grams_from_stdout(output: str) -> Optional[float]:
+    """Last-resort grams value from PrusaSlicer's console output."""
+    m = STDOUT_GRAMS_RE.search(output)
+    return round(float(m.group(1)), 2) if m else None
+
+
+def progress_from_line(line: str) -> Optional[tuple[int, str]]:
+    """(percent, stage) for a PrusaSlicer progress line, else None."""
+    m = STDOUT_PROGRESS_RE.match(line)
+    if not m:
+        return None
+    return min(int(m.group(1)), 100), m.group(2)
+
+
+def _ffill(values: np.ndarray, mask: np.ndarray, initial: float) -> np.ndarray:
+    """Carry the last set value forward; rows before the first use initial."""
+    idx = np.where(mask, np.arange(mask.size), -1)
+    np.maximum.accumulate(idx, out=idx)
+    return np.where(idx >= 0, values[idx.clip(0)], initial)
+
+
+def _parse_numbers(buf: np.ndarray, pos: np.ndarray) -> np.ndarray:
+    """
+    Vectorized parse of ASCII decimals ('-12.345') starting at each pos:
+    one Horner step per character column, stopping once every number ended.
+    """
+    last = buf.size - 1
+    neg = buf[np.minimum(pos, last)] == MINUS
+    pos = pos + neg
+    mantissa = np.zeros(pos.size, dtype=np.int64)
+    decimals = np.zeros(pos.size, dtype=np.int64)
+    active = np.ones(pos.size, dtype=bool)
+    seen_dot = np.zeros(pos.size, dtype=bool)
+    for offset in range(NUMBER_WIDTH):
+        c = buf[np.minimum(pos + offset, last)]
+        digit = active & (c >= ZERO) & (c <= ZERO + 9)
+        dot = active & (c == DOT) & ~seen_dot
+        active = digit | dot
+        if not active.any():
+            break
+        mantissa = np.where(digit, mantissa * 10 + (c.astype(np.int64) - ZERO), mantissa)
+        decimals += digit & seen_dot
+        seen_dot |= dot
+    values = mantissa / POWERS[decimals]
+    values[neg] *= -1
+    return values
+
+
+class _LayerState:
+    """Running per-layer totals plus machine state carried across chunks."""
+
+    def __init__(self):
+        self.x = self.y = self.z = self.e = 0.0
+        self.feed = 1500.0  # mm/min
+        self.relative = False
+        self.layer = -1
+        self.z_heights: list[float] = []
+        self.extrusion = np.zeros(0)
+        self.seconds = np.zeros(0)
+        self.moves = np.zeros(0)
+        # Per object id, shifted by one so slot 0 collects moves outside any object
+        self.object = -1
+        self.object_extrusion = np.zeros(0)
+        self.object_seconds = np.zeros(0)
+        self.object_top = np.zeros(0, dtype=np.int64)  # last layer index with extrusion, -1 if none
+
+    def accumulate(self, buf: np.ndarray, offset: int = 0, markers=None) -> None:
+        """
+        Process one chunk of whole lines starting at file offset. markers is
+        an optional (positions, object ids) pair of object label lines.
+        """
+        newlines = np.flatnonzero(buf == NEWLINE)
+        starts = np.concatenate(([0], newlines[:-1] + 1)) if buf[-1] == NEWLINE else \
+            np.concatenate(([0], newlines + 1))
+        first = buf[starts]
+        second = buf[np.minimum(starts + 1, buf.size - 1)]
+        third = buf[np.minimum(starts + 2, buf.size - 1)]
+        fourth = buf[np.minimum(starts + 3, buf.size - 1)]
+        ends_word = lambda c: (c == SPACE) | (c == NEWLINE) | (c == CR) | (c == SEMICOLON)  # noqa: E731
+
+        is_marker = (first == SEMICOLON) & (second == ord("Z")) & (third == ord(":"))
+        is_move = (first == ord("G")) & ((second == ZERO) | (second == ZERO + 1)) & ends_word(third)
+        is_g92 = (first == ord("G")) & (second == ZERO + 9) & (third == ZERO + 2) & ends_word(fourth)
+        is_mode = (first == ord("M")) & (second == ZERO + 8) & \
+            ((third == ZERO + 2) | (third == ZERO + 3)) & ends_word(fourth)
+        keep = is_marker | is_move | is_g92 | is_mode
+        if not keep.any():
+            self._carry_object(offset + buf.size, markers)
+            return
+        rows = np.flatnonzero(keep)
+        n = rows.size
+        is_marker, is_move, is_g92, is_mode = is_marker[rows], is_move[rows], is_g92[rows], is_mode[rows]
+        row_of_line = np.full(starts.size, -1)
+        row_of_line[rows] = np.arange(n)
+
+        # Axis words (" X12.3") on move and G92 lines, ignoring trailing comments
+        line_end = np.append(starts[1:], buf.size)
+        semis = np.flatnonzero(buf == SEMICOLON)
+        semi_line = np.searchsorted(starts, semis, side="right") - 1
+        code_end = line_end.copy()
+        uniq, first_semi = np.unique(semi_line, return_index=True)
+        code_end[uniq] = semis[first_semi]
+
+        spaces = np.flatnonzero(buf[:-1] == SPACE)
+        letters = buf[spaces + 1]
+        spaces = spaces[np.isin(letters, AXIS_LETTERS)]
+        word_line = np.searchsorted(starts, spaces, side="right") - 1
+        word_row = row_of_line[word_line]
+        usable = (word_row >= 0) & (spaces < code_end[word_line])
+        spaces, word_row = spaces[usable], word_row[usable]
+        usable = is_move[word_row] | is_g92[word_row]
+        spaces, word_row = spaces[usable], word_row[usable]
+        letters = buf[spaces + 1]
+        values = _parse_numbers(buf, spaces + 2)
+
+        # Scatter every word into a (5, rows) table in X Y Z E F order
+        axis = AXIS_INDEX[letters]
+        table = np.zeros((5, n))
+        present = np.zeros((5, n), dtype=bool)
+        table[axis, word_row] = values
+        present[axis, word_row] = True
+        x, y, z, e, feed = table
+        has_x, has_y, has_z, has_e, has_f = present
+
+        z_marker = _parse_numbers(buf, starts[rows[is_marker]] + 3)
+        set_relative = third[rows] == ZERO + 3
+
+        layer_idx = self.layer + np.cumsum(is_marker)
+        self.z_heights.extend(round(float(v), 4) for v in z_marker)
+
+        relative = _ffill(set_relative, is_mode, self.relative).astype(bool)
+        x = _ffill(x, has_x & is_move, self.x)
+        y = _ffill(y, has_y & is_move, self.y)
+        z = _ffill(z, has_z & is_move, self.z)
+        feed = _ffill(feed, has_f & is_move, self.feed)
+
+        dist = np.sqrt(
+            np.diff(x, prepend=self.x) ** 2
+            + np.diff(y, prepend=self.y) ** 2
+            + np.diff(z, prepend=self.z) ** 2
+        )
+
+        # Absolute E position: set by absolute-mode moves and by G92 E resets
+        g92_e = has_e & is_g92
+        has_e &= is_move
+        sets_pos = (has_e & ~relative) | g92_e
+        pos = _ffill(e, sets_pos, self.e)
+        prev_pos = np.concatenate(([self.e], pos[:-1]))
+        de = np.where(has_e, np.where(relative, e, e - prev_pos), 0.0)
+
+        dist = np.where((dist == 0) & has_e, np.abs(de), dist)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            seconds = np.where(feed > 0, dist / (feed / 60.0), 0.0)
+
+        valid = is_move & (layer_idx >= 0)
+        count = len(self.z_heights)
+        idx = layer_idx[valid]
+        extruded = np.where(de > 0, de, 0.0)
+        self.extrusion = self._add(self.extrusion, idx, extruded[valid], count)
+        self.seconds = self._add(self.seconds, idx, seconds[valid], count)
+        self.moves = self._add(self.moves, idx, None, count)
+
+        if markers is not None:
+            positions, ids = markers
+            # Each row belongs to the last object label at or before its line
+            k = np.searchsorted(positions, offset + starts[rows], side="right") - 1
+            obj = np.where(k >= 0, ids[k.clip(0)], self.object)
+            slots = (obj + 1)[is_move]
+            count = int(ids.max()) + 2 if ids.size else 1
+            self.object_extrusion = self._add(self.object_extrusion, slots, extruded[is_move], count)
+            self.object_seconds = self._add(self.object_seconds, slots, seconds[is_move], count)
+            if self.object_top.size < count:
+                self.object_top = np.concatenate(
+                    (self.object_top, np.full(count - self.object_top.size, -1, dtype=np.int64)))
+            printing = is_move & (extruded > 0) & (layer_idx >= 0)
+            np.maximum.at(self.object_top, (obj + 1)[printing], layer_idx[printing])
+            self._carry_object(offset + buf.size, markers)
+
+        self.x, self.y, self.z, self.feed = x[-1], y[-1], z[-1], feed[-1]
+        self.e = pos[-1]
+        self.relative = bool(relative[-1])
+        self.layer = int(layer_idx[-1])
+
+    def _carry_object(self, end: int, markers) -> None:
+        """Object label in effect at the end of a chunk carries into the next."""
+        if markers is None:
+            return
+        k = np.searchsorted(markers[0], end, side="right") - 1
+        if k >= 0:
+            self.object = int(markers[1][k])
+
+    @staticmethod
+    def _add(total: np.ndarray, idx: np.ndarray, weights, count: int) -> np.ndarray:
+        if total.size < count:
+            total = np.concatenate((total, np.zeros(count - total.size)))
+        if idx.size:
+            total += np.bincount(idx, weights=weights, minlength=count)
+        return total
+
+
+def _object_markers(mm: mmap.mmap) -> tuple[np.ndarray, np.ndarray]:
+    """Line offsets and object ids (-1 = stop) of every object label, in file order."""
+    found = []
+    for needle in (OBJECT_START, OBJECT_STOP, OBJECT_FIRMWARE):
+        pos = mm.find(needle)
+        while pos >= 0:
+            start = pos + 1 if needle.startswith(b"\n") else pos
+            end = mm.find(b"\n", start)
+            line = mm[start:end if end >= 0 else len(mm)]
+            if needle == OBJECT_START:
+                m = OBJECT_ID_RE.search(line)
+                if m:
+                    found.append((start, int(m.group(1))))
+            elif needle == OBJECT_STOP:
+                found.append((start, -1))
+            else:
+                m = M486_ID_RE.match(line)
+                if m:
+                    found.append((start, max(-1, int(m.group(1)))))
+            pos = mm.find(needle, start + 1)
+    found.sort()
+    return (np.array([p for p, _ in found], dtype=np.int64),
+            np.array([i for _, i in found], dtype=np.int64))
+
+
+def _scan(gcode_path: Path, objects: bool = False) -> _LayerState:
+    state = _LayerState()
+    size = gcode_path.stat().st_size
+    if size == 0:
+        return state
+
+    with open(gcode_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        markers = _object_markers(mm) if objects else None
+        start = 0
+        while start < size:
+            end = min(start + LAYER_CHUNK, size)
+            if end < size:
+                nl = mm.find(b"\n", end)
+                end = size if nl < 0 else nl + 1
+            state.accumulate(np.frombuffer(mm, dtype=np.uint8, count=end - start, offset=start), start, markers)
+            start = end
+    return state
+
+
+def analyze_objects(gcode_path: Path) -> dict[int, dict]:
+    """
+    Extruded filament (mm), kinematic move time and the layer count / Z up
+    to its last extruding layer per labelled object id, as used for
+    splitting a multi-object plate. Key -1 collects everything printed
+    outside an object label (skirt, wipe tower, travel between parts).
+    """
+    state = _scan(gcode_path, objects=True)
+    objects = {}
+    for slot in range(state.object_extrusion.size):
+        top = int(state.object_top[slot]) if slot < state.object_top.size else -1
+        objects[slot - 1] = {
+            "extrusion_mm": round(float(state.object_extrusion[slot]), 3),
+            "time_seconds": round(float(state.object_seconds[slot]), 2),
+            "layers": top + 1,
+            "max_z_mm": state.z_heights[top] if top >= 0 else None,
+        }
+    return objects
+
+
+def analyze_layers(gcode_path: Path) -> list[dict]:
+    """
+    Single pass per-layer breakdown: Z height, extruded filament (mm) and
+    kinematic move time (distance / feedrate, no acceleration) per layer.
+    Layers are delimited by PrusaSlicer's ;Z: markers. The file is scanned
+    in line-aligned chunks entirely with NumPy byte operations.
+    """
+    state = _scan(gcode_path)
+    count = len(state.z_heights)
+    no_rows = np.zeros(0, dtype=np.int64)
+    extrusion = state._add(state.extrusion, no_rows, None, count)
+    seconds = state._add(state.seconds, no_rows, None, count)
+    moves = state._add(state.moves, no_rows, None, count)
+    return [
+        {
+            "z": z,
+            "extrusion_mm": round(float(extrusion[i]), 3),
+            "time_seconds": round(float(seconds[i]), 2),
+            "moves": int(moves[i]),
+        }
+        for i, z in enumerate(state.z_heights)
+    ]
@@ -0,0 +1,293 @@
+"""
+Durable job queue shared by all slicer_api processes.
+Jobs are claimed under a lease that workers renew while running; a job whose
+lease runs out (worker crash, node loss) is handed to the next claimer.
+SQLite is the default backend: it coordinates every process that can open
+the database file. Other backends implement the JobQueue interface.
+"""
+
+import abc
+import json
+import time
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Optional
+
+logger = logging.getLogger("slicer-api.queue")
+
+TERMINAL = ("done", "failed", "cancelled")
+RETRY_BACKOFF_SECONDS = 5
+MAX_BACKOFF_SECONDS = 300
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    available_at REAL NOT NULL,
+    lease_owner TEXT,
+    lease_expires REAL,
+    stage TEXT,
+    progress INTEGER,
+    result TEXT,
+    error TEXT,
+    status_code INTEGER,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (status, priority, created_at);
+"""
+
+
+class QueueFull(Exception):
+    """Raised by submit when too many jobs are already pending."""
+
+
+def public(job: dict) -> dict:
+    """The client-facing view of a job row (no payload or result)."""
+    return {
+        "job_id": job["id"],
+        "kind": job["kind"],
+        "status": job["status"],
+        "stage": job["stage"],
+        "progress": job["progress"],
+        "attempts": job["attempts"],
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+    }
+
+
+class JobQueue(abc.ABC):
+    """Interface for queue backends; rows are plain dicts with the SCHEMA columns."""
+
+    @abc.abstractmethod
+    def submit(self, kind: str, job_id: str, payload: dict, priority: int = 0) -> tuple[dict, bool]:
+        """Enqueue; an existing live job with this id is returned instead (created=False)."""
+        ...
+
+    @abc.abstractmethod
+    def claim(self, owner: str) -> Optional[dict]:
+        ...
+
+    @abc.abstractmethod
+    def heartbeat(self, job_id: str, owner: str, stage: Optional[str], progress: Optional[int]) -> bool:
+        """Renew the lease; False means the job is no longer ours (cancelled or re-leased)."""
+        ...
+
+    @abc.abstractmethod
+    def complete(self, job_id: str, owner: str, result: Any) -> bool:
+        ...
+
+    @abc.abstractmethod
+    def fail(self, job_id: str, owner: str, error: str, status_code: int, retry: bool) -> bool:
+        ...
+
+    @abc.abstractmethod
+    def cancel(self, job_id: str) -> Optional[dict]:
+        ...
+
+    @abc.abstractmethod
+    def get(self, job_id: str) -> Optional[dict]:
+        ...
+
+    @abc.abstractmethod
+    def running_ids(self) -> set[str]:
+        ...
+
+    @abc.abstractmethod
+    def purge(self, older_than_seconds: int) -> int:
+        ...
+
+    @abc.abstractmethod
+    def stats(self) -> dict:
+        ...
+
+
+class SQLiteJobQueue(JobQueue):
+    """
+    WAL-mode SQLite queue. Safe for many processes on one host; across
+    hosts only if the file lives on storage with working POSIX locks.
+    """
+
+    def __init__(self, path: Path, lease_seconds: int = 60, max_attempts: int = 3,
+                 max_pending: int = 1000):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.max_pending = max_pending
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+
+    @contextmanager
+    def _tx(self):
+        """BEGIN IMMEDIATE takes the write lock up front, so claims never race."""
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            yield self._db
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        self._db.execute("COMMIT")
+
+    @staticmethod
+    def _row(row: Optional[sqlite3.Row]) -> Optional[dict]:
+        if row is None:
+            return None
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+        return job
+
+    def _get(self, db, job_id: str) -> Optional[dict]:
+        return self._row(db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+    def submit(self, kind: str, job_id: str, payload: dict, priority: int = 0) -> tuple[dict, bool]:
+        now = time.time()
+        with self._lock, self._tx() as db:
+            existing = self._get(db, job_id)
+            if existing is not None and existing["status"] not in ("failed", "cancelled"):
+                return existing, False
+            pending = db.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+            if pending >= self.max_pending:
+                raise QueueFull(f"{pending} jobs pending")
+            db.execute(
+                "INSERT OR REPLACE INTO jobs (id, kind, payload, priority, status, attempts, max_attempts,"
+                " available_at, created_at) VALUES (?, ?, ?, ?, 'queued', 0, ?, ?, ?)",
+                (job_id, kind, json.dumps(payload), priority, self.max_attempts, now, now),
+            )
+            return self._get(db, job_id), True
+
+    def claim(self, owner: str) -> Optional[dict]:
+        now = time.time()
+        with self._lock, self._tx() as db:
+            while True:
+                row = db.execute(
+                    "SELECT id, status, attempts, max_attempts FROM jobs"
+                    " WHERE (status = 'queued' AND available_at <= ?)"
+                    " OR (status = 'running' AND lease_expires < ?)"
+                    " ORDER BY priority, created_at LIMIT 1",
+                    (now, now),
+                ).fetchone()
+                if row is None:
+                    return None
+                if row["status"] == "running" and row["attempts"] >= row["max_attempts"]:
+                    # Its worker died on every attempt; stop handing it out
+                    db.execute(
+                        "UPDATE jobs SET status = 'failed', error = ?, status_code = 500,"
+                        " lease_owner = NULL, finished_at = ? WHERE id = ?",
+                        (f"Worker lost on all {row['attempts']} attempts", now, row["id"]),
+                    )
+                    continue
+                if row["status"] == "running":
+                    logger.warning(f"[{row['id']}] Lease expired, reclaiming")
+                db.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, lease_owner = ?,"
+                    " lease_expires = ?, started_at = ?, stage = NULL, progress = NULL WHERE id = ?",
+                    (owner, now + self.lease_seconds, now, row["id"]),
+                )
+                return self._get(db, row["id"])
+
+    def heartbeat(self, job_id: str, owner: str, stage: Optional[str], progress: Optional[int]) -> bool:
+        with self._lock:
+            cur = self._db.execute(
+                "UPDATE jobs SET lease_expires = ?, stage = ?, progress = ?"
+                " WHERE id = ? AND lease_owner = ? AND status = 'running'",
+                (time.time() + self.lease_seconds, stage, progress, job_id, owner),
+            )
+            return cur.rowcount == 1
+
+    def complete(self, job_id: str, owner: str, result: Any) -> bool:
+        with self._lock:
+            cur = self._db.execute(
+                "UPDATE jobs SET status = 'done', result = ?, error = NULL, status_code = NULL,"
+                " stage = 'done', progress = 100, lease_owner = NULL, finished_at = ?"
+                " WHERE id = ? AND lease_owner = ? AND status = 'running'",
+                (json.dumps(result), time.time(), job_id, owner),
+            )
+            return cur.rowcount == 1
+
+    def fail(self, job_id: str, owner: str, error: str, status_code: int, retry: bool) -> bool:
+        now = time.time()
+        with self._lock, self._tx() as db:
+            job = self._get(db, job_id)
+            if job is None or job["lease_owner"] != owner or job["status"] != "running":
+                return False
+            if retry and job["attempts"] < job["max_attempts"]:
+                delay = min(MAX_BACKOFF_SECONDS, RETRY_BACKOFF_SECONDS * 2 ** (job["attempts"] - 1))
+                logger.info(f"[{job_id}] Attempt {job['attempts']} failed ({error}); retry in {delay}s")
+                db.execute(
+                    "UPDATE jobs SET status = 'queued', available_at = ?, error = ?, status_code = ?,"
+                    " stage = 'retrying', progress = NULL, lease_owner = NULL, lease_expires = NULL"
+                    " WHERE id = ?",
+                    (now + delay, error, status_code, job_id),
+                )
+            else:
+                db.execute(
+                    "UPDATE jobs SET status = 'failed', error = ?, status_code = ?,"
+                    " lease_owner = NULL, finished_at = ? WHERE id = ?",
+                    (error, status_code, now, job_id),
+                )
+            return True
+
+    def cancel(self, job_id: str) -> Optional[dict]:
+        with self._lock, self._tx() as db:
+            db.execute(
+                "UPDATE jobs SET status = 'cancelled', error = 'Cancelled', status_code = 410,"
+                " stage = 'cancelled', lease_owner = NULL, finished_at = ?"
+                " WHERE id = ? AND status IN ('queued', 'running')",
+                (time.time(), job_id),
+            )
+            return self._get(db, job_id)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            return self._get(self._db, job_id)
+
+    def running_ids(self) -> set[str]:
+        with self._lock:
+            rows = self._db.execute("SELECT id FROM jobs WHERE status = 'running'").fetchall()
+        return {row["id"] for row in rows}
+
+    def purge(self, older_than_seconds: int) -> int:
+        """Forget finished jobs; returns the number of rows removed."""
+        with self._lock:
+            cur = self._db.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed', 'cancelled') AND finished_at < ?",
+                (time.time() - older_than_seconds,),
+            )
+            return cur.rowcount
+
+    def stats(self) -> dict:
+        with self._lock:
+            rows = self._db.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        return {
+            "backend": "sqlite",
+            "path": str(self.path),
+            "lease_seconds": self.lease_seconds,
+            "max_attempts": self.max_attempts,
+            "jobs": {row["status"]: row["n"] for row in rows},
+        }
+
+
+def open_queue(url: str, **kwargs) -> JobQueue:
+    """Backend from a URL; currently sqlite:///path/to/jobs.sqlite3 (or a bare path)."""
+    if url.startswith("sqlite://"):
+        return SQLiteJobQueue(Path(url[len("sqlite://"):]), **kwargs)
+    if "://" not in url:
+        return SQLiteJobQueue(Path(url), **kwargs)
+    raise ValueError(f"Unsupported job queue URL: {url}")
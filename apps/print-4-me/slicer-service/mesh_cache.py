@@ -0,0 +1,255 @@
+"""
+Preprocessed STLs keyed by the SHA-256 of the uploaded bytes.
+Each distinct upload is parsed once, stripped of degenerate facets and
+rewritten as compact binary STL; slicer runs and estimates read that copy.
+Signed URLs are remembered without their signature parameters, with a
+validator (ETag, or Last-Modified plus size), so a model fetched again
+under a fresh signature can skip the download as well.
+"""
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from stl_geometry import (
+    STLParseError,
+    binary_stl,
+    clean_triangles,
+    is_binary_stl,
+    layer_count,
+    load_triangles,
+    mesh_stats,
+)
+
+logger = logging.getLogger("slicer-api.meshes")
+
+
+@dataclass
+class Mesh:
+    digest: str       # SHA-256 of the uploaded bytes
+    mesh_digest: str  # SHA-256 of the normalized binary STL; equal meshes share results
+    path: Path
+    meta: dict
+    cached: bool = False
+    download_skipped: bool = False
+
+    def stats_for(self, layer_height: float) -> dict:
+        """mesh_stats() for a layer height, without re-reading the mesh."""
+        return {**self.meta["stats"], "layers": layer_count(self.meta["height_mm"], layer_height)}
+
+    def report(self, layer_height: float) -> dict:
+        return {
+            "format": self.meta["format"],
+            "source_bytes": self.meta["source_bytes"],
+            "bytes": self.meta["bytes"],
+            "removed_facets": self.meta["removed_facets"],
+            **self.stats_for(layer_height),
+            "cached": self.cached,
+            "download_skipped": self.download_skipped,
+        }
+
+
+def preprocess(data: bytes) -> tuple[bytes, dict]:
+    """Normalized binary STL and its metadata; raises STLParseError."""
+    triangles, removed = clean_triangles(load_triangles(data))
+    if triangles.shape[0] == 0:
+        raise STLParseError("STL has no valid facets")
+    normalized = binary_stl(triangles)
+    meta = {
+        "mesh_digest": hashlib.sha256(normalized).hexdigest(),
+        "format": "binary" if is_binary_stl(data) else "ascii",
+        "source_bytes": len(data),
+        "bytes": len(normalized),
+        "removed_facets": removed,
+        "height_mm": float(np.ptp(triangles[:, :, 2])),
+        "stats": mesh_stats(triangles, 0),
+    }
+    return normalized, meta
+
+
+def link_or_copy(src: Path, dest: Path) -> None:
+    dest.unlink(missing_ok=True)
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copyfile(src, dest)
+
+
+class MeshCache:
+    """
+    On-disk LRU of normalized meshes.
+    Layout: <root>/<digest[:2]>/<digest>.{stl,json}, <root>/urls/<hash of URL>.json
+    """
+
+    def __init__(self, root: Path, max_bytes: int, ttl_seconds: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # digest -> (size_bytes, last_used)
+        self._index: OrderedDict[str, tuple[int, float]] = OrderedDict()
+        if self.enabled:
+            (self.root / "urls").mkdir(parents=True, exist_ok=True)
+            self._load_index()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _paths(self, digest: str) -> tuple[Path, Path]:
+        entry = self.root / digest[:2] / digest
+        return entry.with_suffix(".stl"), entry.with_suffix(".json")
+
+    def _load_index(self) -> None:
+        entries = []
+        for meta in self.root.glob("*/*.json"):
+            stl = meta.with_suffix(".stl")
+            if stl.exists():
+                entries.append((meta.stat().st_mtime, meta.stem, stl.stat().st_size + meta.stat().st_size))
+        for last_used, digest, size in sorted(entries):
+            self._index[digest] = (size, last_used)
+        if entries:
+            logger.info(f"Loaded {len(entries)} cached meshes ({self.total_bytes} bytes)")
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(size for size, _ in self._index.values())
+
+    def _drop(self, digest: str) -> None:
+        self._index.pop(digest, None)
+        for path in self._paths(digest):
+            path.unlink(missing_ok=True)
+
+    def _expired(self, last_used: float, now: float) -> bool:
+        return self.ttl_seconds > 0 and now - last_used > self.ttl_seconds
+
+    def get(self, digest: str, dest: Path) -> Optional[Mesh]:
+        """Link the cached mesh for an upload digest to dest, or None on a miss."""
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._index.get(digest)
+            if entry is None or self._expired(entry[1], now):
+                if entry is not None:
+                    self._drop(digest)
+                self.misses += 1
+                return None
+            stl, meta_path = self._paths(digest)
+            try:
+                meta = json.loads(meta_path.read_text())
+                link_or_copy(stl, dest)
+            except (OSError, ValueError):
+                self._drop(digest)
+                self.misses += 1
+                return None
+            self._index[digest] = (entry[0], now)
+            self._index.move_to_end(digest)
+            os.utime(meta_path, (now, now))
+            self.hits += 1
+        return Mesh(digest, meta["mesh_digest"], dest, meta, cached=True)
+
+    def build(self, digest: str, source: Path, dest: Path) -> Mesh:
+        """Preprocess source into dest and keep a copy for later uploads."""
+        start = time.perf_counter()
+        normalized, meta = preprocess(source.read_bytes())
+        dest.write_bytes(normalized)
+        logger.info(
+            f"Preprocessed {meta['format']} STL {digest[:12]}: {meta['source_bytes']} -> {meta['bytes']} bytes, "
+            f"{meta['removed_facets']} facets removed in {(time.perf_counter() - start) * 1000:.0f} ms"
+        )
+        if self.enabled:
+            self._store(digest, dest, meta)
+        return Mesh(digest, meta["mesh_digest"], dest, meta)
+
+    def _store(self, digest: str, normalized: Path, meta: dict) -> None:
+        stl, meta_path = self._paths(digest)
+        suffix = f".tmp-{os.getpid()}-{threading.get_ident()}"
+        tmp_stl, tmp_meta = stl.with_name(stl.name + suffix), meta_path.with_name(meta_path.name + suffix)
+        try:
+            stl.parent.mkdir(parents=True, exist_ok=True)
+            link_or_copy(normalized, tmp_stl)
+            tmp_stl.replace(stl)
+            tmp_meta.write_text(json.dumps(meta))
+            tmp_meta.replace(meta_path)
+            with self._lock:
+                self._index[digest] = (stl.stat().st_size + meta_path.stat().st_size, time.time())
+                self._index.move_to_end(digest)
+                self._evict_locked()
+        except OSError as e:
+            logger.warning(f"Failed to cache mesh {digest[:12]}: {e}")
+            for path in (tmp_stl, tmp_meta):
+                path.unlink(missing_ok=True)
+
+    def _url_path(self, url_key: str) -> Path:
+        return self.root / "urls" / f"{hashlib.sha256(url_key.encode()).hexdigest()[:32]}.json"
+
+    def url_digest(self, url_key: str) -> Optional[tuple[str, str]]:
+        """(upload digest, validator) last seen for a URL without its signature."""
+        if not self.enabled:
+            return None
+        try:
+            entry = json.loads(self._url_path(url_key).read_text())
+        except (OSError, ValueError):
+            return None
+        if entry.get("url") != url_key or entry.get("digest") not in self._index:
+            return None
+        return entry["digest"], entry["validator"]
+
+    def remember_url(self, url_key: str, validator: str, digest: str) -> None:
+        if not self.enabled:
+            return
+        path = self._url_path(url_key)
+        tmp = path.with_suffix(f".tmp-{os.getpid()}-{threading.get_ident()}")
+        try:
+            tmp.write_text(json.dumps({"url": url_key, "validator": validator, "digest": digest}))
+            tmp.replace(path)
+        except OSError as e:
+            logger.warning(f"Failed to remember URL for {digest[:12]}: {e}")
+
+    def _evict_locked(self) -> None:
+        now = time.time()
+        for digest, (_, last_used) in list(self._index.items()):
+            if self._expired(last_used, now):
+                self._drop(digest)
+                self.evictions += 1
+        total = self.total_bytes
+        while total > self.max_bytes and self._index:
+            digest, (size, _) = next(iter(self._index.items()))
+            self._drop(digest)
+            self.evictions += 1
+            total -= size
+        # URL entries are tiny; drop them once their mesh would have expired
+        for path in (self.root / "urls").glob("*.json") if self.ttl_seconds > 0 else ():
+            try:
+                if self._expired(path.stat().st_mtime, now):
+                    path.unlink()
+            except OSError:
+                pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._index),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
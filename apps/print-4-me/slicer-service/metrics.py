@@ -0,0 +1,192 @@
+"""
+Minimal Prometheus-format metrics and per-job stage timing.
+Counters, gauges and histograms render in the text exposition format at
+/metrics; JobTimings records stage durations for one job via a contextvar,
+so deep call sites can use stage() without threading state through.
+"""
+
+import json
+import math
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Optional
+
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+_registry: list = []
+_lock = threading.Lock()
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key: tuple, extra: Optional[tuple] = None) -> str:
+    items = list(key) + ([extra] if extra else [])
+    if not items:
+        return ""
+    body = ",".join(f'{k}="{str(v)}"' for k, v in items)
+    return "{" + body + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        _registry.append(self)
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str):
+        super().__init__(name, help)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = _label_key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> list[str]:
+        return self.header() + [
+            f"{self.name}{_format_labels(k)} {_format_value(v)}" for k, v in self._values.items()
+        ]
+
+
+class Gauge(_Metric):
+    """
+    A value read from a callback at scrape time. counter=True exposes it as a
+    counter, for totals that are already tracked elsewhere.
+    """
+
+    def __init__(self, name: str, help: str, fn: Callable[[], float], counter: bool = False):
+        self.kind = "counter" if counter else "gauge"
+        super().__init__(name, help)
+        self.fn = fn
+
+    def render(self) -> list[str]:
+        return self.header() + [f"{self.name} {_format_value(self.fn())}"]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, help)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._series: dict[tuple, list] = {}  # key -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels) -> None:
+        key = _label_key(labels)
+        with _lock:
+            series = self._series.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> list[str]:
+        lines = self.header()
+        for key, series in self._series.items():
+            for bound, count in zip(self.buckets, series):
+                le = ("le", _format_value(bound))
+                lines.append(f"{self.name}_bucket{_format_labels(key, le)} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {series[-1]}")
+        return lines
+
+
+def render() -> str:
+    with _lock:
+        lines = []
+        for metric in _registry:
+            lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+STAGE_SECONDS = Histogram(
+    "slicer_stage_seconds",
+    "Time spent per request stage (download, queue, slice, parse, total)",
+)
+
+JOBS_TOTAL = Counter("slicer_jobs_total", "Jobs finished, by endpoint and outcome")
+
+_current: ContextVar[Optional["JobTimings"]] = ContextVar("job_timings", default=None)
+
+
+class JobTimings:
+    def __init__(self, job_id: str, endpoint: str):
+        self.job_id = job_id
+        self.endpoint = endpoint
+        self.stages: dict[str, float] = {}
+        self.fields: dict = {}
+        self.start = time.monotonic()
+
+    def record(self, name: str, seconds: float) -> None:
+        # Batches run stages concurrently; totals are summed per stage
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+        STAGE_SECONDS.observe(seconds, endpoint=self.endpoint, stage=name)
+
+
+def record_stage(name: str, seconds: float) -> None:
+    timings = _current.get()
+    if timings is not None:
+        timings.record(name, seconds)
+
+
+def annotate(**fields) -> None:
+    """Attach extra fields to the current job's timing log line."""
+    timings = _current.get()
+    if timings is not None:
+        timings.fields.update(fields)
+
+
+@contextmanager
+def stage(name: str):
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        record_stage(name, time.monotonic() - start)
+
+
+@contextmanager
+def track_job(job_id: str, endpoint: str, logger: logging.Logger):
+    """Scope a job: collects stage timings and logs them as one JSON line."""
+    timings = JobTimings(job_id, endpoint)
+    token = _current.set(timings)
+    outcome = "ok"
+    try:
+        yield timings
+    except BaseException as e:
+        status = getattr(e, "status_code", None)
+        outcome = f"http_{status}" if status else type(e).__name__
+        raise
+    finally:
+        _current.reset(token)
+        timings.record("total", time.monotonic() - timings.start)
+        JOBS_TOTAL.inc(endpoint=endpoint, outcome=outcome)
+        logger.info(json.dumps({
+            "event": "job_timings",
+            "job_id": job_id,
+            "endpoint": endpoint,
+            "outcome": outcome,
+            "stages": {k: round(v, 4) for k, v in timings.stages.items()},
+            **timings.fields,
+        }))
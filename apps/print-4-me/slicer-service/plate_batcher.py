@@ -0,0 +1,107 @@
+"""
+Coalesces compatible slice requests into one multi-object PrusaSlicer run.
+Requests with the same batch key that arrive within the window share a
+plate; a plate of one, or a plate run that fails, is sliced on its own.
+"""
+
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Optional
+
+logger = logging.getLogger("slicer-api.plates")
+
+
+@dataclass
+class PlateItem:
+    job_id: str
+    stl_path: Path
+    request: Any
+    future: asyncio.Future = field(repr=False)
+
+
+class PlateBatcher:
+    """
+    run_plate receives the items of one plate and returns one result per
+    item, in order; submit() resolves to that result, or None when the
+    caller should slice alone.
+    """
+
+    def __init__(self, window_seconds: float, max_items: int,
+                 run_plate: Callable[[list[PlateItem]], Awaitable[list[Optional[dict]]]]):
+        self.window_seconds = window_seconds
+        self.max_items = max_items
+        self.run_plate = run_plate
+        self._pending: dict[str, list[PlateItem]] = {}
+        self._timers: dict[str, asyncio.TimerHandle] = {}
+        self._running: set[asyncio.Task] = set()
+        self.plates = 0
+        self.orders_batched = 0
+        self.singles = 0
+        self.failures = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.window_seconds > 0 and self.max_items > 1
+
+    async def submit(self, key: str, job_id: str, stl_path: Path, request: Any) -> Optional[dict]:
+        loop = asyncio.get_running_loop()
+        item = PlateItem(job_id, stl_path, request, loop.create_future())
+        items = self._pending.setdefault(key, [])
+        items.append(item)
+        if len(items) >= self.max_items:
+            self._flush(key)
+        elif len(items) == 1:
+            self._timers[key] = loop.call_later(self.window_seconds, self._flush, key)
+
+        try:
+            # Shielded: one caller going away must not cancel its plate mates
+            return await asyncio.shield(item.future)
+        except asyncio.CancelledError:
+            pending = self._pending.get(key)
+            if pending and item in pending:
+                pending.remove(item)
+                if not pending:
+                    self._timers.pop(key).cancel()
+                    del self._pending[key]
+            raise
+
+    def _flush(self, key: str) -> None:
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        items = self._pending.pop(key, [])
+        if len(items) == 1:
+            self.singles += 1
+            items[0].future.set_result(None)
+        elif items:
+            task = asyncio.create_task(self._run(items))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, items: list[PlateItem]) -> None:
+        try:
+            results = await self.run_plate(items)
+            self.plates += 1
+            self.orders_batched += len(items)
+        except Exception as e:
+            logger.warning(f"Plate of {len(items)} failed, slicing individually: {e}")
+            self.failures += 1
+            results = [None] * len(items)
+        for item, result in zip(items, results):
+            if not item.future.done():
+                item.future.set_result(result)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "window_seconds": self.window_seconds,
+            "max_orders": self.max_items,
+            "waiting": sum(len(items) for items in self._pending.values()),
+            "plates_running": len(self._running),
+            "plates": self.plates,
+            "orders_batched": self.orders_batched,
+            "singles": self.singles,
+            "failures": self.failures,
+        }
@@ -0,0 +1,267 @@
+"""
+Preloaded PrusaSlicer profiles.
+Every INI in the profiles dir is parsed and validated once; each printer +
+filament pair is merged into a single bundle INI at load time, so a slice
+passes one --load. Other combinations (e.g. a print profile passed as
+printer_ini) are merged on first use. Bundle files no load refers to any
+more are removed once they are old enough not to be in use. An optional
+profiles.json maps the pipeline's printer/material profile IDs (or
+object-storage keys) to INI files. A name that matches nothing fails a
+strict resolve; otherwise it is logged and left out.
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger("slicer-api.profiles")
+
+MANIFEST = "profiles.json"
+
+# Keys that identify what an exported PrusaSlicer config is for
+PRINTER_KEYS = ("bed_shape", "nozzle_diameter", "printer_model", "max_print_height")
+FILAMENT_KEYS = ("filament_diameter", "filament_density", "temperature", "filament_type")
+# Must parse as numbers (or comma-separated number lists) when present
+NUMERIC_KEYS = (
+    "nozzle_diameter", "max_print_height", "filament_diameter", "filament_density",
+    "temperature", "bed_temperature", "layer_height", "perimeters", "fill_density",
+)
+
+
+class ProfileError(ValueError):
+    """An INI that fails validation, or a profile that does not exist."""
+
+
+@dataclass
+class Profile:
+    name: str
+    kind: str  # printer | filament | print
+    settings: dict[str, str]
+    digest: str
+
+
+@dataclass
+class Bundle:
+    """A merged printer + filament config; path is None when no profile applies."""
+    printer: Optional[str]
+    filament: Optional[str]
+    path: Optional[Path]
+    digest: str
+    settings: dict[str, str] = field(default_factory=dict, repr=False)
+
+    def number(self, key: str) -> Optional[float]:
+        """First value of a numeric setting ('1.75,1.75' -> 1.75), if set."""
+        value = self.settings.get(key, "").split(",")[0].strip().rstrip("%")
+        try:
+            return float(value)
+        except ValueError:
+            return None
+
+
+def parse_ini(text: str, name: str) -> dict[str, str]:
+    """PrusaSlicer's exported config format: 'key = value' lines, '#' comments."""
+    settings = {}
+    for lineno, line in enumerate(text.splitlines(), 1):
+        line = line.strip()
+        if not line or line.startswith(("#", ";")):
+            continue
+        if line.startswith("["):
+            raise ProfileError(f"{name}:{lineno}: config bundles with [sections] are not supported")
+        key, sep, value = line.partition("=")
+        if not sep or not key.strip():
+            raise ProfileError(f"{name}:{lineno}: expected 'key = value'")
+        settings[key.strip()] = value.strip()
+    return settings
+
+
+def load_profile(path: Path) -> Profile:
+    data = path.read_bytes()
+    settings = parse_ini(data.decode("utf-8", errors="replace"), path.name)
+    if not settings:
+        raise ProfileError(f"{path.name}: no settings")
+
+    for key in NUMERIC_KEYS:
+        if key in settings:
+            for part in settings[key].split(","):
+                try:
+                    float(part.strip().rstrip("%"))
+                except ValueError:
+                    raise ProfileError(f"{path.name}: {key} = {settings[key]!r} is not numeric")
+
+    if any(k in settings for k in PRINTER_KEYS):
+        kind = "printer"
+    elif any(k in settings for k in FILAMENT_KEYS):
+        kind = "filament"
+    else:
+        kind = "print"
+    return Profile(path.name, kind, settings, hashlib.sha256(data).hexdigest())
+
+
+class ProfileRegistry:
+    def __init__(self, profiles_dir: Path, bundle_dir: Path, stale_bundle_seconds: float = 3600):
+        self.profiles_dir = profiles_dir
+        self.bundle_dir = bundle_dir
+        # Unreferenced bundle files younger than this may still be read by a queued slice
+        self.stale_bundle_seconds = stale_bundle_seconds
+        self.profiles: dict[str, Profile] = {}
+        self.printer_ids: dict[str, str] = {}
+        self.material_ids: dict[str, str] = {}
+        self.errors: dict[str, str] = {}
+        self.loaded_at: Optional[float] = None
+        self.reloads = 0
+        self._bundles: dict[tuple[Optional[str], Optional[str]], Bundle] = {}
+        self._signature: tuple = ()
+        self._lock = threading.Lock()
+
+    def _scan_signature(self) -> tuple:
+        try:
+            return tuple(sorted(
+                (e.name, e.stat().st_mtime_ns, e.stat().st_size)
+                for e in os.scandir(self.profiles_dir)
+                if e.is_file() and (e.name.endswith(".ini") or e.name == MANIFEST)
+            ))
+        except FileNotFoundError:
+            return ()
+
+    def load(self) -> None:
+        """(Re)load everything, then swap it in at once."""
+        signature = self._scan_signature()
+        profiles, errors = {}, {}
+        for name, _, _ in signature:
+            if not name.endswith(".ini"):
+                continue
+            try:
+                profiles[name] = load_profile(self.profiles_dir / name)
+            except (OSError, ProfileError) as e:
+                errors[name] = str(e)
+                logger.error(f"Invalid profile {name}: {e}")
+
+        printer_ids, material_ids = {}, {}
+        manifest = self.profiles_dir / MANIFEST
+        if manifest.exists():
+            try:
+                data = json.loads(manifest.read_text())
+                printer_ids = {str(k): v for k, v in data.get("printers", {}).items()}
+                material_ids = {str(k): v for k, v in data.get("materials", {}).items()}
+            except (OSError, ValueError, AttributeError) as e:
+                errors[MANIFEST] = str(e)
+                logger.error(f"Invalid {MANIFEST}: {e}")
+            for ids in (printer_ids, material_ids):
+                for profile_id, name in ids.items():
+                    if name not in profiles:
+                        errors[f"{MANIFEST}:{profile_id}"] = f"maps to missing or invalid {name}"
+
+        printers = [p.name for p in profiles.values() if p.kind == "printer"]
+        filaments = [p.name for p in profiles.values() if p.kind == "filament"]
+        bundles = {}
+        for printer in [None] + sorted(printers):
+            for filament in [None] + sorted(filaments):
+                bundles[(printer, filament)] = self._merge(profiles, printer, filament)
+
+        with self._lock:
+            self.profiles = profiles
+            self.printer_ids, self.material_ids = printer_ids, material_ids
+            self.errors = errors
+            self._bundles = bundles
+            self._signature = signature
+            self.loaded_at = time.time()
+            self.reloads += 1
+        logger.info(
+            f"Loaded {len(profiles)} profiles ({len(printers)} printers, {len(filaments)} filaments), "
+            f"{len(bundles)} bundles, {len(errors)} errors"
+        )
+        self._remove_stale_bundles({b.path.name for b in bundles.values() if b.path is not None})
+
+    def _remove_stale_bundles(self, keep: set[str]) -> None:
+        cutoff = time.time() - self.stale_bundle_seconds
+        removed = 0
+        for path in self.bundle_dir.glob("bundle-*"):
+            try:
+                if path.name not in keep and path.stat().st_mtime < cutoff:
+                    path.unlink()
+                    removed += 1
+            except OSError:
+                pass
+        if removed:
+            logger.info(f"Removed {removed} stale bundle files from {self.bundle_dir}")
+
+    def reload_if_changed(self) -> bool:
+        if self._scan_signature() == self._signature:
+            return False
+        self.load()
+        return True
+
+    def _merge(self, profiles: dict[str, Profile], *names: Optional[str]) -> Bundle:
+        """Later profiles override earlier ones, as with repeated --load."""
+        chosen = [profiles[n] for n in names if n is not None]
+        printer, filament = names
+        if not chosen:
+            return Bundle(printer, filament, None, "")
+        settings: dict[str, str] = {}
+        for profile in chosen:
+            settings.update(profile.settings)
+        body = "".join(f"{k} = {v}\n" for k, v in settings.items())
+        digest = hashlib.sha256(body.encode()).hexdigest()
+        path = self.bundle_dir / f"bundle-{digest[:20]}.ini"
+        if not path.exists():
+            self.bundle_dir.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(f".tmp-{os.getpid()}")
+            header = "# merged from " + " + ".join(p.name for p in chosen) + "\n"
+            tmp.write_text(header + body)
+            tmp.replace(path)
+        return Bundle(printer, filament, path, digest, settings)
+
+    def _lookup(self, name: Optional[str], profile_id: Optional[str], ids: dict[str, str],
+                label: str, strict: bool) -> Optional[str]:
+        if profile_id:
+            name = ids.get(profile_id, name or profile_id)
+        if not name:
+            return None
+        # Storage keys ("profiles/<uuid>/ender3.ini") match by manifest entry or file name
+        name = ids.get(name, name)
+        for candidate in (name, f"{name}.ini", os.path.basename(name)):
+            if candidate in self.profiles:
+                return candidate
+        if strict:
+            raise ProfileError(f"Unknown {label} profile {profile_id or name!r}")
+        logger.warning(f"Unknown {label} profile {profile_id or name!r}, continuing without it")
+        return None
+
+    def resolve(self, printer_ini: Optional[str] = None, filament_ini: Optional[str] = None,
+                printer_id: Optional[str] = None, material_id: Optional[str] = None,
+                strict: bool = True) -> Bundle:
+        """
+        Bundle for INI names and/or profile IDs; IDs map via profiles.json or
+        file name. Unknown profiles raise ProfileError, or with strict=False
+        are left out. May write a bundle file, so keep it off the event loop.
+        """
+        with self._lock:
+            printer = self._lookup(printer_ini, printer_id, self.printer_ids, "printer", strict)
+            filament = self._lookup(filament_ini, material_id, self.material_ids, "filament", strict)
+            profiles = self.profiles
+            bundle = self._bundles.get((printer, filament))
+        if bundle is None:
+            # Not a printer + filament pair; merged outside the lock, a racing duplicate is harmless
+            bundle = self._merge(profiles, printer, filament)
+            with self._lock:
+                if self.profiles is profiles:
+                    bundle = self._bundles.setdefault((printer, filament), bundle)
+        return bundle
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "profiles": {name: p.kind for name, p in sorted(self.profiles.items())},
+                "printer_ids": self.printer_ids,
+                "material_ids": self.material_ids,
+                "bundles": len(self._bundles),
+                "errors": self.errors,
+                "loaded_at": self.loaded_at,
+                "reloads": self.reloads,
+            }
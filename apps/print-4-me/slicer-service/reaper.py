@@ -0,0 +1,106 @@
+"""
+Background reclamation of job directories under the slicer WORKDIR.
+Directories are removed once older than the TTL, then oldest-first while the
+workdir exceeds its disk quota. Directories of in-flight jobs are never touched.
+"""
+
+import time
+import shutil
+import asyncio
+import logging
+from pathlib import Path
+from typing import Callable, Optional
+
+logger = logging.getLogger("slicer-api.reaper")
+
+
+def dir_size(path: Path) -> int:
+    total = 0
+    for p in path.rglob("*"):
+        try:
+            if p.is_file():
+                total += p.stat().st_size
+        except OSError:
+            pass
+    return total
+
+
+class JobDirReaper:
+    def __init__(self, workdir: Path, ttl_seconds: int, quota_bytes: int, interval_seconds: int,
+                 protected: Optional[Callable[[], set[str]]] = None):
+        self.workdir = workdir
+        self.ttl_seconds = ttl_seconds
+        self.quota_bytes = quota_bytes
+        self.interval_seconds = interval_seconds
+        self.active: set[str] = set()
+        # Job ids in flight elsewhere (other processes sharing the workdir)
+        self.protected = protected
+        self.runs = 0
+        self.dirs_removed = 0
+        self.bytes_reclaimed = 0
+        self.last_run_at = None
+
+    def _remove(self, path: Path, size: int) -> None:
+        shutil.rmtree(path, ignore_errors=True)
+        self.dirs_removed += 1
+        self.bytes_reclaimed += size
+
+    def reap(self) -> int:
+        """One pass over the workdir; returns bytes reclaimed."""
+        now = time.time()
+        keep = set(self.active)
+        if self.protected is not None:
+            keep |= self.protected()
+        entries = []
+        for path in self.workdir.iterdir():
+            if not path.is_dir() or path.name in keep:
+                continue
+            try:
+                mtime = path.stat().st_mtime
+            except OSError:
+                continue
+            entries.append((mtime, path, dir_size(path)))
+        entries.sort(key=lambda e: e[0])
+
+        reclaimed = 0
+        kept = []
+        for mtime, path, size in entries:
+            if self.ttl_seconds > 0 and now - mtime > self.ttl_seconds:
+                self._remove(path, size)
+                reclaimed += size
+            else:
+                kept.append((path, size))
+
+        if self.quota_bytes > 0:
+            total = sum(size for _, size in kept)
+            for path, size in kept:
+                if total <= self.quota_bytes:
+                    break
+                self._remove(path, size)
+                reclaimed += size
+                total -= size
+
+        self.runs += 1
+        self.last_run_at = now
+        if reclaimed:
+            logger.info(f"Reclaimed {reclaimed / (1024 * 1024):.1f} MB from {self.workdir}")
+        return reclaimed
+
+    async def run_forever(self) -> None:
+        while True:
+            try:
+                await asyncio.to_thread(self.reap)
+            except Exception as e:
+                logger.warning(f"Reaper pass failed: {e}")
+            await asyncio.sleep(self.interval_seconds)
+
+    def stats(self) -> dict:
+        return {
+            "ttl_seconds": self.ttl_seconds,
+            "quota_bytes": self.quota_bytes,
+            "active_jobs": len(self.active),
+            "runs": self.runs,
+            "dirs_removed": self.dirs_removed,
+            "bytes_reclaimed": self.bytes_reclaimed,
+            "last_run_at": self.last_run_at,
+        }
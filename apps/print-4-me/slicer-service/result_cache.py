@@ -0,0 +1,173 @@
+"""
+Content-addressed result cache for the slicer service.
+Entries are keyed by the STL bytes, the normalized slicing parameters and the
+contents of any profile INIs, so a repeat quote never reaches PrusaSlicer.
+"""
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger("slicer-api.cache")
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def file_digest(path: Path) -> str:
+    """SHA-256 of a file, read in chunks."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def cache_key(stl_digest: str, params: dict, profile_digest: str = "") -> str:
+    """Combine STL digest, parameters and the merged profile's digest into one key."""
+    h = hashlib.sha256()
+    h.update(stl_digest.encode())
+    h.update(json.dumps(params, sort_keys=True).encode())
+    h.update(profile_digest.encode())
+    return h.hexdigest()
+
+
+class ResultCache:
+    """
+    On-disk LRU of parsed estimates and (optionally) G-code.
+    Layout: <root>/<key[:2]>/<key>/{estimate.json,model.gcode}
+    """
+
+    def __init__(self, root: Path, max_bytes: int, ttl_seconds: int, store_gcode: bool = False):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.store_gcode = store_gcode
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # key -> (size_bytes, last_used)
+        self._index: OrderedDict[str, tuple[int, float]] = OrderedDict()
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._load_index()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _entry_dir(self, key: str) -> Path:
+        return self.root / key[:2] / key
+
+    def _load_index(self) -> None:
+        entries = []
+        for meta in self.root.glob("*/*/estimate.json"):
+            entry_dir = meta.parent
+            size = sum(p.stat().st_size for p in entry_dir.iterdir() if p.is_file())
+            entries.append((meta.stat().st_mtime, entry_dir.name, size))
+        for last_used, key, size in sorted(entries):
+            self._index[key] = (size, last_used)
+        if entries:
+            logger.info(f"Loaded {len(entries)} cache entries ({self.total_bytes} bytes)")
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(size for size, _ in self._index.values())
+
+    def _drop(self, key: str) -> None:
+        self._index.pop(key, None)
+        shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+
+    def _expired(self, last_used: float, now: float) -> bool:
+        return self.ttl_seconds > 0 and now - last_used > self.ttl_seconds
+
+    def get(self, key: str, need_gcode: bool = False) -> Optional[dict]:
+        """Return the cached estimate, or None on miss/expiry."""
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is None or self._expired(entry[1], now):
+                if entry is not None:
+                    self._drop(key)
+                self.misses += 1
+                return None
+            entry_dir = self._entry_dir(key)
+            if need_gcode and not (entry_dir / "model.gcode").exists():
+                self.misses += 1
+                return None
+            try:
+                estimate = json.loads((entry_dir / "estimate.json").read_text())
+            except (OSError, ValueError):
+                self._drop(key)
+                self.misses += 1
+                return None
+            self._index[key] = (entry[0], now)
+            self._index.move_to_end(key)
+            os.utime(entry_dir / "estimate.json", (now, now))
+            self.hits += 1
+            return estimate
+
+    def gcode_path(self, key: str) -> Optional[Path]:
+        path = self._entry_dir(key) / "model.gcode"
+        return path if path.exists() else None
+
+    def put(self, key: str, estimate: dict, gcode_path: Optional[Path] = None) -> None:
+        """Store an estimate (and G-code when enabled), then evict down to budget."""
+        if not self.enabled:
+            return
+        entry_dir = self._entry_dir(key)
+        tmp_dir = entry_dir.with_name(f"{key}.tmp-{os.getpid()}-{threading.get_ident()}")
+        try:
+            tmp_dir.mkdir(parents=True, exist_ok=True)
+            (tmp_dir / "estimate.json").write_text(json.dumps(estimate))
+            if self.store_gcode and gcode_path is not None and gcode_path.exists():
+                shutil.copyfile(gcode_path, tmp_dir / "model.gcode")
+            size = sum(p.stat().st_size for p in tmp_dir.iterdir())
+            with self._lock:
+                self._drop(key)
+                tmp_dir.rename(entry_dir)
+                self._index[key] = (size, time.time())
+                self._evict_locked()
+        except OSError as e:
+            logger.warning(f"Failed to store cache entry {key[:12]}: {e}")
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def _evict_locked(self) -> None:
+        now = time.time()
+        for key, (_, last_used) in list(self._index.items()):
+            if self._expired(last_used, now):
+                self._drop(key)
+                self.evictions += 1
+        total = self.total_bytes
+        while total > self.max_bytes and self._index:
+            key, (size, _) = next(iter(self._index.items()))
+            self._drop(key)
+            self.evictions += 1
+            total -= size
+
+    def evict(self) -> None:
+        with self._lock:
+            self._evict_locked()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._index),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "store_gcode": self.store_gcode,
+            }
@@ -0,0 +1,185 @@
+"""
+Bounded, priority-aware admission for PrusaSlicer runs plus an in-memory
+job registry for the submit/poll/result API.
+"""
+
+import time
+import heapq
+import asyncio
+import itertools
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Optional
+
+# Lower value runs first
+PRIORITY_ESTIMATE = 0
+PRIORITY_SLICE = 10
+
+
+class SchedulerBusy(Exception):
+    """Raised when the wait queue is full; carries a Retry-After hint in seconds."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Slicer queue is full, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class SlicerScheduler:
+    """
+    Limits concurrent slicer processes to max_workers. Waiters are admitted
+    by (priority, arrival order); at most max_queue may wait at once.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.running = 0
+        self.completed = 0
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        # Exponentially weighted average run time, used for Retry-After
+        self._avg_runtime = 30.0
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for _, _, fut in self._waiters if not fut.done())
+
+    def retry_after(self) -> int:
+        backlog = self.queued + self.running
+        return max(1, int(backlog * self._avg_runtime / self.max_workers))
+
+    def check_capacity(self) -> None:
+        """Fail fast before doing any work if a new job could not be queued."""
+        if self.running >= self.max_workers and self.queued >= self.max_queue:
+            raise SchedulerBusy(self.retry_after())
+
+    async def _acquire(self, priority: int) -> None:
+        if self.running < self.max_workers and not self.queued:
+            self.running += 1
+            return
+        if self.queued >= self.max_queue:
+            raise SchedulerBusy(self.retry_after())
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), fut))
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # Slot was handed over just as we were cancelled; pass it on
+                self._release()
+            raise
+
+    def _release(self) -> None:
+        while self._waiters:
+            _, _, fut = heapq.heappop(self._waiters)
+            if not fut.done():
+                # Slot passes directly to the next waiter; running is unchanged
+                fut.set_result(None)
+                return
+        self.running -= 1
+
+    @asynccontextmanager
+    async def slot(self, priority: int):
+        await self._acquire(priority)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - start
+            self._avg_runtime = 0.8 * self._avg_runtime + 0.2 * elapsed
+            self.completed += 1
+            self._release()
+
+    def stats(self) -> dict:
+        return {
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "running": self.running,
+            "queued": self.queued,
+            "completed": self.completed,
+            "avg_runtime_seconds": round(self._avg_runtime, 2),
+        }
+
+
+@dataclass
+class Job:
+    id: str
+    kind: str
+    status: str = "queued"  # queued | running | done | failed | cancelled
+    result: Optional[Any] = None
+    error: Optional[str] = None
+    status_code: Optional[int] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    stage: Optional[str] = None
+    progress: Optional[int] = None
+    task: Optional[asyncio.Task] = field(default=None, repr=False)
+    events: list[dict] = field(default_factory=list, repr=False)
+    _changed: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+
+    def public(self) -> dict:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": self.progress,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+    def publish(self, event: str, **data) -> None:
+        """Append an event for followers and wake them."""
+        if "stage" in data:
+            self.stage = data["stage"]
+        if data.get("progress") is not None:
+            self.progress = data["progress"]
+        self.events.append({"event": event, "time": time.time(), **data})
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def follow(self, keepalive: float) -> AsyncIterator[Optional[dict]]:
+        """
+        Yield every event from the first one on, then new ones as they are
+        published; None after keepalive idle seconds. Ends once the job has
+        finished and all its events were yielded.
+        """
+        seen = 0
+        while True:
+            while seen < len(self.events):
+                yield self.events[seen]
+                seen += 1
+            if self.finished_at is not None:
+                return
+            changed = self._changed
+            try:
+                await asyncio.wait_for(changed.wait(), timeout=keepalive)
+            except asyncio.TimeoutError:
+                yield None
+
+
+class JobRegistry:
+    """In-memory job table; finished jobs are forgotten after result_ttl seconds."""
+
+    def __init__(self, result_ttl: int):
+        self.result_ttl = result_ttl
+        self._jobs: dict[str, Job] = {}
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def add(self, job: Job) -> None:
+        self.prune()
+        self._jobs[job.id] = job
+
+    def prune(self) -> None:
+        cutoff = time.time() - self.result_ttl
+        for job_id, job in list(self._jobs.items()):
+            if job.finished_at is not None and job.finished_at < cutoff:
+                del self._jobs[job_id]
+
+    def active(self) -> int:
+        return sum(1 for job in self._jobs.values() if job.finished_at is None)
@@ -8,29 +8,237 @@ import os
 import re
 import json
 import uuid
+import time
 import shutil
 import asyncio
+import zlib
+import socket
+import hashlib
 import tempfile
 import logging
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import Optional
+from typing import Literal, Optional, Union
+from urllib.parse import parse_qsl, urlencode, urlsplit
 
+import aiofiles
 import httpx
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 
+from analytic_model import AnalyticModel, PrintSettings
+import metrics
+from job_queue import TERMINAL, QueueFull, open_queue, public as public_job
+from mesh_cache import Mesh, MeshCache
+from gcode_parser import (
+    STDOUT_EXPORTED,
+    analyze_layers,
+    analyze_objects,
+    grams_from_stdout,
+    parse_gcode_metadata,
+    progress_from_line,
+)
+from metrics import Counter, Gauge, Histogram, annotate, record_stage, stage, track_job
+from plate_batcher import PlateBatcher, PlateItem
+from profile_registry import Bundle, ProfileError, ProfileRegistry
+from reaper import JobDirReaper
+from result_cache import ResultCache, cache_key
+from scheduler import (
+    PRIORITY_ESTIMATE,
+    PRIORITY_SLICE,
+    Job,
+    JobRegistry,
+    SchedulerBusy,
+    SlicerScheduler,
+)
+from slicer_process import ProcessLimits, parse_cpu_list, run_process
+from stl_geometry import STLParseError
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("slicer-api")
 
-app = FastAPI(title="Print-4-Me Slicer Service")
-
 PRUSA_SLICER_BIN = os.getenv("PRUSA_SLICER_BIN", "prusa-slicer")
 WORKDIR = Path(os.getenv("SLICER_WORKDIR", "/tmp/slicer-workdir"))
 PROFILES_DIR = Path(os.getenv("PROFILES_DIR", "/profiles"))
+PROFILE_RELOAD_SECONDS = float(os.getenv("PROFILE_RELOAD_SECONDS", "10"))  # 0 disables hot reload
 MAX_FILE_SIZE_MB = int(os.getenv("MAX_FILE_SIZE_MB", "100"))
+MAX_BATCH_VARIANTS = int(os.getenv("MAX_BATCH_VARIANTS", "48"))
+CACHE_DIR = Path(os.getenv("SLICER_CACHE_DIR", "/tmp/slicer-cache"))
+CACHE_MAX_MB = int(os.getenv("SLICER_CACHE_MAX_MB", "1024"))  # 0 disables the cache
+CACHE_TTL_HOURS = float(os.getenv("SLICER_CACHE_TTL_HOURS", "168"))
+CACHE_GCODE = os.getenv("SLICER_CACHE_GCODE", "0") == "1"
+PROFILE_BUNDLE_DIR = Path(os.getenv("PROFILE_BUNDLE_DIR", str(CACHE_DIR / "profile-bundles")))
+MESH_CACHE_MAX_MB = int(os.getenv("MESH_CACHE_MAX_MB", "2048"))  # 0 disables mesh and URL reuse
+DOWNLOAD_POOL_SIZE = int(os.getenv("DOWNLOAD_POOL_SIZE", "20"))
+DOWNLOAD_RETRIES = int(os.getenv("DOWNLOAD_RETRIES", "3"))
+DOWNLOAD_CHUNK_KB = int(os.getenv("DOWNLOAD_CHUNK_KB", "256"))
+SLICER_WORKERS = int(os.getenv("SLICER_WORKERS", "2"))
+SLICER_MAX_QUEUE = int(os.getenv("SLICER_MAX_QUEUE", "20"))
+JOB_RESULT_TTL = int(os.getenv("JOB_RESULT_TTL", "3600"))
+SLICER_ESTIMATE_TIMEOUT = int(os.getenv("SLICER_ESTIMATE_TIMEOUT", "300"))
+SLICER_SLICE_TIMEOUT = int(os.getenv("SLICER_SLICE_TIMEOUT", "600"))
+SLICER_MEMORY_LIMIT_MB = int(os.getenv("SLICER_MEMORY_LIMIT_MB", "0"))  # 0 = unlimited
+SLICER_CPU_LIMIT_SECONDS = int(os.getenv("SLICER_CPU_LIMIT_SECONDS", "0"))  # 0 = unlimited
+SLICER_NICE = int(os.getenv("SLICER_NICE", "0"))
+SLICER_CPU_AFFINITY = os.getenv("SLICER_CPU_AFFINITY", "")  # e.g. "0-1"
+SLICER_THREADS = int(os.getenv("SLICER_THREADS", "0"))  # 0 = PrusaSlicer default
+SLICER_KILL_GRACE_SECONDS = float(os.getenv("SLICER_KILL_GRACE_SECONDS", "2"))
+DISCONNECT_POLL_SECONDS = float(os.getenv("DISCONNECT_POLL_SECONDS", "1.0"))
+SSE_KEEPALIVE_SECONDS = float(os.getenv("SSE_KEEPALIVE_SECONDS", "15"))
+JOB_DIR_TTL_MINUTES = int(os.getenv("JOB_DIR_TTL_MINUTES", "60"))
+WORKDIR_QUOTA_MB = int(os.getenv("WORKDIR_QUOTA_MB", "4096"))
+REAPER_INTERVAL_SECONDS = int(os.getenv("REAPER_INTERVAL_SECONDS", "60"))
+# Plate batching: small compatible slices arriving within the window share one run
+PLATE_BATCH_WINDOW_MS = int(os.getenv("PLATE_BATCH_WINDOW_MS", "0"))  # 0 disables
+PLATE_BATCH_MAX_ORDERS = int(os.getenv("PLATE_BATCH_MAX_ORDERS", "8"))
+PLATE_BATCH_MAX_STL_MB = float(os.getenv("PLATE_BATCH_MAX_STL_MB", "5"))
+# Durable job queue; every process pointing at the same database shares the work
+JOB_QUEUE_URL = os.getenv("JOB_QUEUE_URL", f"sqlite://{WORKDIR / 'jobs.sqlite3'}")
+# With batching on, claim enough jobs for a plate to fill while earlier ones wait
+DEFAULT_JOB_WORKERS = SLICER_WORKERS * (PLATE_BATCH_MAX_ORDERS if PLATE_BATCH_WINDOW_MS > 0 else 1)
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", str(DEFAULT_JOB_WORKERS)))  # 0 = API-only node
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "60"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_MAX_PENDING = int(os.getenv("JOB_MAX_PENDING", "1000"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1.0"))
+
+CALIBRATION_FILE = Path(os.getenv("ESTIMATE_CALIBRATION_FILE", str(CACHE_DIR / "calibration.jsonl")))
+ESTIMATE_PERIMETERS = int(os.getenv("ESTIMATE_PERIMETERS", "2"))
+ESTIMATE_EXTRUSION_WIDTH_MM = float(os.getenv("ESTIMATE_EXTRUSION_WIDTH_MM", "0.45"))
+ESTIMATE_TOP_BOTTOM_LAYERS = int(os.getenv("ESTIMATE_TOP_BOTTOM_LAYERS", "4"))
+FILAMENT_DENSITY = float(os.getenv("FILAMENT_DENSITY", "1.24"))
+FILAMENT_DIAMETER_MM = float(os.getenv("FILAMENT_DIAMETER_MM", "1.75"))
+
+JOB_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+PLATE_MARKER = "plate.json"  # in an order's job dir when its G-code is a shared plate's
+RESULT_POINTER = "current"  # in WORKDIR/<job_id>: the name of the run dir /gcode serves
 
 WORKDIR.mkdir(parents=True, exist_ok=True)
 
+result_cache = ResultCache(
+    CACHE_DIR,
+    max_bytes=CACHE_MAX_MB * 1024 * 1024,
+    ttl_seconds=int(CACHE_TTL_HOURS * 3600),
+    store_gcode=CACHE_GCODE,
+)
+
+mesh_cache = MeshCache(
+    CACHE_DIR / "meshes",
+    max_bytes=MESH_CACHE_MAX_MB * 1024 * 1024,
+    ttl_seconds=int(CACHE_TTL_HOURS * 3600),
+)
+
+scheduler = SlicerScheduler(max_workers=SLICER_WORKERS, max_queue=SLICER_MAX_QUEUE)
+# Live state (task, progress events) of jobs running in this process
+jobs = JobRegistry(result_ttl=JOB_RESULT_TTL)
+queue = open_queue(
+    JOB_QUEUE_URL,
+    lease_seconds=JOB_LEASE_SECONDS,
+    max_attempts=JOB_MAX_ATTEMPTS,
+    max_pending=JOB_MAX_PENDING,
+)
+reaper = JobDirReaper(
+    WORKDIR,
+    ttl_seconds=JOB_DIR_TTL_MINUTES * 60,
+    quota_bytes=WORKDIR_QUOTA_MB * 1024 * 1024,
+    interval_seconds=REAPER_INTERVAL_SECONDS,
+    protected=queue.running_ids,
+)
+
+# Every profile is parsed, validated and merged once, not per request
+profile_registry = ProfileRegistry(PROFILES_DIR, PROFILE_BUNDLE_DIR)
+profile_registry.load()
+
+analytic_model = AnalyticModel(
+    CALIBRATION_FILE,
+    PrintSettings(
+        perimeters=ESTIMATE_PERIMETERS,
+        extrusion_width_mm=ESTIMATE_EXTRUSION_WIDTH_MM,
+        top_bottom_layers=ESTIMATE_TOP_BOTTOM_LAYERS,
+        filament_density=FILAMENT_DENSITY,
+        filament_diameter_mm=FILAMENT_DIAMETER_MM,
+    ),
+)
+
+SLICER_TIMEOUTS = Counter("slicer_timeouts_total", "Slicer runs that hit their timeout")
+SLICER_FAILURES = Counter("slicer_failures_total", "Slicer runs that exited non-zero")
+SLICER_CANCELLED = Counter("slicer_cancelled_total", "Slicer runs killed by cancellation or disconnect")
+PROCESS_PEAK_RSS = Histogram(
+    "slicer_process_peak_rss_bytes", "Peak RSS of each PrusaSlicer run",
+    buckets=tuple(2 ** i * 1024 * 1024 for i in range(5, 13)),  # 32 MB .. 4 GB
+)
+PROCESS_CPU = Counter("slicer_process_cpu_seconds_total", "CPU time used by PrusaSlicer runs")
+PROCESS_CPU_PER_RUN = Histogram("slicer_process_cpu_seconds", "CPU time (user+system) per PrusaSlicer run")
+GCODE_BYTES = Histogram(
+    "slicer_gcode_bytes", "Size of produced G-code",
+    buckets=tuple(4 ** i * 1024 for i in range(2, 11)),  # 16 KB .. 1 GB
+)
+Gauge("slicer_inflight_jobs", "Jobs holding a job dir", lambda: len(reaper.active))
+Gauge("slicer_queue_depth", "Jobs waiting for a slicer slot", lambda: scheduler.queued)
+Gauge("slicer_running_processes", "PrusaSlicer processes running", lambda: scheduler.running)
+Gauge("slicer_cache_hits_total", "Result cache hits", lambda: result_cache.hits, counter=True)
+Gauge("slicer_cache_misses_total", "Result cache misses", lambda: result_cache.misses, counter=True)
+Gauge("slicer_download_bytes_total", "STL bytes downloaded", lambda: download_stats["bytes"], counter=True)
+Gauge("slicer_download_failures_total", "Failed STL downloads", lambda: download_stats["failures"], counter=True)
+Gauge("slicer_download_skipped_total", "STL downloads skipped for an already known model",
+      lambda: download_stats["skipped"], counter=True)
+Gauge("slicer_mesh_cache_hits_total", "Uploads whose preprocessed mesh was cached",
+      lambda: mesh_cache.hits, counter=True)
+
+process_limits = ProcessLimits(
+    memory_bytes=SLICER_MEMORY_LIMIT_MB * 1024 * 1024,
+    cpu_seconds=SLICER_CPU_LIMIT_SECONDS,
+    nice=SLICER_NICE,
+    cpus=parse_cpu_list(SLICER_CPU_AFFINITY),
+    kill_grace_seconds=SLICER_KILL_GRACE_SECONDS,
+)
+
+# Shared, pooled HTTP client for STL downloads (created in lifespan)
+http_client: Optional[httpx.AsyncClient] = None
+
+download_stats = {
+    "downloads": 0,
+    "failures": 0,
+    "rejected_too_large": 0,
+    "retries": 0,
+    "resumed": 0,
+    "skipped": 0,
+    "bytes": 0,
+    "bytes_skipped": 0,
+    "seconds": 0.0,
+}
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global http_client
+    http_client = httpx.AsyncClient(
+        timeout=httpx.Timeout(120.0, connect=10.0),
+        limits=httpx.Limits(
+            max_connections=DOWNLOAD_POOL_SIZE,
+            max_keepalive_connections=DOWNLOAD_POOL_SIZE,
+        ),
+        follow_redirects=True,
+    )
+    background = [asyncio.create_task(reaper.run_forever()), asyncio.create_task(purge_jobs_forever())]
+    if PROFILE_RELOAD_SECONDS > 0:
+        background.append(asyncio.create_task(reload_profiles_forever()))
+    worker_prefix = f"{socket.gethostname()}:{os.getpid()}"
+    background += [asyncio.create_task(job_worker(f"{worker_prefix}:{n}")) for n in range(JOB_WORKERS)]
+    try:
+        yield
+    finally:
+        for task in background:
+            task.cancel()
+        # Let job workers kill their slicers and hand their jobs back
+        await asyncio.gather(*background, return_exceptions=True)
+        await http_client.aclose()
+        http_client = None
+
+
+app = FastAPI(title="Print-4-Me Slicer Service", lifespan=lifespan)
+
 
 class SliceRequest(BaseModel):
     stl_url: str
@@ -40,52 +248,274 @@ class SliceRequest(BaseModel):
     supports: bool = False
     printer_ini: Optional[str] = None
     filament_ini: Optional[str] = None
+    printer_profile_id: Optional[str] = None
+    material_profile_id: Optional[str] = None
 
 
-class EstimateRequest(BaseModel):
-    stl_url: str
+class EstimateParams(BaseModel):
     layer_height: float = 0.2
     infill_percent: int = 20
     supports: bool = False
     printer_profile_id: Optional[str] = None
     material_profile_id: Optional[str] = None
+    # "fast" predicts from STL geometry without running PrusaSlicer
+    mode: Literal["exact", "fast"] = "exact"
+
+
+class EstimateRequest(EstimateParams):
+    stl_url: str
+
+
+class BatchEstimateRequest(BaseModel):
+    stl_url: str
+    variants: list[EstimateParams]
+
+
+class DownloadTooLarge(Exception):
+    pass
 
 
-async def download_file(url: str, dest: Path) -> None:
-    """Download a file from a signed URL."""
-    async with httpx.AsyncClient(timeout=120.0) as client:
-        response = await client.get(url)
+def _too_large(size_bytes: int) -> HTTPException:
+    size_mb = size_bytes / (1024 * 1024)
+    return HTTPException(400, f"File too large: {size_mb:.1f} MB (max {MAX_FILE_SIZE_MB} MB)")
+
+
+async def _download_attempt(url: str, dest: Path):
+    """
+    Stream one GET into dest, resuming from any partial file already there.
+    Returns (bytes received in this attempt, sha256 of the whole file, validator).
+    """
+    max_bytes = MAX_FILE_SIZE_MB * 1024 * 1024
+    offset = dest.stat().st_size if dest.exists() else 0
+    headers = {"Range": f"bytes={offset}-"} if offset else {}
+    hasher = hashlib.sha256()
+
+    async with http_client.stream("GET", url, headers=headers) as response:
+        if offset and response.status_code == 416:
+            # Nothing at or past offset: an earlier attempt may have got every byte
+            if response.headers.get("content-range", "").rpartition("/")[2] == str(offset):
+                download_stats["resumed"] += 1
+                _hash_file(dest, hasher)
+                return 0, hasher, response_validator(response)
+            dest.unlink()  # the object changed size since; fetch it whole
         response.raise_for_status()
-        dest.write_bytes(response.content)
-        size_mb = len(response.content) / (1024 * 1024)
-        if size_mb > MAX_FILE_SIZE_MB:
-            dest.unlink()
-            raise HTTPException(400, f"File too large: {size_mb:.1f} MB (max {MAX_FILE_SIZE_MB} MB)")
-        logger.info(f"Downloaded {size_mb:.1f} MB to {dest}")
+
+        if offset and response.status_code != 206:
+            # Server ignored the Range header; start over
+            offset = 0
+
+        content_length = response.headers.get("content-length")
+        if content_length and offset + int(content_length) > max_bytes:
+            raise DownloadTooLarge(offset + int(content_length))
+
+        if offset:
+            download_stats["resumed"] += 1
+            _hash_file(dest, hasher)
+
+        total = offset
+        async with aiofiles.open(dest, "ab" if offset else "wb") as f:
+            async for chunk in response.aiter_bytes(DOWNLOAD_CHUNK_KB * 1024):
+                total += len(chunk)
+                if total > max_bytes:
+                    raise DownloadTooLarge(total)
+                hasher.update(chunk)
+                await f.write(chunk)
+
+    return total - offset, hasher, response_validator(response)
+
+
+def _hash_file(path: Path, hasher) -> None:
+    with open(path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            hasher.update(chunk)
+
+
+def response_validator(response: httpx.Response) -> Optional[str]:
+    """What identifies this version of the object: its ETag, else Last-Modified + size."""
+    etag = response.headers.get("etag")
+    if etag:
+        return f"etag:{etag}"
+    last_modified = response.headers.get("last-modified")
+    content_range = response.headers.get("content-range", "")
+    size = content_range.rpartition("/")[2] if content_range else response.headers.get("content-length")
+    if last_modified and size and size != "*":
+        return f"modified:{last_modified}:{size}"
+    return None
+
+
+async def probe_validator(url: str) -> Optional[str]:
+    """The object's validator, from a one-byte ranged GET (HEAD is not valid on presigned GET URLs)."""
+    try:
+        async with http_client.stream("GET", url, headers={"Range": "bytes=0-0"}) as response:
+            if response.status_code not in (200, 206):
+                return None
+            return response_validator(response)
+    except httpx.HTTPError:
+        return None
+
+
+# Query parameters that only sign a URL (Supabase, S3 SigV2/SigV4, GCS, Azure SAS);
+# any other parameter may select a different object and stays in the key
+SIGNATURE_PARAMS = {"token", "signature", "expires", "awsaccesskeyid", "googleaccessid",
+                    "sig", "se", "st", "sv", "sp", "spr", "sr", "srt", "ss"}
+SIGNATURE_PREFIXES = ("x-amz-", "x-goog-")
+
+
+def url_key(url: str) -> str:
+    """A signed URL without its signature parameters (or fragment), the rest sorted."""
+    parts = urlsplit(url)
+    params = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if k.lower() not in SIGNATURE_PARAMS and not k.lower().startswith(SIGNATURE_PREFIXES)
+    )
+    key = f"{parts.scheme}://{parts.netloc}{parts.path}"
+    return f"{key}?{urlencode(params)}" if params else key
+
+
+async def download_file(url: str, dest: Path) -> tuple[str, Optional[str]]:
+    """
+    Download a file from a signed URL in chunks through the shared client.
+    Aborts as soon as the size limit is exceeded; transient failures are
+    retried with Range resume. Returns the SHA-256 of the downloaded bytes
+    and the object's validator, if the server sent one.
+    """
+    with stage("download"):
+        return await _download_with_retries(url, dest)
+
+
+async def _download_with_retries(url: str, dest: Path) -> tuple[str, Optional[str]]:
+    start = time.monotonic()
+    received = 0
+
+    for attempt in range(DOWNLOAD_RETRIES + 1):
+        try:
+            attempt_bytes, hasher, validator = await _download_attempt(url, dest)
+            received += attempt_bytes
+            break
+        except DownloadTooLarge as e:
+            dest.unlink(missing_ok=True)
+            download_stats["rejected_too_large"] += 1
+            raise _too_large(e.args[0])
+        except (httpx.TransportError, httpx.HTTPStatusError) as e:
+            # A 416 has already dropped the partial file, so the retry starts over
+            retryable = isinstance(e, httpx.TransportError) or e.response.status_code == 416 \
+                or e.response.status_code >= 500
+            if not retryable or attempt == DOWNLOAD_RETRIES:
+                dest.unlink(missing_ok=True)
+                download_stats["failures"] += 1
+                raise HTTPException(502, f"Download failed: {e}")
+            download_stats["retries"] += 1
+            logger.warning(f"Download attempt {attempt + 1} failed ({e}), retrying")
+            await asyncio.sleep(0.5 * 2 ** attempt)
+
+    elapsed = time.monotonic() - start
+    size = dest.stat().st_size
+    download_stats["downloads"] += 1
+    download_stats["bytes"] += received
+    download_stats["seconds"] += elapsed
+    logger.info(
+        f"Downloaded {size / (1024 * 1024):.1f} MB to {dest} "
+        f"in {elapsed:.2f}s ({received / (1024 * 1024) / max(elapsed, 1e-6):.1f} MB/s)"
+    )
+    return hasher.hexdigest(), validator
+
+
+async def fetch_model(job_id: str, url: str, stl_path: Path) -> Mesh:
+    """
+    Download and preprocess an STL into stl_path as normalized binary STL.
+    A model already fetched under another signed URL skips the download;
+    already-seen content skips the parse.
+    """
+    publish(job_id, "stage", stage="download")
+    key = url_key(url)
+    known = mesh_cache.url_digest(key)
+    if known is not None:
+        with stage("download"):
+            validator = await probe_validator(url)
+        if validator is not None and validator == known[1]:
+            mesh = await asyncio.to_thread(mesh_cache.get, known[0], stl_path)
+            if mesh is not None:
+                mesh.download_skipped = True
+                download_stats["skipped"] += 1
+                download_stats["bytes_skipped"] += mesh.meta["source_bytes"]
+                logger.info(f"[{job_id}] Model {known[0][:12]} unchanged at {key}, download skipped")
+                return mesh
+
+    upload = stl_path.with_name("upload.stl")
+    digest, validator = await download_file(url, upload)
+    try:
+        with stage("preprocess"):
+            mesh = await asyncio.to_thread(mesh_cache.get, digest, stl_path)
+            if mesh is None:
+                mesh = await asyncio.to_thread(mesh_cache.build, digest, upload, stl_path)
+    except STLParseError as e:
+        raise HTTPException(400, f"Invalid STL: {e}")
+    finally:
+        upload.unlink(missing_ok=True)
+    if validator is not None:
+        mesh_cache.remember_url(key, validator, digest)
+    return mesh
+
+
+async def resolve_bundle(printer_ini: Optional[str] = None, filament_ini: Optional[str] = None,
+                         printer_id: Optional[str] = None, material_id: Optional[str] = None,
+                         strict: bool = True) -> Bundle:
+    """
+    The profile bundle for a request. An unknown profile is a 400 for a
+    slice; an estimate (strict=False) goes on without it.
+    """
+    try:
+        return await asyncio.to_thread(profile_registry.resolve, printer_ini, filament_ini,
+                                       printer_id, material_id, strict)
+    except ProfileError as e:
+        raise HTTPException(400, str(e))
+
+
+def bundle_settings(bundle: Bundle) -> PrintSettings:
+    """Analytic model settings with whatever the bundle's profiles specify."""
+    base = analytic_model.settings
+    if not bundle.settings:
+        return base
+    width = bundle.number("extrusion_width")
+    if not width or bundle.settings["extrusion_width"].endswith("%"):
+        width = base.extrusion_width_mm  # 0 / percentages are relative to the nozzle
+    solid = [n for n in (bundle.number("top_solid_layers"), bundle.number("bottom_solid_layers")) if n]
+    return PrintSettings(
+        perimeters=int(bundle.number("perimeters") or base.perimeters),
+        extrusion_width_mm=width,
+        top_bottom_layers=round(sum(solid) / len(solid)) if solid else base.top_bottom_layers,
+        filament_density=bundle.number("filament_density") or base.filament_density,
+        filament_diameter_mm=bundle.number("filament_diameter") or base.filament_diameter_mm,
+    )
+
+
+def slicing_params(layer_height: float, infill_percent: int, supports: bool) -> dict:
+    """Normalize slicing parameters so equivalent requests share a cache key."""
+    return {
+        "layer_height": round(float(layer_height), 3),
+        "infill_percent": int(infill_percent),
+        "supports": bool(supports),
+    }
 
 
 def build_slicer_command(
-    stl_path: Path,
+    stl_path: Union[Path, list[Path]],
     output_path: Path,
     layer_height: float,
     infill_percent: int,
     supports: bool,
-    printer_ini: Optional[str] = None,
-    filament_ini: Optional[str] = None,
+    bundle: Optional[Bundle] = None,
 ) -> list[str]:
-    """Build the PrusaSlicer CLI command."""
+    """Build the PrusaSlicer CLI command; several STLs are merged onto one plate."""
+    stl_paths = stl_path if isinstance(stl_path, list) else [stl_path]
     cmd = [PRUSA_SLICER_BIN]
 
-    # Load profiles if provided
-    if printer_ini:
-        ini_path = PROFILES_DIR / printer_ini
-        if ini_path.exists():
-            cmd.extend(["--load", str(ini_path)])
+    if SLICER_THREADS > 0:
+        cmd.extend(["--threads", str(SLICER_THREADS)])
 
-    if filament_ini:
-        ini_path = PROFILES_DIR / filament_ini
-        if ini_path.exists():
-            cmd.extend(["--load", str(ini_path)])
+    # One pre-merged INI instead of a --load per profile
+    if bundle is not None and bundle.path is not None:
+        cmd.extend(["--load", str(bundle.path)])
 
     cmd.extend([
         "--layer-height", str(layer_height),
@@ -95,17 +525,18 @@ def build_slicer_command(
     if supports:
         cmd.append("--support-material")
 
-    cmd.extend([
-        "--export-gcode",
-        "--output", str(output_path),
-        str(stl_path),
-    ])
+    if len(stl_paths) > 1:
+        # Arrange all models on one bed as separate, labelled objects
+        cmd.append("--merge")
+
+    cmd.extend(["--export-gcode", "--output", str(output_path)])
+    cmd.extend(str(p) for p in stl_paths)
 
     return cmd
 
 
 def parse_slicer_output(output: str, gcode_path: Path) -> dict:
-    """Parse PrusaSlicer output and G-code header for estimates."""
+    """Parse PrusaSlicer output and G-code comments for estimates."""
     result = {
         "grams_used": 0.0,
         "print_time_seconds": 0,
@@ -113,52 +544,17 @@ def parse_slicer_output(output: str, gcode_path: Path) -> dict:
         "filament_length_mm": None,
     }
 
-    # Try parsing G-code file header comments
     if gcode_path.exists():
         try:
-            with open(gcode_path, "r", errors="ignore") as f:
-                header_lines = []
-                for line in f:
-                    if not line.startswith(";"):
-                        if header_lines:
-                            break
-                        continue
-                    header_lines.append(line)
-
-                header = "\n".join(header_lines)
-
-                # Extract filament used (grams)
-                m = re.search(r"filament used \[g\]\s*=\s*([\d.]+)", header)
-                if m:
-                    result["grams_used"] = round(float(m.group(1)), 2)
-
-                # Extract filament used (mm)
-                m = re.search(r"filament used \[mm\]\s*=\s*([\d.]+)", header)
-                if m:
-                    result["filament_length_mm"] = round(float(m.group(1)), 2)
-
-                # Extract estimated time
-                m = re.search(r"estimated printing time.*?=\s*(?:(\d+)d\s*)?(?:(\d+)h\s*)?(?:(\d+)m\s*)?(?:(\d+)s)?", header)
-                if m:
-                    days = int(m.group(1) or 0)
-                    hours = int(m.group(2) or 0)
-                    mins = int(m.group(3) or 0)
-                    secs = int(m.group(4) or 0)
-                    result["print_time_seconds"] = days * 86400 + hours * 3600 + mins * 60 + secs
-
-                # Extract total layers
-                m = re.search(r"total layers count\s*=\s*(\d+)", header)
-                if m:
-                    result["layers"] = int(m.group(1))
-
+            result = parse_gcode_metadata(gcode_path)
         except Exception as e:
-            logger.warning(f"Failed to parse G-code header: {e}")
+            logger.warning(f"Failed to parse G-code metadata: {e}")
 
     # Fallback: parse CLI output
     if result["grams_used"] == 0:
-        m = re.search(r"([\d.]+)\s*g", output)
-        if m:
-            result["grams_used"] = round(float(m.group(1)), 2)
+        grams = grams_from_stdout(output)
+        if grams is not None:
+            result["grams_used"] = grams
 
     return result
 
@@ -168,108 +564,879 @@ async def health():
     return {"status": "ok", "slicer": PRUSA_SLICER_BIN}
 
 
-@app.post("/estimate")
-async def estimate(req: EstimateRequest):
-    """Quick estimate: slice to get time/grams but discard G-code."""
-    job_id = str(uuid.uuid4())[:8]
-    job_dir = WORKDIR / job_id
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return result_cache.stats()
+
+
+@app.get("/meshes/stats")
+async def mesh_cache_stats():
+    return mesh_cache.stats()
+
+
+@app.get("/scheduler/stats")
+async def scheduler_stats():
+    return {**scheduler.stats(), "jobs_active": jobs.active()}
+
+
+@app.get("/estimate/model")
+async def estimate_model():
+    return analytic_model.stats()
+
+
+@app.get("/jobs/stats")
+async def job_queue_stats():
+    return {**await asyncio.to_thread(queue.stats), "workers": JOB_WORKERS, "running_here": jobs.active()}
+
+
+@app.get("/profiles/stats")
+async def profiles_stats():
+    return profile_registry.stats()
+
+
+@app.post("/profiles/reload")
+async def profiles_reload():
+    await asyncio.to_thread(profile_registry.load)
+    return profile_registry.stats()
+
+
+@app.get("/plates/stats")
+async def plates_stats():
+    return plate_batcher.stats()
+
+
+@app.get("/reaper/stats")
+async def reaper_stats():
+    return reaper.stats()
+
+
+@app.get("/download/stats")
+async def download_stats_endpoint():
+    seconds = download_stats["seconds"]
+    return {
+        **download_stats,
+        "seconds": round(seconds, 3),
+        "throughput_mb_s": round(download_stats["bytes"] / (1024 * 1024) / seconds, 2) if seconds else 0.0,
+    }
+
+
+def publish(job_id: str, event: str, **data) -> None:
+    """Push a progress event to followers of job_id, if it is a tracked job."""
+    job = jobs.get(job_id)
+    if job is not None and job.finished_at is None:
+        job.publish(event, **data)
+
+
+def slicer_progress(job_id: str, gcode_path: Path):
+    """
+    Line handler for run_process: forwards PrusaSlicer progress lines and
+    sends the estimate as soon as the G-code has been exported.
+    """
+    def on_line(line: str) -> None:
+        progress = progress_from_line(line)
+        if progress is not None:
+            publish(job_id, "progress", stage="slicing", progress=progress[0], message=progress[1])
+        elif line.startswith(STDOUT_EXPORTED) and gcode_path.exists():
+            publish(job_id, "estimate", stage="exported", progress=100,
+                    estimate=parse_gcode_metadata(gcode_path))
+
+    return on_line
+
+
+async def run_slicer(job_id: str, cmd: list[str], timeout: int, priority: int,
+                     gcode_path: Optional[Path] = None) -> str:
+    """Run PrusaSlicer inside a scheduler slot and return its combined output."""
+    queued_at = time.monotonic()
+    publish(job_id, "stage", stage="queued")
+    async with scheduler.slot(priority):
+        record_stage("queue", time.monotonic() - queued_at)
+        logger.info(f"[{job_id}] Running: {' '.join(cmd)}")
+        publish(job_id, "stage", stage="slicing", progress=0)
+        on_line = slicer_progress(job_id, gcode_path) if gcode_path is not None else None
+
+        try:
+            with stage("slice"):
+                proc = await run_process(cmd, timeout=timeout, limits=process_limits, on_line=on_line)
+        except asyncio.TimeoutError:
+            SLICER_TIMEOUTS.inc()
+            raise HTTPException(504, f"Slicer timed out after {timeout}s")
+        except asyncio.CancelledError:
+            SLICER_CANCELLED.inc()
+            logger.info(f"[{job_id}] Slicer run cancelled")
+            raise
+
+    cpu = proc.cpu_user_seconds + proc.cpu_system_seconds
+    PROCESS_PEAK_RSS.observe(proc.peak_rss_bytes)
+    PROCESS_CPU.inc(proc.cpu_user_seconds, mode="user")
+    PROCESS_CPU.inc(proc.cpu_system_seconds, mode="system")
+    PROCESS_CPU_PER_RUN.observe(cpu)
+    annotate(peak_rss_bytes=proc.peak_rss_bytes, cpu_seconds=round(cpu, 3))
+
+    if proc.returncode != 0:
+        SLICER_FAILURES.inc()
+        logger.error(f"[{job_id}] Slicer failed ({proc.returncode}): {proc.output}")
+        if proc.returncode < 0:
+            # Killed by a signal, e.g. SIGXCPU/SIGKILL from RLIMIT_CPU
+            sig = -proc.returncode
+            raise HTTPException(500, f"Slicer killed by signal {sig} (resource limit?)")
+        raise HTTPException(500, f"Slicer failed: {proc.output[:500]}")
+
+    return proc.output
+
+
+def claim_job_dir(job_id: str, lease: Optional[str] = None) -> Path:
+    """
+    Create a fresh run dir under WORKDIR/<job_id> and protect it from the
+    reaper while in use. Every run gets its own: a queued job's is named after
+    its lease, so a host that lost the lease (still writing on the shared
+    volume) and the worker that took over never share or delete each other's.
+    """
+    if not JOB_ID_RE.match(job_id):
+        raise HTTPException(400, "Invalid job id")
+    if job_id in reaper.active:
+        raise HTTPException(409, f"Job {job_id} is already running")
+    job_dir = WORKDIR / job_id / (f"lease-{lease}" if lease else f"run-{uuid.uuid4().hex[:12]}")
     job_dir.mkdir(parents=True)
+    reaper.active.add(job_id)
+    return job_dir
 
+
+def publish_result(job_dir: Path) -> None:
+    """Point the job's /gcode at this finished run, dropping the run it replaces."""
+    pointer = job_dir.parent / RESULT_POINTER
     try:
-        stl_path = job_dir / "model.stl"
-        gcode_path = job_dir / "model.gcode"
+        previous = pointer.read_text().strip()
+    except OSError:
+        previous = None
+    tmp = pointer.with_name(f"{RESULT_POINTER}.{job_dir.name}.tmp")
+    tmp.write_text(job_dir.name)
+    tmp.replace(pointer)
+    if previous and previous != job_dir.name:
+        shutil.rmtree(job_dir.parent / previous, ignore_errors=True)
 
-        await download_file(req.stl_url, stl_path)
 
-        cmd = build_slicer_command(
-            stl_path, gcode_path,
-            req.layer_height, req.infill_percent, req.supports,
-        )
+def result_dir(job_id: str) -> Optional[Path]:
+    """The published run dir of a finished slice, if there is one."""
+    try:
+        name = (WORKDIR / job_id / RESULT_POINTER).read_text().strip()
+    except OSError:
+        return None
+    return WORKDIR / job_id / name
 
-        logger.info(f"[{job_id}] Running estimate: {' '.join(cmd)}")
 
-        proc = await asyncio.create_subprocess_exec(
-            *cmd,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.STDOUT,
-        )
-        stdout, _ = await asyncio.wait_for(proc.communicate(), timeout=300)
-        output = stdout.decode(errors="ignore")
+async def finished_gcode(job_id: str) -> Path:
+    """The G-code of a finished slice, found through the run it published."""
+    if not JOB_ID_RE.match(job_id):
+        raise HTTPException(400, "Invalid job id")
+    job_dir = result_dir(job_id)
+    if job_dir is None:
+        raise HTTPException(404, "G-code not found or expired")
+    gcode_path = job_dir / "model.gcode"
+    if not gcode_path.exists():
+        try:
+            plate = json.loads((job_dir / PLATE_MARKER).read_text())
+        except (OSError, ValueError):
+            raise HTTPException(404, "G-code not found or expired")
+        # The order has no G-code of its own; the plate's prints every order on it
+        raise HTTPException(409, {
+            "error": "Order was sliced on a shared plate",
+            "plate_id": plate["plate_id"],
+            "orders": plate["orders"],
+            "gcode_url": plate["gcode_url"],
+        })
+    return gcode_path
+
+
+def fast_estimate(mesh: Mesh, req: EstimateParams, bundle: Bundle) -> dict:
+    """Analytic estimate from the preprocessed mesh's geometry; no slicer run."""
+    start = time.perf_counter()
+    stats = mesh.stats_for(req.layer_height)
+    result = analytic_model.predict(stats, req.layer_height, req.infill_percent, req.supports,
+                                    bundle_settings(bundle))
+    result["mode"] = "fast"
+    result["calibrated"] = analytic_model.calibrated
+    result["geometry"] = stats
+    logger.info(f"Fast estimate in {(time.perf_counter() - start) * 1000:.1f} ms: {result}")
+    return result
+
+
+def record_calibration(mesh: Mesh, layer_height: float, infill_percent: int,
+                       supports: bool, result: dict, bundle: Bundle) -> None:
+    """Feed a real slicer result back into the analytic model."""
+    try:
+        stats = mesh.stats_for(layer_height)
+        analytic_model.record(stats, layer_height, infill_percent, supports, result, bundle_settings(bundle))
+    except Exception as e:
+        logger.warning(f"Calibration sample skipped: {e}")
 
-        if proc.returncode != 0:
-            logger.error(f"[{job_id}] Slicer failed: {output}")
-            raise HTTPException(500, f"Slicer failed: {output[:500]}")
 
+async def estimate_downloaded(job_id: str, mesh: Mesh, req: EstimateParams, gcode_path: Path) -> dict:
+    """Estimate for an STL that is already in the job dir, with its mesh stats."""
+    bundle = await resolve_bundle(printer_id=req.printer_profile_id, material_id=req.material_profile_id,
+                                  strict=False)
+    if req.mode == "fast":
+        return {**fast_estimate(mesh, req, bundle), "mesh": mesh.report(req.layer_height)}
+
+    key = cache_key(
+        mesh.mesh_digest,
+        slicing_params(req.layer_height, req.infill_percent, req.supports),
+        bundle.digest,
+    )
+    cached = result_cache.get(key)
+    if cached is not None:
+        logger.info(f"[{job_id}] Estimate cache hit {key[:12]}")
+        return {**cached, "mesh": mesh.report(req.layer_height)}
+
+    cmd = build_slicer_command(
+        mesh.path, gcode_path,
+        req.layer_height, req.infill_percent, req.supports,
+        bundle,
+    )
+    output = await run_slicer(job_id, cmd, timeout=SLICER_ESTIMATE_TIMEOUT, priority=PRIORITY_ESTIMATE,
+                              gcode_path=gcode_path)
+
+    with stage("parse"):
         result = parse_slicer_output(output, gcode_path)
-        logger.info(f"[{job_id}] Estimate: {result}")
+    if gcode_path.exists():
+        GCODE_BYTES.observe(gcode_path.stat().st_size)
+    logger.info(f"[{job_id}] Estimate: {result}")
+    result_cache.put(key, result, gcode_path)
+    record_calibration(mesh, req.layer_height, req.infill_percent, req.supports, result, bundle)
+
+    return {**result, "mesh": mesh.report(req.layer_height)}
+
+
+async def run_estimate(req: EstimateRequest, job_id: str, lease: Optional[str] = None) -> dict:
+    """Quick estimate: slice to get time/grams but discard G-code."""
+    job_dir = claim_job_dir(job_id, lease)
+
+    try:
+        with track_job(job_id, "estimate", logger):
+            annotate(mode=req.mode)
+            mesh = await fetch_model(job_id, req.stl_url, job_dir / "model.stl")
+            return await estimate_downloaded(job_id, mesh, req, job_dir / "model.gcode")
+
+    finally:
+        shutil.rmtree(job_dir, ignore_errors=True)
+        reaper.active.discard(job_id)
+
+
+def split_plate(totals: dict, usage: dict[int, dict], job_ids: list[str], plate_id: str) -> list[dict]:
+    """
+    Per-order estimates from a plate: filament by each object's share of
+    labelled extrusion, time by its share of move time. Skirt and travel
+    between objects are spread over the orders by the same shares.
+    """
+    extrusion = [usage.get(i, {}).get("extrusion_mm", 0.0) for i in range(len(job_ids))]
+    seconds = [usage.get(i, {}).get("time_seconds", 0.0) for i in range(len(job_ids))]
+    if sum(extrusion) <= 0 or sum(seconds) <= 0:
+        raise ValueError("Plate G-code has no per-object labels")
 
-        return result
+    results = []
+    for i, job_id in enumerate(job_ids):
+        share = extrusion[i] / sum(extrusion)
+        time_share = seconds[i] / sum(seconds)
+        estimate = {
+            "grams_used": round(totals["grams_used"] * share, 2),
+            "print_time_seconds": int(totals["print_time_seconds"] * time_share),
+            "layers": usage.get(i, {}).get("layers") or totals["layers"],
+            "max_z_mm": usage.get(i, {}).get("max_z_mm"),
+            "filament_length_mm": (
+                round(totals["filament_length_mm"] * share, 2) if totals["filament_length_mm"] else None
+            ),
+        }
+        plate = {
+            "plate_id": plate_id,
+            "orders": job_ids,
+            "filament_share": round(share, 4),
+            "time_share": round(time_share, 4),
+            "plate_estimate": totals,
+            "gcode_url": f"/gcode/{plate_id}",
+        }
+        results.append({"estimate": estimate, "plate": plate})
+    return results
+
+
+async def slice_plate(items: list[PlateItem]) -> list[dict]:
+    """Slice several orders' STLs as one plate and split the totals per order."""
+    plate_id = f"plate-{uuid.uuid4().hex[:8]}"
+    plate_dir = claim_job_dir(plate_id)
+    job_ids = [item.job_id for item in items]
+    try:
+        with track_job(plate_id, "slice_plate", logger):
+            annotate(orders=job_ids)
+            stl_paths = []
+            for item in items:
+                # Own links, so an order's job dir may go away mid-run
+                link = plate_dir / f"{item.job_id}.stl"
+                try:
+                    os.link(item.stl_path, link)
+                except OSError:
+                    shutil.copyfile(item.stl_path, link)
+                stl_paths.append(link)
+
+            req, bundle = items[0].request
+            gcode_path = plate_dir / "model.gcode"
+            cmd = build_slicer_command(
+                stl_paths, gcode_path,
+                req.layer_height, req.infill_percent, req.supports,
+                bundle,
+            )
+            output = await run_slicer(plate_id, cmd, timeout=SLICER_SLICE_TIMEOUT, priority=PRIORITY_SLICE)
+            if not gcode_path.exists():
+                raise HTTPException(500, "G-code file was not produced")
+
+            with stage("parse"):
+                totals = parse_slicer_output(output, gcode_path)
+                usage = await asyncio.to_thread(analyze_objects, gcode_path)
+            GCODE_BYTES.observe(gcode_path.stat().st_size)
+            logger.info(f"[{plate_id}] Plate of {len(items)} orders {job_ids}: {totals}")
+            publish_result(plate_dir)
+            return split_plate(totals, usage, job_ids, plate_id)
+
+    except BaseException:
+        shutil.rmtree(plate_dir, ignore_errors=True)
+        raise
 
     finally:
+        reaper.active.discard(plate_id)
+
+
+plate_batcher = PlateBatcher(PLATE_BATCH_WINDOW_MS / 1000.0, PLATE_BATCH_MAX_ORDERS, slice_plate)
+Gauge("slicer_plates_total", "Multi-order plates sliced", lambda: plate_batcher.plates, counter=True)
+Gauge("slicer_plate_orders_total", "Orders sliced on a shared plate",
+      lambda: plate_batcher.orders_batched, counter=True)
+
+
+async def slice_on_plate(req: SliceRequest, job_id: str, stl_path: Path, gcode_path: Path,
+                         bundle: Bundle) -> Optional[tuple[dict, dict]]:
+    """
+    (estimate, plate) if this order was sliced on a shared plate, else None.
+    The order's job dir gets a plate.json instead of a G-code file, so its
+    /gcode URL answers 409 and points at the plate rather than serving the
+    other orders' parts as this order's.
+    """
+    if not plate_batcher.enabled or stl_path.stat().st_size > PLATE_BATCH_MAX_STL_MB * 1024 * 1024:
+        return None
+    batch_key = json.dumps({
+        **slicing_params(req.layer_height, req.infill_percent, req.supports),
+        "profiles": bundle.digest,
+    }, sort_keys=True)
+    publish(job_id, "stage", stage="batching")
+    with stage("plate"):
+        plated = await plate_batcher.submit(batch_key, job_id, stl_path, (req, bundle))
+    if plated is None:
+        return None
+
+    gcode_path.with_name(PLATE_MARKER).write_text(json.dumps(plated["plate"]))
+    return plated["estimate"], plated["plate"]
+
+
+async def run_slice(req: SliceRequest, job_id: str, lease: Optional[str] = None) -> dict:
+    """
+    Full slice: produce G-code and return its download URL. A queued job's
+    run (one with a lease) is published by the worker once the queue has
+    accepted its result; any other run publishes itself.
+    """
+    job_dir = claim_job_dir(job_id, lease)
+
+    try:
+        with track_job(job_id, "slice", logger):
+            stl_path = job_dir / "model.stl"
+            gcode_path = job_dir / "model.gcode"
+            bundle = await resolve_bundle(req.printer_ini, req.filament_ini,
+                                          req.printer_profile_id, req.material_profile_id)
+
+            mesh = await fetch_model(job_id, req.stl_url, stl_path)
+
+            key = cache_key(
+                mesh.mesh_digest,
+                slicing_params(req.layer_height, req.infill_percent, req.supports),
+                bundle.digest,
+            )
+            estimate = result_cache.get(key, need_gcode=True)
+            cached_gcode = result_cache.gcode_path(key) if estimate is not None else None
+
+            if cached_gcode is not None:
+                logger.info(f"[{job_id}] Slice cache hit {key[:12]}")
+                shutil.copyfile(cached_gcode, gcode_path)
+            elif (plated := await slice_on_plate(req, job_id, stl_path, gcode_path, bundle)) is not None:
+                # The G-code is the shared plate's; only this order's share is returned
+                estimate, plate = plated
+                annotate(plate_id=plate["plate_id"])
+                if lease is None:
+                    publish_result(job_dir)
+                gcode_size = (result_dir(plate["plate_id"]) / "model.gcode").stat().st_size
+                logger.info(f"[{job_id}] Sliced on plate {plate['plate_id']}: {estimate}")
+                # No per-order G-code: the caller fetches the plate's once for all its orders
+                return {
+                    "success": True,
+                    "estimate": estimate,
+                    "gcode_size_bytes": gcode_size,
+                    "gcode_storage_key": None,
+                    "gcode_url": None,
+                    "plate": plate,
+                    "mesh": mesh.report(req.layer_height),
+                }
+            else:
+                cmd = build_slicer_command(
+                    stl_path, gcode_path,
+                    req.layer_height, req.infill_percent, req.supports,
+                    bundle,
+                )
+                output = await run_slicer(job_id, cmd, timeout=SLICER_SLICE_TIMEOUT, priority=PRIORITY_SLICE,
+                                          gcode_path=gcode_path)
+
+                if not gcode_path.exists():
+                    raise HTTPException(500, "G-code file was not produced")
+
+                with stage("parse"):
+                    estimate = parse_slicer_output(output, gcode_path)
+                result_cache.put(key, estimate, gcode_path)
+                record_calibration(mesh, req.layer_height, req.infill_percent, req.supports, estimate, bundle)
+            gcode_size = gcode_path.stat().st_size
+            GCODE_BYTES.observe(gcode_size)
+            annotate(gcode_bytes=gcode_size)
+
+            logger.info(f"[{job_id}] Slice complete: {gcode_size} bytes, {estimate}")
+            if lease is None:
+                publish_result(job_dir)
+
+            # The G-code stays in the job dir until the reaper collects it;
+            # the Next.js API downloads it from gcode_url and uploads to storage.
+            return {
+                "success": True,
+                "estimate": estimate,
+                "gcode_size_bytes": gcode_size,
+                "gcode_storage_key": f"gcode/{job_id}.gcode",
+                "gcode_url": f"/gcode/{job_id}",
+                "mesh": mesh.report(req.layer_height),
+            }
+
+    except BaseException:
         shutil.rmtree(job_dir, ignore_errors=True)
+        raise
+
+    finally:
+        reaper.active.discard(job_id)
+
+
+def too_busy(e: SchedulerBusy) -> HTTPException:
+    return HTTPException(429, str(e), headers={"Retry-After": str(e.retry_after)})
+
+
+def admit() -> None:
+    """Reject new work with 429 + Retry-After when the slicer queue is full."""
+    try:
+        scheduler.check_capacity()
+    except SchedulerBusy as e:
+        raise too_busy(e)
+
+
+async def cancel_on_disconnect(request: Request, coro):
+    """Await coro, cancelling it (and killing its slicer) if the client goes away."""
+    task = asyncio.ensure_future(coro)
+    disconnected = False
+
+    async def watch():
+        nonlocal disconnected
+        while not task.done():
+            if await request.is_disconnected():
+                disconnected = True
+                task.cancel()
+                return
+            await asyncio.sleep(DISCONNECT_POLL_SECONDS)
+
+    watcher = asyncio.create_task(watch())
+    try:
+        return await task
+    except asyncio.CancelledError:
+        if disconnected:
+            logger.info(f"Client disconnected from {request.url.path}; job cancelled")
+            raise HTTPException(499, "Client disconnected")
+        raise
+    finally:
+        watcher.cancel()
+
+
+@app.post("/estimate")
+async def estimate(req: EstimateRequest, request: Request):
+    """Quick estimate: slice to get time/grams but discard G-code."""
+    if req.mode == "exact":
+        admit()
+    try:
+        return await cancel_on_disconnect(request, run_estimate(req, str(uuid.uuid4())[:8]))
+    except SchedulerBusy as e:
+        raise too_busy(e)
+
+
+def _variant_key(variant: EstimateParams) -> str:
+    params = slicing_params(variant.layer_height, variant.infill_percent, variant.supports)
+    params.update(
+        mode=variant.mode,
+        printer_profile_id=variant.printer_profile_id,
+        material_profile_id=variant.material_profile_id,
+    )
+    return json.dumps(params, sort_keys=True)
+
+
+@app.post("/estimate/batch")
+async def estimate_batch(req: BatchEstimateRequest):
+    """
+    Estimate many parameter variants of one STL. The file is downloaded once,
+    identical variants are computed once, and results stream back as NDJSON
+    lines ({"index", "params", "result" | "error"}) in completion order.
+    """
+    if not req.variants:
+        raise HTTPException(400, "No variants given")
+    if len(req.variants) > MAX_BATCH_VARIANTS:
+        raise HTTPException(400, f"Too many variants (max {MAX_BATCH_VARIANTS})")
+
+    groups: dict[str, list[int]] = {}
+    for i, variant in enumerate(req.variants):
+        groups.setdefault(_variant_key(variant), []).append(i)
+
+    if any(v.mode == "exact" for v in req.variants):
+        admit()
+
+    job_id = str(uuid.uuid4())[:8]
+    job_dir = claim_job_dir(job_id)
+    try:
+        with track_job(job_id, "estimate_batch", logger):
+            annotate(variants=len(req.variants), unique=len(groups))
+            mesh = await fetch_model(job_id, req.stl_url, job_dir / "model.stl")
+    except BaseException:
+        shutil.rmtree(job_dir, ignore_errors=True)
+        reaper.active.discard(job_id)
+        raise
+
+    # Keep one batch from occupying more than the worker pool at once
+    fan_out = asyncio.Semaphore(SLICER_WORKERS)
+
+    async def run_variant(n: int, indices: list[int]):
+        variant = req.variants[indices[0]]
+        async with fan_out:
+            try:
+                with track_job(f"{job_id}-{n}", "estimate_variant", logger):
+                    result = await estimate_downloaded(
+                        f"{job_id}-{n}", mesh, variant, job_dir / f"variant-{n}.gcode",
+                    )
+                return indices, {"result": result}
+            except HTTPException as e:
+                return indices, {"error": e.detail, "status_code": e.status_code}
+            except SchedulerBusy as e:
+                return indices, {"error": str(e), "status_code": 429}
+            except Exception as e:
+                logger.exception(f"[{job_id}] Variant {n} failed")
+                return indices, {"error": str(e) or type(e).__name__, "status_code": 500}
+
+    async def stream():
+        tasks = [asyncio.create_task(run_variant(n, idx)) for n, idx in enumerate(groups.values())]
+        try:
+            for done in asyncio.as_completed(tasks):
+                indices, outcome = await done
+                for i in indices:
+                    line = {"index": i, "params": req.variants[i].model_dump(), **outcome}
+                    yield json.dumps(line) + "\n"
+        finally:
+            for task in tasks:
+                task.cancel()
+            shutil.rmtree(job_dir, ignore_errors=True)
+            reaper.active.discard(job_id)
+
+    logger.info(f"[{job_id}] Batch estimate: {len(req.variants)} variants, {len(groups)} unique")
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
 
 
 @app.post("/slice")
-async def slice(req: SliceRequest):
+async def slice(req: SliceRequest, request: Request):
     """Full slice: produce G-code and return download URL or path."""
-    job_id = req.order_id or str(uuid.uuid4())[:8]
-    job_dir = WORKDIR / job_id
-    job_dir.mkdir(parents=True)
+    admit()
+    try:
+        return await cancel_on_disconnect(request, run_slice(req, req.order_id or str(uuid.uuid4())[:8]))
+    except SchedulerBusy as e:
+        raise too_busy(e)
 
+
+async def _run_job(job: Job, coro) -> None:
+    job.status = "running"
+    job.started_at = time.time()
     try:
-        stl_path = job_dir / "model.stl"
-        gcode_path = job_dir / "model.gcode"
+        job.result = await coro
+        job.status = "done"
+    except HTTPException as e:
+        job.status = "failed"
+        job.error = str(e.detail)
+        job.status_code = e.status_code
+    except SchedulerBusy as e:
+        job.status = "failed"
+        job.error = str(e)
+        job.status_code = 429
+    except asyncio.CancelledError:
+        job.status = "cancelled"
+        job.error = "Cancelled"
+        job.status_code = 410
+    except Exception as e:
+        logger.exception(f"[{job.id}] Job failed")
+        job.status = "failed"
+        job.error = str(e) or type(e).__name__
+        job.status_code = 500
+    finally:
+        if job.status == "done":
+            job.publish("done", stage="done", result=job.result)
+        else:
+            job.publish(job.status, stage=job.status, error=job.error, status_code=job.status_code)
+        job.finished_at = time.time()
 
-        await download_file(req.stl_url, stl_path)
 
-        cmd = build_slicer_command(
-            stl_path, gcode_path,
-            req.layer_height, req.infill_percent, req.supports,
-            req.printer_ini, req.filament_ini,
-        )
+# Retrying cannot fix a bad model or bad request; it can fix a flaky download
+RETRYABLE_STATUS = {429, 502, 503}
+JOB_RUNNERS = {
+    "estimate": (EstimateRequest, run_estimate, PRIORITY_ESTIMATE),
+    "slice": (SliceRequest, run_slice, PRIORITY_SLICE),
+}
+job_wakeup = asyncio.Event()
+
+
+async def submit_job(kind: str, job_id: str, req: BaseModel) -> dict:
+    """Enqueue durably; resubmitting a live job id returns the existing job."""
+    if not JOB_ID_RE.match(job_id):
+        raise HTTPException(400, "Invalid job id")
+    priority = JOB_RUNNERS[kind][2]
+    try:
+        row, created = await asyncio.to_thread(queue.submit, kind, job_id, req.model_dump(), priority)
+    except QueueFull as e:
+        raise HTTPException(429, f"Job queue is full ({e})",
+                            headers={"Retry-After": str(scheduler.retry_after())})
+    if created:
+        job_wakeup.set()
+    return public_job(row)
+
+
+async def execute_claimed(row: dict, owner: str) -> None:
+    """Run a leased job here, renewing the lease until it finishes."""
+    model, runner, _ = JOB_RUNNERS[row["kind"]]
+    job = Job(id=row["id"], kind=row["kind"])
+    jobs.add(job)
+    # Unique per lease, unlike the attempt count, which restarts when a failed id is resubmitted
+    lease = uuid.uuid4().hex[:12]
+    job.task = asyncio.create_task(_run_job(job, runner(model(**row["payload"]), row["id"], lease)))
+
+    interval = max(1.0, JOB_LEASE_SECONDS / 3)
+    try:
+        while not job.task.done():
+            await asyncio.wait([job.task], timeout=interval)
+            if job.task.done():
+                break
+            still_ours = await asyncio.to_thread(queue.heartbeat, job.id, owner, job.stage, job.progress)
+            if not still_ours:
+                # Cancelled via the API (possibly on another node) or re-leased
+                logger.info(f"[{job.id}] Lease lost, stopping")
+                job.task.cancel()
+        await asyncio.gather(job.task, return_exceptions=True)
+    except asyncio.CancelledError:
+        # Shutting down: kill the slicer and hand the job back for another worker
+        job.task.cancel()
+        await asyncio.gather(job.task, return_exceptions=True)
+        await asyncio.to_thread(queue.fail, job.id, owner, "Worker shut down", 503, True)
+        raise
+
+    job_dir = WORKDIR / job.id / f"lease-{lease}"
+    if job.status == "done":
+        if await asyncio.to_thread(queue.complete, job.id, owner, job.result):
+            if job_dir.exists():  # estimates leave nothing to publish
+                publish_result(job_dir)
+        else:
+            # Lost the lease just before finishing; the new holder publishes its own run
+            shutil.rmtree(job_dir, ignore_errors=True)
+    elif job.status == "failed":
+        retry = job.status_code in RETRYABLE_STATUS
+        await asyncio.to_thread(queue.fail, job.id, owner, job.error, job.status_code or 500, retry)
 
-        logger.info(f"[{job_id}] Running slice: {' '.join(cmd)}")
 
-        proc = await asyncio.create_subprocess_exec(
-            *cmd,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.STDOUT,
+async def job_worker(owner: str) -> None:
+    """Claim and run queued jobs; one worker runs one job at a time."""
+    while True:
+        try:
+            row = await asyncio.to_thread(queue.claim, owner)
+        except Exception as e:
+            logger.warning(f"Job claim failed: {e}")
+            row = None
+        if row is None:
+            job_wakeup.clear()
+            try:
+                await asyncio.wait_for(job_wakeup.wait(), timeout=JOB_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            continue
+        logger.info(f"[{row['id']}] Claimed {row['kind']} job (attempt {row['attempts']})")
+        try:
+            await execute_claimed(row, owner)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception(f"[{row['id']}] Job worker error")
+
+
+async def purge_jobs_forever() -> None:
+    while True:
+        try:
+            purged = await asyncio.to_thread(queue.purge, JOB_RESULT_TTL)
+            if purged:
+                logger.info(f"Purged {purged} finished jobs")
+        except Exception as e:
+            logger.warning(f"Job purge failed: {e}")
+        await asyncio.sleep(REAPER_INTERVAL_SECONDS)
+
+
+async def reload_profiles_forever() -> None:
+    """Pick up added or edited profile INIs without a restart."""
+    while True:
+        await asyncio.sleep(PROFILE_RELOAD_SECONDS)
+        try:
+            await asyncio.to_thread(profile_registry.reload_if_changed)
+        except Exception as e:
+            logger.warning(f"Profile reload failed: {e}")
+
+
+async def get_job_row(job_id: str) -> dict:
+    row = await asyncio.to_thread(queue.get, job_id)
+    if row is None:
+        raise HTTPException(404, "Unknown job")
+    return row
+
+
+def _gzip_chunks(path: Path, chunk_size: int = 256 * 1024):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+    yield compressor.flush()
+
+
+@app.get("/gcode/{job_id}")
+async def download_gcode(job_id: str, gzip: bool = False):
+    """Stream the G-code of a finished slice; gzip=true compresses on the fly."""
+    gcode_path = await finished_gcode(job_id)
+
+    filename = f"{job_id}.gcode"
+    if gzip:
+        return StreamingResponse(
+            _gzip_chunks(gcode_path),
+            media_type="text/x-gcode",
+            headers={
+                "Content-Encoding": "gzip",
+                "Content-Disposition": f'attachment; filename="{filename}"',
+            },
         )
-        stdout, _ = await asyncio.wait_for(proc.communicate(), timeout=600)
-        output = stdout.decode(errors="ignore")
+    return FileResponse(gcode_path, media_type="text/x-gcode", filename=filename)
 
-        if proc.returncode != 0:
-            logger.error(f"[{job_id}] Slicer failed: {output}")
-            raise HTTPException(500, f"Slicer failed: {output[:500]}")
 
-        if not gcode_path.exists():
-            raise HTTPException(500, "G-code file was not produced")
+@app.get("/gcode/{job_id}/layers")
+async def gcode_layers(job_id: str):
+    """Per-layer Z, extrusion and move time of a finished slice."""
+    gcode_path = await finished_gcode(job_id)
+    layers = await asyncio.to_thread(analyze_layers, gcode_path)
+    return {"job_id": job_id, "layer_count": len(layers), "layers": layers}
 
-        estimate = parse_slicer_output(output, gcode_path)
-        gcode_size = gcode_path.stat().st_size
 
-        logger.info(f"[{job_id}] Slice complete: {gcode_size} bytes, {estimate}")
+@app.post("/jobs/estimate", status_code=202)
+async def submit_estimate(req: EstimateRequest):
+    """Queue an estimate and return immediately; poll /jobs/{job_id}."""
+    return await submit_job("estimate", str(uuid.uuid4())[:8], req)
 
-        # In production, upload G-code to object storage and return the key.
-        # For now, serve the file via a temporary endpoint or return its path.
-        # The Next.js API will handle uploading to Supabase Storage.
 
-        # Read G-code into memory for the response (or use file streaming)
-        gcode_bytes = gcode_path.read_bytes()
+@app.post("/jobs/slice", status_code=202)
+async def submit_slice(req: SliceRequest):
+    """Queue a slice and return immediately; resubmitting an order_id is a no-op."""
+    return await submit_job("slice", req.order_id or str(uuid.uuid4())[:8], req)
 
-        return {
-            "success": True,
-            "estimate": estimate,
-            "gcode_size_bytes": gcode_size,
-            "gcode_storage_key": f"gcode/{job_id}.gcode",
-            # In production: upload to S3/Supabase and return signed URL
-            # "gcode_url": "https://storage.example.com/..."
-        }
 
-    finally:
-        # Clean up after response is sent
-        # In production use background cleanup
-        pass
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    return public_job(await get_job_row(job_id))
+
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """
+    Server-Sent Events for a job: stage changes, slicer progress, the
+    estimate as soon as the G-code is written, then done/failed/cancelled.
+    Past events are replayed first, so late subscribers miss nothing.
+    """
+    row = await get_job_row(job_id)
+
+    async def stream():
+        yield f"event: status\ndata: {json.dumps(public_job(row))}\n\n"
+        last = public_job(row)
+        idle = 0.0
+        while last["status"] not in TERMINAL:
+            job = jobs.get(job_id)
+            if job is not None and job.finished_at is None:
+                # Running in this process: follow its live events
+                async for event in job.follow(SSE_KEEPALIVE_SECONDS):
+                    if event is None:
+                        yield ": keepalive\n\n"
+                        continue
+                    yield f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
+                return
+            # Queued, or running on another worker: relay its state from the queue
+            await asyncio.sleep(JOB_POLL_SECONDS)
+            current = await asyncio.to_thread(queue.get, job_id)
+            if current is None:
+                return
+            state = public_job(current)
+            if state != last:
+                last, idle = state, 0.0
+                if state["status"] in TERMINAL:
+                    final = {"event": state["status"], **state, "result": current["result"]}
+                    yield f"event: {state['status']}\ndata: {json.dumps(final)}\n\n"
+                else:
+                    yield f"event: status\ndata: {json.dumps(state)}\n\n"
+            else:
+                idle += JOB_POLL_SECONDS
+                if idle >= SSE_KEEPALIVE_SECONDS:
+                    idle = 0.0
+                    yield ": keepalive\n\n"
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        # Stop nginx-style proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """
+    Cancel a queued or running job. Here its slicer process group is killed
+    at once; on another worker, at that worker's next lease renewal.
+    """
+    await get_job_row(job_id)
+    row = await asyncio.to_thread(queue.cancel, job_id)
+    job = jobs.get(job_id)
+    if job is not None and job.task is not None and not job.task.done():
+        job.task.cancel()
+        await asyncio.gather(job.task, return_exceptions=True)
+    return public_job(row)
+
+
+@app.get("/jobs/{job_id}/result")
+async def job_result(job_id: str):
+    row = await get_job_row(job_id)
+    if row["status"] in ("failed", "cancelled"):
+        raise HTTPException(row["status_code"] or 500, row["error"])
+    if row["status"] != "done":
+        raise HTTPException(409, f"Job is {row['status']}")
+    return row["result"]
 
 
 if __name__ == "__main__":
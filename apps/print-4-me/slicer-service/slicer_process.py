@@ -0,0 +1,215 @@
+"""
+PrusaSlicer subprocess execution with resource accounting and governance.
+The child runs in its own process group so timeouts and cancellations kill
+the whole tree; it is reaped with os.wait4 so each job gets its own peak RSS
+and CPU time (asyncio's child watcher only reports the exit status). Its
+exit is awaited through a pidfd on the event loop, without holding a thread
+per running slicer, and the group is killed before the leader is reaped so
+the pgid cannot have been reused.
+"""
+
+import os
+import time
+import signal
+import asyncio
+import logging
+import resource
+import functools
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+logger = logging.getLogger("slicer-api.process")
+
+# PrusaSlicer prints short lines; a longer run without a newline is handed
+# to on_line in pieces of this size instead of being buffered without end
+LINE_LIMIT = 1024 * 1024
+READ_CHUNK = 64 * 1024
+
+# Only for kernels without pidfd_open: blocking waits, kept off the default executor
+_wait_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="slicer-wait")
+
+
+@dataclass
+class ProcessLimits:
+    memory_bytes: int = 0  # RLIMIT_AS; 0 = unlimited
+    cpu_seconds: int = 0  # RLIMIT_CPU; 0 = unlimited
+    nice: int = 0
+    cpus: set[int] = field(default_factory=set)  # empty = inherit affinity
+    kill_grace_seconds: float = 2.0
+
+
+@dataclass
+class ProcessResult:
+    returncode: int
+    output: str
+    wall_seconds: float
+    cpu_user_seconds: float
+    cpu_system_seconds: float
+    peak_rss_bytes: int
+
+
+def parse_cpu_list(spec: str) -> set[int]:
+    """'0,2-3' -> {0, 2, 3}"""
+    cpus = set()
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        lo, _, hi = part.partition("-")
+        cpus.update(range(int(lo), int(hi or lo) + 1))
+    return cpus
+
+
+def _limiter(limits: ProcessLimits) -> Optional[Callable[[], None]]:
+    """
+    A preexec_fn that applies the limits in the child before exec, so the
+    slicer never runs unlimited. It only makes plain syscalls; a failure is
+    written to the child's output rather than stopping the slice.
+    """
+    if not (limits.memory_bytes or limits.cpu_seconds or limits.nice or limits.cpus):
+        return None
+
+    def apply() -> None:
+        try:
+            if limits.memory_bytes:
+                resource.setrlimit(resource.RLIMIT_AS, (limits.memory_bytes, limits.memory_bytes))
+            if limits.cpu_seconds:
+                # Soft limit sends SIGXCPU, hard limit a few seconds later SIGKILL
+                resource.setrlimit(resource.RLIMIT_CPU, (limits.cpu_seconds, limits.cpu_seconds + 5))
+            if limits.nice:
+                os.setpriority(os.PRIO_PROCESS, 0, limits.nice)
+            if limits.cpus:
+                os.sched_setaffinity(0, limits.cpus)
+        except (OSError, ValueError) as e:
+            os.write(2, f"slicer-api: could not apply process limits: {e}\n".encode())
+
+    return apply
+
+
+def _signal_group(pgid: int, sig: int) -> None:
+    try:
+        os.killpg(pgid, sig)
+    except ProcessLookupError:
+        pass
+
+
+async def _exited(pid: int) -> None:
+    """Wait for the child to exit without reaping it, so its pgid stays reserved."""
+    loop = asyncio.get_running_loop()
+    try:
+        pidfd = os.pidfd_open(pid)
+    except (AttributeError, OSError):
+        await loop.run_in_executor(_wait_executor, functools.partial(
+            os.waitid, os.P_PID, pid, os.WEXITED | os.WNOWAIT))
+        return
+    readable = loop.create_future()
+    loop.add_reader(pidfd, lambda: readable.done() or readable.set_result(None))
+    try:
+        await readable
+    finally:
+        loop.remove_reader(pidfd)
+        os.close(pidfd)
+
+
+async def _terminate(pgid: int, exited: asyncio.Future, grace: float) -> None:
+    """SIGTERM the process group, then SIGKILL if it has not exited in time."""
+    _signal_group(pgid, signal.SIGTERM)
+    try:
+        await asyncio.wait_for(asyncio.shield(exited), timeout=grace)
+    except asyncio.TimeoutError:
+        _signal_group(pgid, signal.SIGKILL)
+        # SIGKILL cannot be ignored
+        await asyncio.shield(exited)
+    # The unreaped leader keeps the pgid ours; sweep any stragglers, then reap
+    _signal_group(pgid, signal.SIGKILL)
+    os.wait4(pgid, 0)
+
+
+def _emit(on_line: Optional[Callable[[str], None]], line: bytes) -> None:
+    if on_line is None:
+        return
+    try:
+        on_line(line.decode(errors="ignore").rstrip())
+    except Exception:
+        logger.exception("Output line handler failed")
+
+
+async def _read_lines(reader: asyncio.StreamReader,
+                      on_line: Optional[Callable[[str], None]]) -> bytes:
+    """
+    Read output in chunks as it arrives, handing each line to on_line.
+    Lines are split here rather than with readline(), which raises once a
+    line outgrows the stream limit.
+    """
+    chunks = []
+    pending = b""
+    while chunk := await reader.read(READ_CHUNK):
+        chunks.append(chunk)
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            _emit(on_line, line)
+        while len(pending) >= LINE_LIMIT:
+            _emit(on_line, pending[:LINE_LIMIT])
+            pending = pending[LINE_LIMIT:]
+    if pending:
+        _emit(on_line, pending)
+    return b"".join(chunks)
+
+
+async def run_process(cmd: list[str], timeout: float,
+                      limits: Optional[ProcessLimits] = None,
+                      on_line: Optional[Callable[[str], None]] = None) -> ProcessResult:
+    """
+    Run cmd with stdout+stderr captured; on_line sees each line as soon as
+    it is printed. On timeout (asyncio.TimeoutError), cancellation or any
+    other error while waiting, the whole process group is killed before
+    re-raising.
+    """
+    limits = limits or ProcessLimits()
+    loop = asyncio.get_running_loop()
+    start = time.monotonic()
+    # fork+exec blocks for a while with a large parent; do it off the event loop
+    spawning = loop.run_in_executor(None, functools.partial(
+        subprocess.Popen, cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+        start_new_session=True, preexec_fn=_limiter(limits),
+    ))
+    try:
+        proc = await asyncio.shield(spawning)
+    except asyncio.CancelledError:
+        # The child starts anyway; do not leave it running
+        proc = await spawning
+        _signal_group(proc.pid, signal.SIGKILL)
+        await asyncio.to_thread(proc.wait)
+        raise
+
+    exited = asyncio.ensure_future(_exited(proc.pid))
+    try:
+        reader = asyncio.StreamReader(limit=LINE_LIMIT)
+        transport, _ = await loop.connect_read_pipe(
+            lambda: asyncio.StreamReaderProtocol(reader), proc.stdout
+        )
+        try:
+            stdout = await asyncio.wait_for(_read_lines(reader, on_line), timeout=timeout)
+            remaining = max(0.0, timeout - (time.monotonic() - start))
+            await asyncio.wait_for(asyncio.shield(exited), timeout=remaining)
+        finally:
+            transport.close()
+    except BaseException:
+        logger.warning(f"Killing slicer process group {proc.pid}")
+        await _terminate(proc.pid, exited, limits.kill_grace_seconds)
+        proc.returncode = -signal.SIGKILL
+        raise
+
+    # Exited already, so this does not block
+    _, status, rusage = os.wait4(proc.pid, 0)
+    # Popen must not try to reap the pid again
+    proc.returncode = os.waitstatus_to_exitcode(status)
+
+    return ProcessResult(
+        returncode=proc.returncode,
+        output=stdout.decode(errors="ignore"),
+        wall_seconds=time.monotonic() - start,
+        cpu_user_seconds=rusage.ru_utime,
+        cpu_system_seconds=rusage.ru_stime,
+        peak_rss_bytes=rusage.ru_maxrss * 1024,  # Linux reports KiB
+    )
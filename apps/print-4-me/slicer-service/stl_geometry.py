@@ -0,0 +1,120 @@
+"""
+Vectorized STL parsing and mesh statistics (NumPy).
+Handles binary and ASCII STL; all measurements are in model units (mm).
+"""
+
+import re
+import math
+import warnings
+from pathlib import Path
+from typing import Optional, Union
+
+import numpy as np
+
+# 12 float32 (normal + 3 vertices) + uint16 attribute count = 50 bytes per facet
+BINARY_FACET = np.dtype([
+    ("normal", "<f4", (3,)),
+    ("vertices", "<f4", (3, 3)),
+    ("attr", "<u2"),
+])
+# Must not start with "solid", or readers may take the file for ASCII
+NORMALIZED_HEADER = b"binary STL, normalized by print-4-me slicer-service".ljust(80)
+VERTEX_LINE = re.compile(rb"vertex\s([^\n]*)")
+
+
+class STLParseError(ValueError):
+    pass
+
+
+def is_binary_stl(data: bytes) -> bool:
+    """Binary STLs are exactly 84 + 50 * facet_count bytes long."""
+    if len(data) < 84:
+        return False
+    count = int.from_bytes(data[80:84], "little")
+    return len(data) == 84 + count * BINARY_FACET.itemsize
+
+
+def _parse_binary(data: bytes) -> np.ndarray:
+    count = int.from_bytes(data[80:84], "little")
+    facets = np.frombuffer(data, dtype=BINARY_FACET, count=count, offset=84)
+    return facets["vertices"].astype(np.float64)
+
+
+def _parse_ascii(data: bytes) -> np.ndarray:
+    # Only the vertex lines matter; NumPy parses their numbers in one C pass
+    rows = VERTEX_LINE.findall(data)
+    if not rows or len(rows) % 3:
+        raise STLParseError("ASCII STL has no complete facets")
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", DeprecationWarning)  # reported below instead
+        coords = np.fromstring(b" ".join(rows), dtype=np.float64, sep=" ")
+    if coords.size != len(rows) * 3:
+        raise STLParseError("Malformed vertex in ASCII STL")
+    return coords.reshape(-1, 3, 3)
+
+
+def load_triangles(source: Union[Path, bytes]) -> np.ndarray:
+    """Return an (N, 3, 3) float64 array of triangle vertices."""
+    data = source.read_bytes() if isinstance(source, Path) else source
+    try:
+        triangles = _parse_binary(data) if is_binary_stl(data) else _parse_ascii(data)
+    except ValueError as e:
+        raise STLParseError(f"Could not parse STL: {e}") from e
+    if triangles.shape[0] == 0:
+        raise STLParseError("STL contains no facets")
+    return triangles
+
+
+def clean_triangles(triangles: np.ndarray) -> tuple[np.ndarray, int]:
+    """
+    Round to float32, as PrusaSlicer stores meshes, and drop facets with
+    non-finite or collapsed vertices. Returns (triangles, facets dropped).
+    """
+    triangles = triangles.astype(np.float32).astype(np.float64)
+    with np.errstate(invalid="ignore", over="ignore"):
+        cross = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+        keep = np.isfinite(triangles).all(axis=(1, 2)) & (np.abs(cross).sum(axis=1) > 0)
+    return triangles[keep], int(triangles.shape[0] - keep.sum())
+
+
+def binary_stl(triangles: np.ndarray) -> bytes:
+    """Binary STL with recomputed unit normals."""
+    facets = np.zeros(triangles.shape[0], dtype=BINARY_FACET)
+    facets["vertices"] = triangles
+    normals = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+    lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+    facets["normal"] = normals / np.where(lengths > 0, lengths, 1.0)
+    return NORMALIZED_HEADER + triangles.shape[0].to_bytes(4, "little") + facets.tobytes()
+
+
+def layer_count(height: float, layer_height: float) -> Optional[int]:
+    return max(1, math.ceil(height / layer_height)) if layer_height > 0 else None
+
+
+def mesh_stats(triangles: np.ndarray, layer_height: float) -> dict:
+    """Volume, surface area, bounding box and layer count of a triangle mesh."""
+    v0, v1, v2 = triangles[:, 0], triangles[:, 1], triangles[:, 2]
+    cross = np.cross(v1 - v0, v2 - v0)
+    norms = np.linalg.norm(cross, axis=1)
+    area = 0.5 * float(norms.sum())
+    # Facets within ~25 degrees of horizontal print as top/bottom skin
+    horizontal = np.abs(cross[:, 2]) > 0.9 * norms
+    horizontal_area = 0.5 * float(norms[horizontal].sum())
+    # Signed tetrahedron volumes against the origin; abs() tolerates inverted winding
+    volume = abs(float(np.einsum("ij,ij->", v0, np.cross(v1, v2)))) / 6.0
+
+    flat = triangles.reshape(-1, 3)
+    lo = flat.min(axis=0)
+    hi = flat.max(axis=0)
+    size = hi - lo
+    height = float(size[2])
+
+    return {
+        "triangles": int(triangles.shape[0]),
+        "volume_mm3": round(volume, 2),
+        "surface_area_mm2": round(area, 2),
+        "horizontal_area_mm2": round(horizontal_area, 2),
+        "bbox_mm": [round(float(x), 3) for x in size],
+        "bbox_min_mm": [round(float(x), 3) for x in lo],
+        "layers": layer_count(height, layer_height),
+    }
@@ -98,10 +98,35 @@ export async function POST(request: NextRequest, context: RouteContext) {
 
       // The slicer service should return:
       // { gcode_url, grams_used, print_time_seconds, gcode_storage_key }
+      // or, when the order was batched onto a shared plate with other orders,
+      // gcode_url null and plate: { plate_id, orders, gcode_url }
 
       // If slicer returns gcode as a buffer/URL, upload to storage
       let gcodeKey = sliceResult.gcode_storage_key;
-      if (!gcodeKey && sliceResult.gcode_url) {
+      const plate = sliceResult.plate;
+      if (plate?.gcode_url) {
+        // One G-code prints every order on the plate; each of them uploads
+        // the same file to the same key, so the order that finishes last wins
+        const gcodeResponse = await fetch(
+          new URL(plate.gcode_url, slicerUrl),
+        );
+        if (!gcodeResponse.ok) {
+          throw new Error(`Plate G-code download failed: ${gcodeResponse.status}`);
+        }
+        const gcodeBuffer = Buffer.from(await gcodeResponse.arrayBuffer());
+        gcodeKey = `plates/${plate.plate_id}.gcode`;
+
+        const { error: uploadError } = await supabase.storage
+          .from("gcode-files")
+          .upload(gcodeKey, gcodeBuffer, {
+            contentType: "application/octet-stream",
+            upsert: true,
+          });
+
+        if (uploadError) {
+          throw new Error(`G-code upload failed: ${uploadError.message}`);
+        }
+      } else if (!gcodeKey && sliceResult.gcode_url) {
         // Download gcode from slicer and upload to our storage
         const gcodeResponse = await fetch(sliceResult.gcode_url);
         const gcodeBuffer = Buffer.from(await gcodeResponse.arrayBuffer());
@@ -135,7 +160,9 @@ export async function POST(request: NextRequest, context: RouteContext) {
         order_id: id,
         from_status: "SLICING",
         to_status: "READY_TO_PRINT",
-        message: "G-code generated successfully",
+        message: plate
+          ? `G-code generated on shared plate ${plate.plate_id} (orders: ${plate.orders.join(", ")})`
+          : "G-code generated successfully",
       });
 
       // Optionally send email notification
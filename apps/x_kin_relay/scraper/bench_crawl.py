@@ -0,0 +1,256 @@
+"""
+Crawl throughput against the local fixture server.
+
+    python bench_crawl.py                                  # synthetic site, every mode
+    python bench_crawl.py --mode sync --latency-ms 80
+    python bench_crawl.py --fixture crawl_fixture --rate-429 0.05
+    python bench_crawl.py --mode async --parser json --concurrency 8
+    python bench_crawl.py --mode sync --mode pipelined --parse-workers 4
+
+Each mode runs in its own process against a fresh fixture_server.py, so
+peak RSS belongs to that crawl alone. Reported per mode: pages/s, per-page
+fetch and parse time (mean / p95) and peak memory (plus the largest parse
+worker in the pool modes).
+
+- sync: extract_categories + scrape_category_all_products (no sleep),
+  timing requests' fetch apart from BeautifulSoup + parse_products_from_listing
+- pipelined: scrape_category_pipelined, the sync crawl with a ParsePool of
+  --parse-workers processes
+- async: crawl_categories with the AsyncFetcher, timing get_page apart from
+  parse_listing_page with --parser; fetch time includes waiting for the
+  fetcher's rate limiter and retries
+- async-pool: the async crawl with a ParsePool
+
+In the pool modes parse time runs from handing the page to the pool to its
+result, so it includes waiting for a free worker.
+"""
+
+import os
+import sys
+import time
+import json
+import asyncio
+import argparse
+import resource
+import statistics
+import subprocess
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+sys.path.insert(0, str(HERE))
+
+import requests  # noqa: E402
+from bs4 import BeautifulSoup  # noqa: E402
+
+import scraper  # noqa: E402
+
+MODES = ("sync", "pipelined", "async", "async-pool")
+
+
+class Timings:
+    def __init__(self):
+        self.fetch: list[float] = []
+        self.parse: list[float] = []
+
+    @staticmethod
+    def describe(samples: list[float]) -> str:
+        if not samples:
+            return "-"
+        p95 = sorted(samples)[int(0.95 * (len(samples) - 1))]
+        return f"{statistics.fmean(samples) * 1000:.1f}/{p95 * 1000:.1f}"
+
+
+def run_sync(timings: Timings, max_pages: int) -> tuple[int, int, int]:
+    def get_soup(url, session):
+        start = time.perf_counter()
+        r = session.get(url, headers=scraper.HEADERS, timeout=30)
+        r.raise_for_status()
+        timings.fetch.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        soup = BeautifulSoup(r.text, "html.parser")
+        timings.parse.append(time.perf_counter() - start)
+        return soup
+
+    def timed(fn):
+        def run(soup):
+            start = time.perf_counter()
+            result = fn(soup)
+            timings.parse[-1] += time.perf_counter() - start
+            return result
+        return run
+
+    scraper.get_soup = get_soup
+    scraper.parse_products_from_listing = timed(scraper.parse_products_from_listing)
+    scraper.find_next_page = timed(scraper.find_next_page)
+    rows, failed = 0, 0
+    with requests.Session() as session:
+        cats = scraper.extract_categories(session)
+        timings.fetch.pop()  # the category index is not a listing page
+        timings.parse.pop()
+        for cat in cats:
+            try:
+                rows += len(scraper.scrape_category_all_products(cat, session, sleep_s=0, max_pages=max_pages))
+            except requests.HTTPError:
+                failed += 1  # the sync crawl has no retries; a 429 loses the rest of the category
+    return rows, 0, failed
+
+
+def time_pool(timings: Timings) -> None:
+    submit = scraper.ParsePool.submit
+
+    def timed_submit(self, html):
+        start = time.perf_counter()
+        future = submit(self, html)
+        future.add_done_callback(lambda _: timings.parse.append(time.perf_counter() - start))
+        return future
+
+    scraper.ParsePool.submit = timed_submit
+
+
+def run_pipelined(timings: Timings, args: argparse.Namespace) -> tuple[int, int, int]:
+    get_html = scraper.get_html
+
+    def timed_get_html(url, session):
+        start = time.perf_counter()
+        html = get_html(url, session)
+        timings.fetch.append(time.perf_counter() - start)
+        return html
+
+    time_pool(timings)
+    rows, failed = 0, 0
+    with requests.Session() as session, scraper.ParsePool(args.parse_workers, "bs4") as pool:
+        cats = scraper.extract_categories(session)
+        scraper.get_html = timed_get_html
+        for cat in cats:
+            try:
+                rows += len(scraper.scrape_category_pipelined(cat, session, pool, sleep_s=0, max_pages=args.max_pages))
+            except requests.HTTPError:
+                failed += 1
+    return rows, 0, failed
+
+
+def run_async(timings: Timings, args: argparse.Namespace) -> tuple[int, int, int]:
+    parse_listing_page = scraper.parse_listing_page
+    get_page = scraper.AsyncFetcher.get_page
+    pooled = args.mode == "async-pool"
+
+    def timed_parse(html, parser=None):
+        start = time.perf_counter()
+        result = parse_listing_page(html, parser)
+        timings.parse.append(time.perf_counter() - start)
+        return result
+
+    async def timed_get_page(self, url):
+        start = time.perf_counter()
+        page = await get_page(self, url)
+        timings.fetch.append(time.perf_counter() - start)
+        return page
+
+    if pooled:
+        time_pool(timings)  # the workers need the real parse_listing_page
+    else:
+        scraper.parse_listing_page = timed_parse
+    scraper.AsyncFetcher.get_page = timed_get_page
+    scraper.LISTING_PARSER = args.parser
+
+    async def crawl(pool):
+        async with scraper.AsyncFetcher(rate=args.rate, max_rate=args.rate, backoff_s=0.2) as fetcher:
+            start = await fetcher.get_page(scraper.START)
+            timings.fetch.pop()  # the category index is not a listing page
+            cats = scraper.categories_from_soup(BeautifulSoup(start.text, "html.parser"))
+            rows = await scraper.crawl_categories(cats, fetcher, concurrency=args.concurrency, pool=pool)
+            return len(rows), fetcher.retried, 0
+
+    if not pooled:
+        return asyncio.run(crawl(None))
+    with scraper.ParsePool(args.parse_workers) as pool:
+        return asyncio.run(crawl(pool))
+
+
+def child(args: argparse.Namespace) -> None:
+    """One mode against an already running server; prints a JSON result line."""
+    scraper.BASE = args.origin
+    scraper.START = args.origin + "/arzneimittel-gesundheit"
+    timings = Timings()
+    start = time.perf_counter()
+    if args.mode == "sync":
+        rows, retries, failed = run_sync(timings, args.max_pages)
+    elif args.mode == "pipelined":
+        rows, retries, failed = run_pipelined(timings, args)
+    else:
+        rows, retries, failed = run_async(timings, args)
+    wall = time.perf_counter() - start
+    pages = len(timings.parse)
+    print(json.dumps({
+        "mode": args.mode if not args.mode.startswith("async") else f"{args.mode}/{args.parser}",
+        "pages": pages,
+        "rows": rows,
+        "retries": retries,
+        "failed": failed,
+        "seconds": round(wall, 2),
+        "pages_per_s": round(pages / wall, 1) if wall else 0,
+        "fetch_ms": Timings.describe(timings.fetch),
+        "parse_ms": Timings.describe(timings.parse),
+        # Parse workers are reaped by now; the largest one counts on top
+        "peak_rss_mb": round((resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+                              + resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) / 1024, 1),
+    }))
+
+
+def start_server(args: argparse.Namespace) -> tuple[subprocess.Popen, str]:
+    cmd = [sys.executable, str(HERE / "fixture_server.py"), "serve", "--port", "0",
+           "--latency-ms", str(args.latency_ms), "--jitter-ms", str(args.jitter_ms),
+           "--rate-429", str(args.rate_429), "--retry-after", "0.2", "--pages", str(args.pages)]
+    cmd += [args.fixture] if args.fixture else ["--synthetic"]
+    server = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    line = server.stdout.readline()
+    if not line.startswith("Serving on "):
+        server.kill()
+        sys.exit(f"fixture server failed: {line}{server.stderr.read()}")
+    return server, line.split()[-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=MODES, action="append", help="default: all")
+    parser.add_argument("--fixture", help="recording directory (default: the synthetic site)")
+    parser.add_argument("--pages", type=int, default=5, help="pages per category")
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--jitter-ms", type=float, default=5)
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--parser", choices=scraper.PARSERS, default="auto", help="async listing parser")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=50.0, help="async requests/second")
+    parser.add_argument("--parse-workers", type=int, default=os.cpu_count() or 2, help="processes in the pool modes")
+    parser.add_argument("--origin", help=argparse.SUPPRESS)  # set for the per-mode child process
+    args = parser.parse_args()
+
+    if args.origin:
+        args.mode = args.mode[0]
+        args.max_pages = args.pages
+        child(args)
+        return
+
+    print(f"{'mode':<19}{'pages':>7}{'rows':>7}{'seconds':>9}{'pages/s':>9}"
+          f"{'fetch ms':>14}{'parse ms':>14}{'peak MB':>9}{'retries':>9}{'failed':>8}")
+    print(f"{'':<19}{'':>7}{'':>7}{'':>9}{'':>9}{'mean/p95':>14}{'mean/p95':>14}")
+    for mode in args.mode or MODES:
+        server, origin = start_server(args)
+        try:
+            cmd = [sys.executable, __file__, "--mode", mode, "--origin", origin, "--pages", str(args.pages),
+                   "--parser", args.parser, "--concurrency", str(args.concurrency), "--rate", str(args.rate),
+                   "--parse-workers", str(args.parse_workers)]
+            out = subprocess.run(cmd, capture_output=True, text=True)
+        finally:
+            server.terminate()
+            server.wait()
+        if out.returncode != 0:
+            print(f"{mode}: failed\n{out.stderr}")
+            continue
+        r = json.loads(out.stdout.strip().splitlines()[-1])
+        print(f"{r['mode']:<19}{r['pages']:>7}{r['rows']:>7}{r['seconds']:>9}{r['pages_per_s']:>9}"
+              f"{r['fetch_ms']:>14}{r['parse_ms']:>14}{r['peak_rss_mb']:>9}{r['retries']:>9}{r['failed']:>8}")
+
+
+if __name__ == "__main__":
+    main()
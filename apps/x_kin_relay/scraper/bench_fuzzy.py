@@ -0,0 +1,144 @@
+"""
+Fuzzy substance matching: throughput and confidence calibration.
+
+    python bench_fuzzy.py                      # docmorris_products_raw.csv + substances_de.csv
+    python bench_fuzzy.py --names 50000        # also time that many synthetic names
+    python bench_fuzzy.py --calibrate          # precision per hit kind -> fuzzy_index.CONFIDENCE
+
+Calibration perturbs every dictionary key (typos, c/k/z swaps, truncation,
+salt suffixes) and counts how often the fuzzy hit names the right substance.
+Each query is run again with that substance left out of the dictionary, so
+a hit on a neighbour (loratadin -> desloratadin) counts as a false positive.
+Fuzzy hits on the real catalog are listed for review as well, since words
+that are no substance at all ("biotic", "hepar") are the other way to fail.
+"""
+
+import sys
+import time
+import random
+import argparse
+from collections import Counter, defaultdict
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fuzzy_index import CONFIDENCE, TrigramIndex, fold  # noqa: E402
+from substance_matcher import SubstanceMatcher, load_substance_map  # noqa: E402
+
+HERE = Path(__file__).resolve().parent
+LETTERS = "abcdefghiklmnoprstuvxyz"
+SALTS = ("hydrochlorid", "dihydrochlorid", "natrium", "lysinat", "mesilat")
+
+
+def typo(word: str, rng: random.Random) -> str:
+    i = rng.randrange(1, len(word))
+    op = rng.choice(("sub", "del", "ins", "swap"))
+    if op == "sub":
+        return word[:i] + rng.choice(LETTERS) + word[i + 1:]
+    if op == "del":
+        return word[:i] + word[i + 1:]
+    if op == "ins":
+        return word[:i] + rng.choice(LETTERS) + word[i:]
+    i = min(i, len(word) - 2)
+    return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+
+def perturbations(key: str, rng: random.Random) -> list[tuple[str, str]]:
+    out = [("typo", typo(key, rng)) for _ in range(3)]
+    if key[0] in "ck":
+        out.append(("typo", {"c": "k", "k": "c"}[key[0]] + key[1:]))
+    if len(key) >= 10:
+        out += [("typo2", typo(typo(key, rng), rng)) for _ in range(2)]
+    out.append(("truncated", key[:max(6, int(len(key) * rng.uniform(0.6, 0.9)))]))
+    out.append(("salt", typo(key, rng) + rng.choice(SALTS)))
+    return [(kind, word) for kind, word in out if word != key]
+
+
+def calibrate(mapping: dict[str, dict], names: pd.Series, seed: int) -> None:
+    rng = random.Random(seed)
+    substance = {fold(k): v["active_substance"] for k, v in mapping.items()}
+    by_substance = defaultdict(list)
+    for key, name in substance.items():
+        by_substance[name].append(key)
+    full = TrigramIndex(list(substance))
+
+    tp, fp, queries = Counter(), Counter(), Counter()
+    for name, keys in by_substance.items():
+        without = TrigramIndex([k for k in substance if substance[k] != name])
+        for key in keys:
+            if not key.isalpha() or len(key) < 6:
+                continue
+            for source, word in perturbations(key, rng):
+                queries[source] += 1
+                hit = full.lookup(word)
+                if hit is not None:
+                    (tp if substance[hit.key] == name else fp)[hit.kind] += 1
+                if (miss := without.lookup(word)) is not None:
+                    fp[miss.kind] += 1
+
+    print(f"{sum(queries.values())} perturbed keys ({dict(queries)})")
+    print(f"{'kind':<14}{'hits':>8}{'wrong':>8}{'precision':>11}{'current':>10}")
+    for kind in CONFIDENCE:
+        hits, wrong = tp[kind] + fp[kind], fp[kind]
+        precision = tp[kind] / hits if hits else 0.0
+        print(f"{kind:<14}{hits:>8}{wrong:>8}{precision:>11.2f}{CONFIDENCE[kind]:>10.2f}")
+    print(f"recall {sum(tp.values()) / sum(queries.values()):.2f}")
+
+    matcher = SubstanceMatcher(mapping, fuzzy=True)
+    unmatched = names[matcher.match_series(names)["confidence"].between(0, 0.9, inclusive="neither")]
+    print(f"\nFuzzy hits on the catalog ({len(unmatched)} names), check these by hand:")
+    for name in unmatched.unique():
+        for hit in matcher.fuzzy.search(name.lower()):
+            print(f"  {hit.kind:<14}{hit.word:<24}-> {substance[hit.key]:<20}{name[:60]}")
+
+
+def synthetic_names(names: pd.Series, mapping: dict[str, dict], n: int, seed: int) -> pd.Series:
+    """Names built from the real vocabulary, one in ten with a misspelled substance."""
+    rng = random.Random(seed)
+    vocab = [w for name in names for w in name.split()]
+    keys = [k for k in mapping if k.isalpha() and len(k) >= 7]
+    out = []
+    for _ in range(n):
+        words = rng.sample(vocab, 4)
+        if rng.random() < 0.1:
+            words[0] = typo(rng.choice(keys), rng).capitalize()
+        out.append(" ".join(words))
+    return pd.Series(out)
+
+
+def timed(label: str, names: pd.Series, matcher: SubstanceMatcher) -> pd.DataFrame:
+    start = time.perf_counter()
+    result = matcher.match_series(names)
+    seconds = time.perf_counter() - start
+    matched = result["confidence"] > 0
+    fuzzy = matched & (result["confidence"] < 0.9)
+    print(f"{label:<28}{seconds:>8.2f} s{len(names) / seconds:>12,.0f} names/s"
+          f"{matched.sum():>9} matched{fuzzy.sum():>7} fuzzy")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("csv", nargs="?", default=HERE / "docmorris_products_raw.csv")
+    parser.add_argument("--substances", default=HERE / "substances_de.csv")
+    parser.add_argument("--names", type=int, default=0, help="also time this many synthetic names")
+    parser.add_argument("--calibrate", action="store_true")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    mapping = load_substance_map(args.substances)
+    names = pd.read_csv(args.csv, usecols=["name_display"])["name_display"].fillna("").astype(str)
+    print(f"{len(mapping)} dictionary keys, {len(names)} names")
+    timed("exact", names, SubstanceMatcher(mapping))
+    timed("exact + fuzzy", names, SubstanceMatcher(mapping, fuzzy=True))
+    if args.names:
+        synthetic = synthetic_names(names, mapping, args.names, args.seed)
+        timed(f"exact + fuzzy, {args.names} synthetic", synthetic, SubstanceMatcher(mapping, fuzzy=True))
+    if args.calibrate:
+        calibrate(mapping, names, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Per-page parse time of each listing parser against the BeautifulSoup one.
+
+    python bench_parse.py                      # the saved ../docmorris_start.html
+    python bench_parse.py page1.html page2.html
+    python bench_parse.py --cache http_cache.sqlite3
+
+Every backend's output is checked against bs4; mismatching pages are counted.
+"""
+
+import sys
+import time
+import argparse
+import sqlite3
+import statistics
+import zlib
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import scraper  # noqa: E402
+from listing_parsers import available_dom_backends  # noqa: E402
+
+DEFAULT_PAGE = Path(__file__).resolve().parent.parent / "docmorris_start.html"
+
+
+def load_pages(args) -> list[str]:
+    if args.cache:
+        db = sqlite3.connect(args.cache)
+        rows = db.execute("SELECT body FROM responses").fetchall()
+        db.close()
+        return [zlib.decompress(body).decode("utf-8") for (body,) in rows]
+    return [Path(p).read_text(encoding="utf-8") for p in (args.pages or [DEFAULT_PAGE])]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pages", nargs="*", help="saved listing pages (HTML)")
+    parser.add_argument("--cache", help="use every page in a scraper HTTP cache")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per page and backend")
+    args = parser.parse_args()
+
+    pages = load_pages(args)
+    if not pages:
+        sys.exit("No pages to parse")
+    backends = ["bs4"] + available_dom_backends() + ["json"]
+    expected = [scraper.parse_listing_page(page, "bs4") for page in pages]
+
+    print(f"{len(pages)} pages, {sum(map(len, pages)) / len(pages) / 1024:.0f} KiB average, {args.repeat} runs each")
+    print(f"{'parser':<12}{'ms/page':>10}{'p95 ms':>10}{'pages/s':>10}{'speedup':>10}{'mismatch':>10}")
+    baseline = None
+    for backend in backends:
+        times, mismatches = [], 0
+        for page, reference in zip(pages, expected):
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                result = scraper.parse_listing_page(page, backend)
+                times.append(time.perf_counter() - start)
+            mismatches += result != reference
+        mean = statistics.fmean(times)
+        baseline = baseline or mean
+        p95 = sorted(times)[int(0.95 * (len(times) - 1))]
+        print(f"{backend:<12}{mean * 1000:>10.2f}{p95 * 1000:>10.2f}{1 / mean:>10.1f}"
+              f"{baseline / mean:>9.1f}x{mismatches:>10}")
+
+
+if __name__ == "__main__":
+    main()
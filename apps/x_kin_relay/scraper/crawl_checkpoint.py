@@ -0,0 +1,153 @@
+"""
+Streaming, resumable crawl output.
+Rows are appended to a CSV in chunks as pages come in, deduplicated on
+product_url as they arrive, and the crawl frontier (each category's next
+page) is saved after every chunk. The state file records how many bytes of
+the CSV belong to the checkpoint, so after a crash the CSV is cut back to
+that point and the pages behind the torn tail are simply fetched again.
+The CSV is written next to its final name and only moved there once every
+category is done; a category that fails for good (e.g. a 404) counts as done
+and keeps its error in the state, so it does not hold the crawl back.
+"""
+
+import os
+import csv
+import json
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+FIELDS = ["name_display", "product_url", "category", "category_url"]
+
+
+@dataclass
+class Frontier:
+    name: str
+    url: str
+    next_url: str | None  # None once the category is finished
+    pages: int = 0
+    rows: int = 0
+    failed: str | None = None  # why the category was given up, if it was
+
+    @property
+    def done(self) -> bool:
+        return self.next_url is None
+
+
+class CrawlCheckpoint:
+    def __init__(self, output: Path, state_path: Path, chunk_rows: int = 500, flush_seconds: float = 10.0):
+        self.output = output
+        self.partial = output.with_name(output.name + ".partial")
+        self.state_path = state_path
+        self.chunk_rows = chunk_rows
+        self.flush_seconds = flush_seconds
+        self.frontier: list[Frontier] = []
+        self.resumed = False
+        self.written = 0     # unique rows in the output
+        self.duplicates = 0  # rows dropped because their product_url was already written
+        self._seen: set[str] = set()
+        self._pending: list[dict] = []
+        self._last_flush = time.monotonic()
+        self._file = None
+
+    def resume(self) -> bool:
+        """Pick up the unfinished crawl in state_path, if there is one."""
+        if not (self.state_path.exists() and self.partial.exists()):
+            return False
+        try:
+            state = json.loads(self.state_path.read_text())
+        except ValueError:
+            print(f"[WARN] Ignoring unreadable {self.state_path}")
+            return False
+        self.frontier = [Frontier(**f) for f in state["frontier"]]
+        self._file = open(self.partial, "r+", encoding="utf-8", newline="")
+        self._file.truncate(state["csv_bytes"])  # drop rows written after the checkpoint
+        for row in csv.DictReader(self._file):
+            self._seen.add(row["product_url"])
+        self._file.seek(0, os.SEEK_END)
+        self.written = len(self._seen)
+        self.duplicates = state.get("duplicates", 0)
+        self._writer = csv.DictWriter(self._file, fieldnames=FIELDS, extrasaction="ignore")
+        self.resumed = True
+        return True
+
+    def start(self, categories: list) -> None:
+        """A new crawl over categories (anything with .name and .url)."""
+        self.frontier = [Frontier(c.name, c.url, c.url) for c in categories]
+        self._file = open(self.partial, "w", encoding="utf-8", newline="")
+        self._writer = csv.DictWriter(self._file, fieldnames=FIELDS, extrasaction="ignore")
+        self._writer.writeheader()
+        self._save_state()
+
+    def record(self, index: int, products: list[dict], next_url: str | None) -> None:
+        """One fetched page of category `index`; next_url None finishes the category."""
+        for p in products:
+            url = p.get("product_url")
+            if url in self._seen:
+                self.duplicates += 1
+                continue
+            self._seen.add(url)
+            self._pending.append(p)
+        entry = self.frontier[index]
+        entry.next_url = next_url
+        entry.pages += 1
+        entry.rows += len(products)
+        if len(self._pending) >= self.chunk_rows or time.monotonic() - self._last_flush >= self.flush_seconds:
+            self.flush()
+
+    def finish_category(self, index: int) -> None:
+        """Stop a category early (e.g. its page limit), so a resume does not continue it."""
+        self.frontier[index].next_url = None
+
+    def fail_category(self, index: int, error: str) -> None:
+        """Give up on a category that retrying cannot fix; its rows so far are kept."""
+        entry = self.frontier[index]
+        entry.next_url = None
+        entry.failed = error
+        self._save_state()
+
+    @property
+    def failed(self) -> list[Frontier]:
+        return [f for f in self.frontier if f.failed]
+
+    def flush(self) -> None:
+        """Append pending rows, then move the checkpoint past them."""
+        self._writer.writerows(self._pending)
+        self.written += len(self._pending)
+        self._pending = []
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._save_state()
+        self._last_flush = time.monotonic()
+
+    def _save_state(self) -> None:
+        state = {
+            "output": str(self.output),
+            "csv_bytes": self._file.tell(),
+            "duplicates": self.duplicates,
+            "saved_at": time.time(),
+            "frontier": [asdict(f) for f in self.frontier],
+        }
+        tmp = self.state_path.with_name(self.state_path.name + ".tmp")
+        tmp.write_text(json.dumps(state, ensure_ascii=False))
+        tmp.replace(self.state_path)
+
+    @property
+    def complete(self) -> bool:
+        return all(f.done for f in self.frontier)
+
+    def close(self) -> bool:
+        """
+        Flush and close. Once every category is done the output is moved into
+        place and the state removed; otherwise both stay for the next run.
+        """
+        if self._file is None:
+            return False
+        self.flush()
+        self._file.close()
+        self._file = None
+        if not self.complete:
+            return False
+        self.partial.replace(self.output)
+        self.state_path.unlink(missing_ok=True)
+        return True
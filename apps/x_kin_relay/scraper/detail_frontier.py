@@ -0,0 +1,251 @@
+"""
+Persistent frontier for the product detail crawl.
+Every product page ever queued is one row in SQLite with when it was last
+fetched and what was extracted from it, so the crawl can stop at any point
+and the next run only visits pages that were never fetched or are older
+than max_age. Due pages come out by category priority, then staleness.
+Results are written in batches, so a crash costs at most the last batch,
+which is simply fetched again.
+
+Links found on product pages are checked against a Bloom filter of every
+queued URL instead of the table; it lives in memory at a few bits per URL
+and is saved next to the database. A false positive (0.1% by default) only
+means a discovered link is not queued; product URLs from the listing crawl
+always go through the table.
+"""
+
+import math
+import time
+import struct
+import sqlite3
+import hashlib
+from pathlib import Path
+
+import pandas as pd
+
+from product_page import DETAIL_FIELDS
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    url TEXT PRIMARY KEY,
+    category TEXT,
+    source TEXT NOT NULL,            -- listing | link
+    added_at REAL NOT NULL,
+    fetched_at REAL,                 -- NULL until fetched
+    status TEXT,                     -- ok | gone | error
+    failures INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    pzn TEXT,
+    name TEXT,
+    strength TEXT,
+    pack_size TEXT,
+    prescription_type TEXT,
+    pharmaceutical_form TEXT,
+    atc_code TEXT,
+    active_ingredients TEXT
+);
+CREATE INDEX IF NOT EXISTS pages_fetched ON pages (fetched_at);
+"""
+
+MAX_FAILURES = 3  # errors in a row before a never-fetched page is left alone
+MIN_CAPACITY = 50_000
+
+
+class BloomFilter:
+    HEADER = struct.Struct("<4Q")  # capacity, bits, hashes, count
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        self.capacity = capacity
+        self.size = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, item: str) -> None:
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+    def save(self, path: Path) -> None:
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_bytes(self.HEADER.pack(self.capacity, self.size, self.hashes, self.count) + self.bits)
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path: Path) -> "BloomFilter | None":
+        try:
+            data = path.read_bytes()
+            capacity, size, hashes, count = cls.HEADER.unpack_from(data)
+        except (OSError, struct.error):
+            return None
+        bloom = cls.__new__(cls)
+        bloom.capacity, bloom.size, bloom.hashes, bloom.count = capacity, size, hashes, count
+        bloom.bits = bytearray(data[cls.HEADER.size:])
+        return bloom if len(bloom.bits) == (size + 7) // 8 else None
+
+
+class DetailFrontier:
+    def __init__(self, path: Path, batch_rows: int = 100, flush_seconds: float = 10.0):
+        self.path = path
+        self.bloom_path = path.with_name(path.name + ".bloom")
+        self.batch_rows = batch_rows
+        self.flush_seconds = flush_seconds
+        self._db = sqlite3.connect(path)
+        # SQLite's lower() only folds ASCII; category priorities need umlauts too
+        self._db.create_function("casefold", 1, lambda s: s.casefold() if s else s, deterministic=True)
+        self._db.executescript(SCHEMA)
+        self._results: list[tuple] = []
+        self._failures: list[tuple] = []
+        self._links: list[tuple] = []
+        self._last_flush = time.monotonic()
+        self.fetched = 0
+        self.failed = 0
+        self.discovered = 0
+        self.bloom = self._open_bloom()
+
+    def _count(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+
+    def _open_bloom(self) -> BloomFilter:
+        """The saved filter if it covers the table, else one rebuilt from it."""
+        rows = self._count()
+        bloom = BloomFilter.load(self.bloom_path)
+        if bloom is not None and bloom.count == rows and rows <= bloom.capacity:
+            return bloom
+        bloom = BloomFilter(max(MIN_CAPACITY, 2 * rows))
+        for (url,) in self._db.execute("SELECT url FROM pages"):
+            bloom.add(url)
+        return bloom
+
+    def close(self) -> None:
+        self.flush()
+        self._db.close()
+
+    def add_listing(self, products_df: pd.DataFrame) -> int:
+        """Queue the product pages of a listing crawl; known ones just take its category. Returns the new ones."""
+        rows = products_df.dropna(subset=["product_url"]).drop_duplicates(subset=["product_url"])
+        before = self._count()
+        now = time.time()
+        with self._db:
+            self._db.executemany(
+                "INSERT INTO pages (url, category, source, added_at) VALUES (?, ?, 'listing', ?)"
+                " ON CONFLICT (url) DO UPDATE SET category = excluded.category, source = 'listing'",
+                ((url, category, now) for url, category in zip(rows["product_url"], rows["category"])),
+            )
+        added = self._count() - before
+        if added:
+            for url in rows["product_url"]:
+                if url not in self.bloom:
+                    self.bloom.add(url)
+            self._resize_bloom()
+            self.bloom.save(self.bloom_path)
+        return added
+
+    def due(self, max_age_s: float, priorities: list[str] = (), limit: int | None = None) -> list[tuple[str, str]]:
+        """
+        (url, category) of pages to fetch: never fetched first, then the
+        stalest. Categories matching an earlier entry of priorities (substring,
+        case-insensitive) go before later ones and before the rest; listing
+        pages go before discovered links.
+        """
+        rank = " ".join(f"WHEN instr(casefold(category), ?) THEN {i}" for i in range(len(priorities)))
+        order = f"CASE {rank} ELSE {len(priorities)} END, " if priorities else ""
+        query = (
+            "SELECT url, category FROM pages"
+            " WHERE (fetched_at IS NULL AND failures < ?) OR fetched_at < ?"
+            f" ORDER BY fetched_at IS NOT NULL, {order}source = 'link', fetched_at, added_at"
+        )
+        params = [MAX_FAILURES, time.time() - max_age_s, *(p.casefold() for p in priorities)]
+        if limit:
+            query += " LIMIT ?"
+            params.append(limit)
+        return self._db.execute(query, params).fetchall()
+
+    def record(self, url: str, details: dict) -> None:
+        self._results.append((time.time(), *(details.get(f) for f in DETAIL_FIELDS), url))
+        self.fetched += 1
+        self._maybe_flush()
+
+    def fail(self, url: str, error: str, gone: bool = False) -> None:
+        """A page that could not be fetched; gone (404/410) pages wait for max_age like fetched ones."""
+        self._failures.append((time.time() if gone else None, "gone" if gone else "error", error, url))
+        self.failed += 1
+        self._maybe_flush()
+
+    def discover(self, links: list[str], category: str | None) -> None:
+        """Queue product links found on a page, unless the Bloom filter has (probably) seen them."""
+        now = time.time()
+        for url in links:
+            if url not in self.bloom:
+                self.bloom.add(url)
+                self._links.append((url, category, now))
+                self.discovered += 1
+
+    def _maybe_flush(self) -> None:
+        pending = len(self._results) + len(self._failures)
+        if pending >= self.batch_rows or time.monotonic() - self._last_flush >= self.flush_seconds:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write pending results, failures and links in one transaction."""
+        assignments = ", ".join(f"{f} = ?" for f in DETAIL_FIELDS)
+        with self._db:
+            self._db.executemany(
+                f"UPDATE pages SET fetched_at = ?, status = 'ok', failures = 0, error = NULL, {assignments}"
+                " WHERE url = ?",
+                self._results,
+            )
+            self._db.executemany(
+                "UPDATE pages SET fetched_at = COALESCE(?, fetched_at), status = ?, failures = failures + 1, error = ?"
+                " WHERE url = ?",
+                self._failures,
+            )
+            self._db.executemany(
+                "INSERT OR IGNORE INTO pages (url, category, source, added_at) VALUES (?, ?, 'link', ?)",
+                self._links,
+            )
+        if self._links:
+            self._resize_bloom()
+            self.bloom.save(self.bloom_path)
+        self._results, self._failures, self._links = [], [], []
+        self._last_flush = time.monotonic()
+
+    def _resize_bloom(self) -> None:
+        if self.bloom.count > self.bloom.capacity:
+            self.bloom = BloomFilter(2 * self.bloom.count)
+            for (url,) in self._db.execute("SELECT url FROM pages"):
+                self.bloom.add(url)
+        # The filter counts what it was given; saved with the table's count it is reused next run
+        self.bloom.count = self._count()
+
+    def details(self, products_df: pd.DataFrame) -> pd.DataFrame:
+        """
+        products_df with the extracted details of each product page (empty
+        where not fetched yet), followed by the pages discovered through
+        links that the listing crawl did not find; source tells them apart.
+        """
+        stored = pd.read_sql_query(
+            f"SELECT url AS product_url, category, source, {', '.join(DETAIL_FIELDS)}, status, fetched_at"
+            " FROM pages", self._db
+        )
+        stored["fetched_at"] = pd.to_datetime(stored["fetched_at"], unit="s").dt.strftime("%Y-%m-%d %H:%M")
+        listed = products_df.merge(stored.drop(columns=["category", "source"]), on="product_url", how="left")
+        listed["source"] = "listing"
+        linked = stored[(stored["source"] == "link") & ~stored["product_url"].isin(products_df["product_url"])]
+        linked = linked.assign(name_display=linked["name"])
+        return pd.concat([listed, linked], ignore_index=True)[list(listed.columns)]
+
+    def stats(self) -> dict:
+        total, fetched, gone = self._db.execute(
+            "SELECT COUNT(*), COUNT(fetched_at), SUM(status = 'gone') FROM pages"
+        ).fetchone()
+        return {"pages": total, "fetched": fetched, "gone": gone or 0}
@@ -0,0 +1,216 @@
+"""
+Incremental enrichment of crawled products.
+Every product is kept in SQLite by product_url with a hash of its
+name_display and of the substance mapping it was normalized with, so a run
+only re-normalizes products that are new, renamed, or matched against a
+changed mapping or matching mode. The grouped medications table (evidence_count per
+substance, ATC code and category) is updated by deltas, and each sync
+reports which medications were added, removed or changed for the import.
+"""
+
+import json
+import sqlite3
+import hashlib
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import pandas as pd
+
+import fuzzy_index
+from substance_matcher import MANUFACTURER_RE, MATCH_CONFIDENCE, matcher_for
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    product_url TEXT PRIMARY KEY,
+    name_display TEXT NOT NULL,
+    name_hash TEXT NOT NULL,
+    mapping_hash TEXT NOT NULL,
+    category TEXT,
+    category_url TEXT,
+    active_substance TEXT,
+    atc_code TEXT,
+    confidence REAL,
+    active_substances TEXT
+);
+-- Keys use '' instead of NULL so they stay unique
+CREATE TABLE IF NOT EXISTS medications (
+    active_substance TEXT NOT NULL,
+    atc_code TEXT NOT NULL,
+    category TEXT NOT NULL,
+    evidence_count INTEGER NOT NULL,
+    PRIMARY KEY (active_substance, atc_code, category)
+);
+"""
+
+PRODUCT_COLUMNS = ["name_display", "product_url", "category", "category_url",
+                   "active_substance", "atc_code", "confidence", "active_substances"]
+MEDS_COLUMNS = ["id", "name_display", "active_substance", "atc_code", "category", "prescription_type",
+                "country", "source", "verified", "evidence_count"]
+
+
+def internal_category(category: str | None) -> str:
+    """DocMorris category name -> internal taxonomy (expand for all categories)."""
+    return "allergy" if "allerg" in (category or "").lower() else "other"
+
+
+def medications_frame(counts: pd.DataFrame) -> pd.DataFrame:
+    """kinrelay_medications_mvp rows from (active_substance, atc_code, category, evidence_count)."""
+    meds = counts.copy()
+    meds["name_display"] = meds["active_substance"]  # MVP: show substance; later add common strength variants
+    meds["prescription_type"] = "unknown"
+    meds["country"] = "DE"
+    meds["source"] = "manual"  # because we used heuristics; set 'atc' when you import from ATC dataset
+    meds["verified"] = False   # make True only when validated via ATC import or manual review
+    meds["id"] = None          # UUID is generated by the DB on insert
+    return meds.reindex(columns=MEDS_COLUMNS)
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def mapping_hash(mapping: dict[str, dict], fuzzy: bool = False) -> str:
+    """Changes whenever re-matching could give a product a different substance or confidence."""
+    matching = {
+        "mapping": mapping,
+        "exact": {"confidence": MATCH_CONFIDENCE, "manufacturers": MANUFACTURER_RE.pattern},
+        "fuzzy": fuzzy_index.settings() if fuzzy else None,
+    }
+    return text_hash(json.dumps(matching, sort_keys=True, ensure_ascii=False))
+
+
+@dataclass
+class SyncResult:
+    products: int = 0
+    added: int = 0
+    changed: int = 0
+    removed: int = 0
+    unchanged: int = 0
+    # (active_substance, atc_code, category) -> (evidence before, after); 0 means absent
+    medications: dict[tuple[str, str, str], tuple[int, int]] = field(default_factory=dict)
+
+    def diff(self) -> pd.DataFrame:
+        """Medications added, removed or with a changed evidence_count."""
+        rows = []
+        for (substance, atc, category), (before, after) in sorted(self.medications.items()):
+            if before == after:
+                continue
+            change = "added" if before == 0 else "removed" if after == 0 else "changed"
+            rows.append({"change": change, "active_substance": substance, "atc_code": atc or None,
+                         "category": category, "evidence_count": after, "previous_evidence_count": before})
+        counts = pd.DataFrame(rows, columns=["change", "active_substance", "atc_code", "category",
+                                             "evidence_count", "previous_evidence_count"])
+        meds = medications_frame(counts.drop(columns=["change", "previous_evidence_count"]))
+        return pd.concat([counts[["change"]], meds, counts[["previous_evidence_count"]]], axis=1)
+
+    def summary(self) -> str:
+        changes = Counter(self.diff()["change"])
+        return (f"{self.products} products: {self.added} new, {self.changed} changed, {self.removed} removed, "
+                f"{self.unchanged} unchanged; medications {changes['added']} added, "
+                f"{changes['changed']} changed, {changes['removed']} removed")
+
+
+def _med_keys(frame: pd.DataFrame) -> list[tuple[str, str, str]]:
+    """The medications row each matched product counts towards."""
+    return [
+        (substance, atc if isinstance(atc, str) else "", internal_category(category))
+        for substance, atc, category in zip(frame["active_substance"], frame["atc_code"], frame["category"])
+        if isinstance(substance, str) and substance
+    ]
+
+
+class EnrichmentStore:
+    def __init__(self, path: Path):
+        self.path = path
+        self._db = sqlite3.connect(path)
+        self._db.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self._db.close()
+
+    def sync(self, products_df: pd.DataFrame, mapping: dict[str, dict], fuzzy: bool = False) -> SyncResult:
+        """
+        Make the store match a full crawl: normalize new and changed products,
+        drop the ones no longer listed, and apply the evidence deltas.
+        """
+        df = products_df.reindex(columns=["name_display", "product_url", "category", "category_url"])
+        df = df.dropna(subset=["product_url"]).drop_duplicates(subset=["product_url"])
+        df["name_display"] = df["name_display"].fillna("").astype(str)
+        df["name_hash"] = [text_hash(name) for name in df["name_display"]]
+        mhash = mapping_hash(mapping, fuzzy)
+
+        stored = pd.read_sql_query(
+            "SELECT product_url, name_hash, mapping_hash, category, active_substance, atc_code FROM products",
+            self._db,
+        ).set_index("product_url")
+        known = df["product_url"].isin(stored.index)
+        previous = stored.reindex(df["product_url"])
+        same = (
+            known.to_numpy()
+            & (previous["name_hash"].to_numpy() == df["name_hash"].to_numpy())
+            & (previous["mapping_hash"].to_numpy() == mhash)
+            & (previous["category"].fillna("").to_numpy() == df["category"].fillna("").to_numpy())
+        )
+        todo = df[~same].copy()
+        removed = stored.loc[~stored.index.isin(df["product_url"])]
+        result = SyncResult(
+            products=len(df), added=int((~known).sum()), changed=int((known & ~same).sum()),
+            removed=len(removed), unchanged=int(same.sum()),
+        )
+
+        delta: Counter = Counter()
+        replaced = stored.loc[stored.index.isin(todo["product_url"])]
+        delta.subtract(_med_keys(removed) + _med_keys(replaced))
+
+        if not todo.empty:
+            norm = matcher_for(mapping, fuzzy).match_series(todo["name_display"])
+            todo = pd.concat([todo, norm], axis=1)
+            delta.update(_med_keys(todo))
+
+        with self._db:
+            self._db.executemany("DELETE FROM products WHERE product_url = ?", ((url,) for url in removed.index))
+            self._db.executemany(
+                "INSERT OR REPLACE INTO products (product_url, name_display, name_hash, mapping_hash, category,"
+                " category_url, active_substance, atc_code, confidence, active_substances)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    (r.product_url, r.name_display, r.name_hash, mhash, r.category, r.category_url,
+                     r.active_substance, r.atc_code, r.confidence, r.active_substances)
+                    for r in todo.itertuples(index=False)
+                ),
+            )
+            for key, change in delta.items():
+                if change == 0:
+                    continue
+                before = self._evidence(key)
+                after = max(before + change, 0)
+                result.medications[key] = (before, after)
+                if after:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO medications VALUES (?, ?, ?, ?)", (*key, after)
+                    )
+                else:
+                    self._db.execute(
+                        "DELETE FROM medications WHERE active_substance = ? AND atc_code = ? AND category = ?", key
+                    )
+        return result
+
+    def _evidence(self, key: tuple[str, str, str]) -> int:
+        row = self._db.execute(
+            "SELECT evidence_count FROM medications WHERE active_substance = ? AND atc_code = ? AND category = ?", key
+        ).fetchone()
+        return row[0] if row else 0
+
+    def products(self) -> pd.DataFrame:
+        """Every stored product, shaped like docmorris_products_enriched.csv."""
+        return pd.read_sql_query(f"SELECT {', '.join(PRODUCT_COLUMNS)} FROM products ORDER BY rowid", self._db)
+
+    def medications(self) -> pd.DataFrame:
+        """The current kinrelay_medications_mvp table."""
+        counts = pd.read_sql_query(
+            "SELECT active_substance, NULLIF(atc_code, '') AS atc_code, category, evidence_count"
+            " FROM medications ORDER BY active_substance, atc_code, category",
+            self._db,
+        )
+        return medications_frame(counts)
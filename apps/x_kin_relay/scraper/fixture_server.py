@@ -0,0 +1,286 @@
+"""
+Offline stand-in for the DocMorris listing pages, for measuring the crawl.
+
+    python fixture_server.py record crawl_fixture --categories 3 --pages 2   # snapshot live pages
+    python fixture_server.py record crawl_fixture --from-cache http_cache.sqlite3
+    python fixture_server.py serve crawl_fixture --latency-ms 80 --rate-429 0.05
+    python fixture_server.py serve --synthetic --pages 10                   # no recording needed
+
+A recording is a directory of gzipped pages plus manifest.json mapping each
+path?query to its file. The synthetic site is built from the saved
+../docmorris_start.html: its category links lead to listing pages that
+reuse that page with fresh product IDs and working next-page links, and
+every product URL serves a small product page built from one of its
+search hits, linking to two neighbouring PZNs as variants. Bodies
+are served with the live origin rewritten to the server's, with ETags (so
+304s work), optional latency and injected 429s; --pages caps how far the
+next-page links go.
+"""
+
+import re
+import sys
+import gzip
+import json
+import time
+import random
+import sqlite3
+import zlib
+import hashlib
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+import requests
+from bs4 import BeautifulSoup
+
+import scraper
+
+ORIGIN = "https://www.docmorris.de"
+TEMPLATE = Path(__file__).resolve().parent.parent / "docmorris_start.html"
+LINK_NEXT_RE = re.compile(r"<link\b[^>]*\brel=\"next\"[^>]*>")
+NEXT_ANCHOR_RE = re.compile(r"aria-label=\"Nächste Seite\"")
+PZN_RE = re.compile(r"/[a-z0-9-]+/(\d{8})\b")
+PRODUCT_PATH_RE = re.compile(r"^/([a-z0-9-]+)/([0-9A-Z]{8})$")  # PZNs, and IDs like 6632XHY7
+NEXT_DATA_RE = re.compile(r"<script id=\"__NEXT_DATA__\"[^>]*>(.*?)</script>", re.DOTALL)
+
+
+def page_key(url: str) -> str:
+    """path?query of a URL, the manifest and request key."""
+    parts = urlsplit(url)
+    return parts.path + (f"?{parts.query}" if parts.query else "")
+
+
+def page_number(key: str) -> int:
+    return int(parse_qs(urlsplit(key).query).get("page", ["1"])[0])
+
+
+def with_page(key: str, page: int) -> str:
+    parts = urlsplit(key)
+    query = {k: v[0] for k, v in parse_qs(parts.query).items()}
+    query["page"] = str(page)
+    return f"{parts.path}?{urlencode(query)}"
+
+
+def strip_next(body: str) -> str:
+    """Make a listing page the last one."""
+    return NEXT_ANCHOR_RE.sub('aria-label="Seite"', LINK_NEXT_RE.sub("", body))
+
+
+class Recording:
+    def __init__(self, root: Path):
+        self.root = root
+        self.manifest = json.loads((root / "manifest.json").read_text())
+
+    def get(self, key: str) -> str | None:
+        name = self.manifest["pages"].get(key)
+        if name is None:
+            return None
+        return gzip.decompress((self.root / name).read_bytes()).decode("utf-8")
+
+    @staticmethod
+    def write(root: Path, pages: dict[str, str]) -> None:
+        root.mkdir(parents=True, exist_ok=True)
+        manifest = {"origin": ORIGIN, "recorded_at": time.time(), "pages": {}}
+        for i, (key, body) in enumerate(sorted(pages.items())):
+            name = f"{i:05d}.html.gz"
+            (root / name).write_bytes(gzip.compress(body.encode("utf-8"), 6))
+            manifest["pages"][key] = name
+        (root / "manifest.json").write_text(json.dumps(manifest, indent=1, ensure_ascii=False))
+
+
+class SyntheticSite:
+    """Every category of the template has unlimited pages; --pages sets the depth."""
+
+    def __init__(self, template: Path = TEMPLATE):
+        self.start = template.read_text(encoding="utf-8")
+        self.start_key = page_key(re.search(r"<link rel=\"canonical\" href=\"([^\"]+)\"", self.start).group(1))
+        self.pzns = sorted(set(PZN_RE.findall(self.start)))
+        self.hits = json.loads(NEXT_DATA_RE.search(self.start).group(1))["props"]["pageProps"]["initialResults"]["hits"]
+
+    def product(self, slug: str, pzn: str) -> str:
+        n = int(hashlib.sha256(pzn.encode()).hexdigest()[:8], 16)
+        hit = dict(self.hits[n % len(self.hits)], lazy_id=pzn, slug=slug)
+        data = json.dumps({"props": {"pageProps": {"product": hit}}}, ensure_ascii=False)
+        variants = "".join(
+            f'<a href="/{slug}/{(int(pzn) + step) % 10**8:08d}">Variante</a>' for step in (1, 2) if pzn.isdigit()
+        )
+        return (f'<!DOCTYPE html><html><head><title>{hit["name"]}</title></head><body><h1>{hit["name"]}</h1>'
+                f'<p>PZN: {pzn}</p>{variants}<script id="__NEXT_DATA__" type="application/json">{data}</script>'
+                f'</body></html>')
+
+    def get(self, key: str) -> str | None:
+        path = urlsplit(key).path
+        if path == self.start_key:
+            return self.start
+        if m := PRODUCT_PATH_RE.match(path):
+            return self.product(*m.groups())
+        if not path.startswith(self.start_key + "/"):
+            return None
+        # Fresh, stable product IDs per category and page
+        page = page_number(key)
+        seed = int(hashlib.sha256(path.encode()).hexdigest()[:6], 16)
+        body = self.start
+        for i, pzn in enumerate(self.pzns):
+            body = body.replace(pzn, f"{(seed * 7919 + page * 131 + i) % 10**8:08d}")
+        next_url = ORIGIN + with_page(path, page + 1)
+        return LINK_NEXT_RE.sub(f'<link rel="next" href="{next_url}"/>', body).replace(
+            f"{ORIGIN}{self.start_key}?page=2", next_url
+        )
+
+
+class FixtureServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, site, port: int = 0, latency_ms: float = 0, jitter_ms: float = 0,
+                 rate_429: float = 0.0, retry_after: float = 1.0, max_pages: int | None = None, seed: int = 0):
+        super().__init__(("127.0.0.1", port), FixtureHandler)
+        self.site = site
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.max_pages = max_pages
+        self.random = random.Random(seed)
+        self.counts = {"requests": 0, "served": 0, "not_modified": 0, "throttled": 0, "missing": 0}
+        self._lock = threading.Lock()
+
+    @property
+    def origin(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def count(self, what: str) -> None:
+        with self._lock:
+            self.counts[what] += 1
+
+    def body(self, key: str) -> str | None:
+        if self.max_pages is not None and page_number(key) > self.max_pages:
+            return None
+        body = self.site.get(key)
+        if body is None:
+            return None
+        if self.max_pages is not None and page_number(key) == self.max_pages:
+            body = strip_next(body)
+        return body.replace(ORIGIN, self.origin)
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    server: FixtureServer
+
+    def do_GET(self):
+        server = self.server
+        server.count("requests")
+        delay = server.latency_ms + server.random.uniform(-server.jitter_ms, server.jitter_ms)
+        if delay > 0:
+            time.sleep(delay / 1000)
+        if server.rate_429 and server.random.random() < server.rate_429:
+            server.count("throttled")
+            self.send_response(429)
+            self.send_header("Retry-After", f"{server.retry_after:g}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        body = server.body(self.path)
+        if body is None:
+            server.count("missing")
+            self.send_error(404)
+            return
+        data = body.encode("utf-8")
+        etag = f'"{hashlib.sha256(data).hexdigest()[:16]}"'
+        if self.headers.get("If-None-Match") == etag:
+            server.count("not_modified")
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        server.count("served")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def record_live(max_categories: int, max_pages: int, sleep_s: float) -> dict[str, str]:
+    pages = {}
+    with requests.Session() as session:
+        def fetch(url: str) -> str:
+            r = session.get(url, headers=scraper.HEADERS, timeout=30)
+            r.raise_for_status()
+            time.sleep(sleep_s)
+            return r.text
+
+        start = fetch(scraper.START)
+        pages[page_key(scraper.START)] = start
+        cats = scraper.categories_from_soup(BeautifulSoup(start, "html.parser"))[:max_categories]
+        for cat in cats:
+            url, n = cat.url, 0
+            while url and n < max_pages:
+                body = fetch(url)
+                n += 1
+                next_url = scraper.parse_listing_page(body)[1]
+                pages[page_key(url)] = body if next_url and n < max_pages else strip_next(body)
+                print(f"recorded {cat.name} page {n}")
+                url = next_url
+    return pages
+
+
+def record_from_cache(path: str) -> dict[str, str]:
+    db = sqlite3.connect(path)
+    rows = db.execute("SELECT url, body FROM responses").fetchall()
+    db.close()
+    return {page_key(url): zlib.decompress(body).decode("utf-8") for url, body in rows if url.startswith(ORIGIN)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    rec = sub.add_parser("record", help="snapshot pages into a fixture directory")
+    rec.add_argument("out")
+    rec.add_argument("--from-cache", help="take the pages from a scraper HTTP cache instead of the live site")
+    rec.add_argument("--categories", type=int, default=3)
+    rec.add_argument("--pages", type=int, default=2, help="pages per category")
+    rec.add_argument("--sleep", type=float, default=1.0, help="pause between live requests")
+
+    srv = sub.add_parser("serve", help="replay a recording or the synthetic site")
+    srv.add_argument("fixture", nargs="?", help="recording directory")
+    srv.add_argument("--synthetic", action="store_true", help=f"serve pages built from {TEMPLATE.name}")
+    srv.add_argument("--port", type=int, default=8765, help="0 picks a free port")
+    srv.add_argument("--latency-ms", type=float, default=0)
+    srv.add_argument("--jitter-ms", type=float, default=0)
+    srv.add_argument("--rate-429", type=float, default=0, help="share of requests answered with 429")
+    srv.add_argument("--retry-after", type=float, default=1.0)
+    srv.add_argument("--pages", type=int, help="last page of each category")
+    srv.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.command == "record":
+        pages = record_from_cache(args.from_cache) if args.from_cache else \
+            record_live(args.categories, args.pages, args.sleep)
+        Recording.write(Path(args.out), pages)
+        print(f"Wrote {len(pages)} pages to {args.out}")
+        return
+
+    if args.synthetic == bool(args.fixture):
+        parser.error("serve needs a recording directory or --synthetic")
+    site = SyntheticSite() if args.synthetic else Recording(Path(args.fixture))
+    server = FixtureServer(site, args.port, args.latency_ms, args.jitter_ms, args.rate_429,
+                           args.retry_after, args.pages, args.seed)
+    print(f"Serving on {server.origin}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(json.dumps(server.counts), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
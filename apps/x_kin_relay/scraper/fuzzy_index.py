@@ -0,0 +1,151 @@
+"""
+Fuzzy lookup of substance names that the exact matcher misses: typos,
+c/k/z spellings, ae for ä, and truncations such as "hydrocort" or
+"zetirizindihydrochlorid". Dictionary keys are indexed once by their
+character trigrams; each distinct word of the names is looked up in that
+inverted index, and only the few keys sharing most trigrams with it get an
+edit-distance check, so there is no pairwise comparison against the whole
+dictionary.
+"""
+
+import re
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+
+WORD_RE = re.compile(r"[a-z]+")
+FOLD = str.maketrans({"ä": "ae", "ö": "oe", "ü": "ue", "ß": "ss"})
+SOUND_ALIKE = set("ckz")  # "zetirizin", "koffein": the only first letters allowed to differ
+
+MIN_ABBREVIATION = 6      # "mometa" for mometason; "hepar" is not heparin
+MIN_COVERAGE = 0.6        # an abbreviation keeps at least this share of the key
+MAX_EDITS = ((10, 2), (7, 1))  # key length -> edits allowed; shorter keys must match exactly
+MIN_COMPOUND_TAIL = 4     # "cetirizin|dihydrochlorid", not "heparan|ox"
+MIN_SHARED = 0.4          # share of a key's trigrams a word must contain to be checked
+MAX_CANDIDATES = 8
+
+# Confidence per kind of hit, from bench_fuzzy.py --calibrate on the shipped
+# dictionary and catalog: every kind was right on the perturbed keys and on
+# the catalog, so these stay just under the exact matcher's 0.9 and are
+# ordered by how often each kind misfired on catalog words before the guards
+# above (two edits most: "cannabigold").
+CONFIDENCE = {"edit1": 0.85, "abbreviation": 0.8, "edit2": 0.75}
+
+
+def settings() -> dict:
+    """Everything that decides which words hit and how confident they are."""
+    return {
+        "sound_alike": "".join(sorted(SOUND_ALIKE)),
+        "min_abbreviation": MIN_ABBREVIATION,
+        "min_coverage": MIN_COVERAGE,
+        "max_edits": MAX_EDITS,
+        "min_compound_tail": MIN_COMPOUND_TAIL,
+        "min_shared": MIN_SHARED,
+        "max_candidates": MAX_CANDIDATES,
+        "confidence": CONFIDENCE,
+    }
+
+
+def fold(text: str) -> str:
+    return text.lower().translate(FOLD)
+
+
+def trigrams(word: str) -> set[str]:
+    padded = f" {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Optimal string alignment distance (adjacent swaps count once), capped at limit + 1."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev2, prev = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        if min(cur) > limit:
+            return limit + 1
+        prev2, prev = prev, cur
+    return prev[-1]
+
+
+def max_edits(key: str) -> int:
+    return next((edits for length, edits in MAX_EDITS if len(key) >= length), 0)
+
+
+@dataclass(frozen=True)
+class FuzzyHit:
+    key: str
+    word: str
+    kind: str  # edit1 | edit2 | abbreviation
+    score: float
+
+    @property
+    def confidence(self) -> float:
+        return CONFIDENCE[self.kind]
+
+
+def compare(key: str, word: str) -> FuzzyHit | None:
+    """How a folded word relates to a folded key, if it plausibly is that key."""
+    if word[0] != key[0] and not (word[0] in SOUND_ALIKE and key[0] in SOUND_ALIKE):
+        return None
+    if len(word) >= MIN_ABBREVIATION and len(word) < len(key) and key.startswith(word):
+        if len(word) >= MIN_COVERAGE * len(key):
+            return FuzzyHit(key, word, "abbreviation", round(len(word) / len(key), 3))
+        return None
+    limit = max_edits(key)
+    if not limit:
+        return None
+    # Compounds ("...dihydrochlorid") are compared by their head
+    lengths = range(len(key) - limit, len(key) + limit + 1)
+    best = limit + 1
+    for head in {word[:n] for n in lengths if n == len(word) or 0 < n <= len(word) - MIN_COMPOUND_TAIL}:
+        # "biotic" is not "biotin", "loratadni" is still loratadin
+        if head[-1] == key[-1] or head[-2:] == key[:-3:-1]:
+            best = min(best, edit_distance(key, head, limit))
+    if best == 0 or best > limit:
+        return None
+    return FuzzyHit(key, word, f"edit{best}", round(1 - best / len(key), 3))
+
+
+class TrigramIndex:
+    def __init__(self, keys: list[str]):
+        # Multi-word keys ("vitamin d3") are left to the exact matcher
+        self.keys = sorted({key for key in map(fold, keys) if WORD_RE.fullmatch(key)})
+        self._sizes = [len(trigrams(k)) for k in self.keys]
+        self._postings: dict[str, list[int]] = defaultdict(list)
+        for i, key in enumerate(self.keys):
+            for gram in trigrams(key):
+                self._postings[gram].append(i)
+        self._words: dict[str, FuzzyHit | None] = {}
+
+    def lookup(self, word: str) -> FuzzyHit | None:
+        """Best dictionary key for one folded word, memoized across calls."""
+        if word in self._words:
+            return self._words[word]
+        hit = None
+        if len(word) >= MIN_ABBREVIATION:
+            shared = Counter()
+            for gram in trigrams(word):
+                for i in self._postings.get(gram, ()):
+                    shared[i] += 1
+            for i, count in shared.most_common(MAX_CANDIDATES):
+                if count < MIN_SHARED * self._sizes[i]:
+                    continue
+                found = compare(self.keys[i], word)
+                if found is not None and (hit is None or (found.score, len(found.key)) > (hit.score, len(hit.key))):
+                    hit = found
+        self._words[word] = hit
+        return hit
+
+    def search(self, cleaned_name: str) -> list[FuzzyHit]:
+        """Hits for the words of a name, best first."""
+        hits = {}
+        for word in WORD_RE.findall(fold(cleaned_name)):
+            hit = self.lookup(word)
+            if hit is not None and (hit.key not in hits or hit.score > hits[hit.key].score):
+                hits[hit.key] = hit
+        return sorted(hits.values(), key=lambda h: -h.score)
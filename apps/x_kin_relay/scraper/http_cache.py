@@ -0,0 +1,156 @@
+"""
+Persistent HTTP response cache for the scraper.
+Bodies are stored zlib-compressed in SQLite, keyed by URL, together with
+their ETag/Last-Modified validators and the parse result of the body, so a
+re-crawl can send conditional requests and skip re-parsing pages that did
+not change. Entries expire after a TTL and the least recently used ones are
+dropped once the cache exceeds its size cap.
+"""
+
+import json
+import time
+import zlib
+import sqlite3
+import hashlib
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    url TEXT PRIMARY KEY,
+    body BLOB NOT NULL,
+    body_hash TEXT NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    parsed TEXT,
+    parse_version TEXT,
+    size INTEGER NOT NULL,
+    fetched_at REAL NOT NULL,
+    validated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_lru ON responses (validated_at);
+"""
+
+
+@dataclass
+class CachedResponse:
+    url: str
+    text: str
+    body_hash: str
+    etag: str | None
+    last_modified: str | None
+    parsed: Any
+    parse_version: str | None
+    fetched_at: float
+
+    def conditional_headers(self) -> dict:
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+def body_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class HttpCache:
+    def __init__(self, path: Path, ttl_seconds: float = 7 * 86400, max_bytes: int = 500 * 1024 * 1024):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.hits = 0            # served from cache (304 or offline)
+        self.unchanged = 0       # 200 with the same body as cached
+        self.misses = 0
+        self.bytes_saved = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self._db.close()
+
+    def get(self, url: str, allow_stale: bool = False) -> CachedResponse | None:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT body, body_hash, etag, last_modified, parsed, parse_version, fetched_at, validated_at"
+                " FROM responses WHERE url = ?",
+                (url,),
+            ).fetchone()
+        if row is None:
+            return None
+        body, digest, etag, last_modified, parsed, parse_version, fetched_at, validated_at = row
+        if not allow_stale and self.ttl_seconds > 0 and time.time() - validated_at > self.ttl_seconds:
+            return None
+        return CachedResponse(
+            url, zlib.decompress(body).decode("utf-8"), digest, etag, last_modified,
+            json.loads(parsed) if parsed is not None else None, parse_version, fetched_at,
+        )
+
+    def put(self, url: str, text: str, etag: str | None, last_modified: str | None) -> str:
+        """Store a fresh 200 body; the parse result is kept only if the body is unchanged."""
+        digest = body_hash(text)
+        body = zlib.compress(text.encode("utf-8"), 6)
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO responses (url, body, body_hash, etag, last_modified, size, fetched_at, validated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT(url) DO UPDATE SET"
+                "  parsed = CASE WHEN body_hash = excluded.body_hash THEN parsed END,"
+                "  parse_version = CASE WHEN body_hash = excluded.body_hash THEN parse_version END,"
+                "  body = excluded.body, body_hash = excluded.body_hash, etag = excluded.etag,"
+                "  last_modified = excluded.last_modified, size = excluded.size,"
+                "  fetched_at = excluded.fetched_at, validated_at = excluded.validated_at",
+                (url, body, digest, etag, last_modified, len(body), now, now),
+            )
+        return digest
+
+    def touch(self, url: str) -> None:
+        """The server confirmed the cached body (304)."""
+        with self._lock:
+            self._db.execute("UPDATE responses SET validated_at = ? WHERE url = ?", (time.time(), url))
+
+    def put_parsed(self, url: str, digest: str, parsed: Any, parse_version: str) -> None:
+        with self._lock:
+            self._db.execute(
+                "UPDATE responses SET parsed = ?, parse_version = ? WHERE url = ? AND body_hash = ?",
+                (json.dumps(parsed), parse_version, url, digest),
+            )
+
+    def evict(self) -> int:
+        """Drop expired entries, then the least recently validated ones beyond the size cap."""
+        with self._lock:
+            removed = 0
+            if self.ttl_seconds > 0:
+                cur = self._db.execute(
+                    "DELETE FROM responses WHERE validated_at < ?", (time.time() - self.ttl_seconds,)
+                )
+                removed += cur.rowcount
+            total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total > self.max_bytes:
+                rows = self._db.execute("SELECT url, size FROM responses ORDER BY validated_at").fetchall()
+                for url, size in rows:
+                    if total <= self.max_bytes:
+                        break
+                    self._db.execute("DELETE FROM responses WHERE url = ?", (url,))
+                    total -= size
+                    removed += 1
+            return removed
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {
+            "entries": entries,
+            "bytes": size,
+            "hits": self.hits,
+            "unchanged": self.unchanged,
+            "misses": self.misses,
+            "bytes_saved": self.bytes_saved,
+        }
@@ -0,0 +1,258 @@
+"""
+Fast parsing backends for DocMorris listing pages.
+Each backend returns the same (products, next_page_url) as the BeautifulSoup
+parser in scraper.py:
+
+- json: reads the products straight from the embedded JSON-LD ItemList or
+  the Next.js __NEXT_DATA__ search hits, without building a DOM at all
+- lxml: the card/title heuristics of parse_products_from_listing as XPath
+  over libxml2's parser
+- selectolax: the same over Lexbor, if selectolax is installed
+"""
+
+import re
+import json
+import html as html_lib
+from urllib.parse import urljoin, urlparse
+
+try:
+    import lxml.html
+except ImportError:  # optional
+    lxml = None
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:  # optional
+    LexborHTMLParser = None
+
+PRODUCT_PATH_RE = re.compile(r"/[^/]+/\d{4,}")
+WHITESPACE_RE = re.compile(r"\s+")
+SCRIPT_RE = re.compile(r"<script\b([^>]*)>(.*?)</script>", re.DOTALL | re.IGNORECASE)
+LINK_NEXT_RE = re.compile(r"<link\b[^>]*\brel=[\"']?next\b[^>]*>", re.IGNORECASE)
+ANCHOR_RE = re.compile(r"<a\b[^>]*>", re.IGNORECASE)
+HREF_RE = re.compile(r"\bhref=(?:\"([^\"]*)\"|'([^']*)')", re.IGNORECASE)
+# Same fallback as scraper.parse_products_from_listing, run on the raw HTML
+JSON_URL_NAME_RE = re.compile(
+    r'"url"\s*:\s*"(https?://www\.docmorris\.de/[^"]+)".*?"name"\s*:\s*"([^"]+)"', re.DOTALL
+)
+
+# Same order as the BeautifulSoup strategies; the one with most matches wins
+CARD_XPATHS = [
+    "//*[@data-testid='search-grid-product-card-wrapper']",
+    "//*[@data-testid='product-tile']",
+    "//*[contains(concat(' ', normalize-space(@class), ' '), ' product-tile ')]",
+    "//*[contains(concat(' ', normalize-space(@class), ' '), ' ProductTile ')]",
+    "//article",
+]
+TITLE_XPATHS = [
+    ".//*[@data-testid='product-title']",
+    ".//*[@data-testid='product-name']",
+    ".//*[contains(concat(' ', normalize-space(@class), ' '), ' product-title ')]",
+    ".//h3",
+    ".//h2",
+]
+CARD_CSS = [
+    "[data-testid='search-grid-product-card-wrapper']",
+    "[data-testid='product-tile']",
+    ".product-tile",
+    ".ProductTile",
+    "article",
+]
+TITLE_CSS = [
+    "[data-testid='product-title']",
+    "[data-testid='product-name']",
+    ".product-title",
+    "h3",
+    "h2",
+]
+
+
+def is_product_url(url: str) -> bool:
+    return bool(PRODUCT_PATH_RE.search(urlparse(url).path))
+
+
+def clean_name(name: str) -> str:
+    return WHITESPACE_RE.sub(" ", name).strip()
+
+
+def dedupe(products: list[dict]) -> list[dict]:
+    """Drop repeats and anything that is not a product page, keeping order."""
+    seen = set()
+    uniq = []
+    for p in products:
+        url = p.get("product_url")
+        if not url or url in seen or not is_product_url(url):
+            continue
+        seen.add(url)
+        uniq.append(p)
+    return uniq
+
+
+def _attr(tag: str, name: str) -> str | None:
+    m = re.search(rf"\b{name}=(?:\"([^\"]*)\"|'([^']*)')", tag, re.IGNORECASE)
+    if not m:
+        return None
+    return html_lib.unescape(m.group(1) if m.group(1) is not None else m.group(2))
+
+
+def next_page_from_html(page: str, base: str) -> str | None:
+    """find_next_page without a DOM: <link rel=next>, then a 'Nächste' / rel=next anchor."""
+    m = LINK_NEXT_RE.search(page)
+    if m and (href := _attr(m.group(0), "href")):
+        return urljoin(base, href)
+    for m in ANCHOR_RE.finditer(page):
+        tag = m.group(0)
+        label = _attr(tag, "aria-label") or ""
+        if "Nächste" in label or _attr(tag, "rel") == "next":
+            href = _attr(tag, "href")
+            if href:
+                return urljoin(base, href)
+    return None
+
+
+def _scripts(page: str):
+    for m in SCRIPT_RE.finditer(page):
+        yield m.group(1), m.group(2)
+
+
+def products_from_json_ld(page: str, base: str) -> list[dict] | None:
+    """Products of a schema.org ItemList, or None when the page has none."""
+    for attrs, body in _scripts(page):
+        if "application/ld+json" not in attrs:
+            continue
+        try:
+            data = json.loads(body)
+        except ValueError:
+            continue
+        blocks = data if isinstance(data, list) else [data]
+        for block in blocks:
+            for node in block.get("@graph", [block]) if isinstance(block, dict) else []:
+                if not isinstance(node, dict) or node.get("@type") != "ItemList":
+                    continue
+                products = []
+                for element in node.get("itemListElement", []):
+                    item = element.get("item", element) if isinstance(element, dict) else {}
+                    url = item.get("@id") or item.get("url")
+                    name = item.get("name")
+                    if url and name:
+                        products.append({"name_display": clean_name(name), "product_url": urljoin(base, url)})
+                if products:
+                    return dedupe(products)
+    return None
+
+
+def products_from_next_data(page: str, base: str) -> list[dict] | None:
+    """Products from the Next.js page props (Algolia search hits), or None."""
+    for attrs, body in _scripts(page):
+        if "__NEXT_DATA__" not in attrs:
+            continue
+        try:
+            hits = json.loads(body)["props"]["pageProps"]["initialResults"]["hits"]
+        except (ValueError, KeyError, TypeError):
+            return None
+        products = []
+        for hit in hits:
+            slug, pzn, name = hit.get("slug"), hit.get("lazy_id"), hit.get("name")
+            if slug and pzn and name:
+                products.append({"name_display": clean_name(name), "product_url": urljoin(base, f"/{slug}/{pzn}")})
+        return dedupe(products) if products else None
+    return None
+
+
+def parse_json(page: str, base: str) -> tuple[list[dict], str | None] | None:
+    """Embedded-JSON fast path; None if the page carries no product list."""
+    products = products_from_json_ld(page, base)
+    if products is None:
+        products = products_from_next_data(page, base)
+    if products is None:
+        return None
+    return products, next_page_from_html(page, base)
+
+
+def _fallback_products(page: str, anchors, base: str) -> list[dict]:
+    """No cards: embedded "url"/"name" pairs, then anything that links to a product."""
+    products = [
+        {"name_display": clean_name(m.group(2)), "product_url": m.group(1)}
+        for m in JSON_URL_NAME_RE.finditer(page)
+    ]
+    if not products:
+        for href, text in anchors:
+            name = text.strip()
+            if name and ("/p/" in href or "/produkt/" in href or re.search(r"/[^/]+/\d{5,}", href)):
+                products.append({"name_display": name, "product_url": urljoin(base, href)})
+    return dedupe(products)
+
+
+def parse_lxml(page: str, base: str) -> tuple[list[dict], str | None]:
+    doc = lxml.html.fromstring(page)
+    cards = []
+    for xpath in CARD_XPATHS:
+        found = doc.xpath(xpath)
+        if len(found) > len(cards):
+            cards = found
+
+    if not cards:
+        anchors = ((a.get("href", ""), a.text_content()) for a in doc.xpath("//a[@href]"))
+        products = _fallback_products(page, anchors, base)
+    else:
+        products = []
+        for card in cards:
+            links = card.xpath(".//a[@href]")
+            if not links:
+                continue
+            title = next((found[0] for xpath in TITLE_XPATHS if (found := card.xpath(xpath))), None)
+            name = clean_name((title if title is not None else links[0]).text_content())
+            if name:
+                products.append({"name_display": name, "product_url": urljoin(base, links[0].get("href", ""))})
+        products = dedupe(products)
+
+    next_url = None
+    link = doc.xpath("//link[contains(concat(' ', normalize-space(@rel), ' '), ' next ')][@href]")
+    if link:
+        next_url = urljoin(base, link[0].get("href"))
+    else:
+        anchor = doc.xpath("//a[contains(@aria-label, 'Nächste') or @rel='next'][@href]")
+        if anchor:
+            next_url = urljoin(base, anchor[0].get("href"))
+    return products, next_url
+
+
+def parse_selectolax(page: str, base: str) -> tuple[list[dict], str | None]:
+    tree = LexborHTMLParser(page)
+    cards = []
+    for sel in CARD_CSS:
+        found = tree.css(sel)
+        if len(found) > len(cards):
+            cards = found
+
+    if not cards:
+        anchors = ((a.attributes.get("href") or "", a.text()) for a in tree.css("a[href]"))
+        products = _fallback_products(page, anchors, base)
+    else:
+        products = []
+        for card in cards:
+            link = card.css_first("a[href]")
+            if link is None:
+                continue
+            title = next((found for sel in TITLE_CSS if (found := card.css_first(sel)) is not None), None)
+            name = clean_name((title or link).text())
+            if name:
+                products.append({"name_display": name, "product_url": urljoin(base, link.attributes.get("href") or "")})
+        products = dedupe(products)
+
+    next_el = tree.css_first("link[rel~='next'][href]") or tree.css_first("a[aria-label*='Nächste'][href], a[rel='next'][href]")
+    next_url = urljoin(base, next_el.attributes["href"]) if next_el is not None else None
+    return products, next_url
+
+
+def available_dom_backends() -> list[str]:
+    """Installed DOM backends, fastest first."""
+    backends = []
+    if LexborHTMLParser is not None:
+        backends.append("selectolax")
+    if lxml is not None:
+        backends.append("lxml")
+    return backends
+
+
+DOM_BACKENDS = {"lxml": parse_lxml, "selectolax": parse_selectolax}
@@ -0,0 +1,145 @@
+"""
+Details of a DocMorris product page: PZN, strength, pack size and
+prescription status. The product's Next.js props (the same record the
+listing search hits carry) are the source; JSON-LD and the page text fill
+in the PZN and name when they are missing. Strength is not a field of its
+own, so it comes from the product name, as does the pack size when the
+props have none. Prescription status is only taken from sales_type: the
+words "rezeptpflichtig" / "apothekenpflichtig" also appear in every page's
+navigation, so the page text cannot tell.
+"""
+
+import re
+import json
+from urllib.parse import urljoin, urlparse
+
+from listing_parsers import ANCHOR_RE, HREF_RE, SCRIPT_RE, clean_name, is_product_url
+
+DETAIL_FIELDS = ["pzn", "name", "strength", "pack_size", "prescription_type",
+                 "pharmaceutical_form", "atc_code", "active_ingredients"]
+
+# sales_type -> prescription_type; otx is "apothekenpflichtig" (pharmacy only, no prescription)
+SALES_TYPES = {"rx": "rx", "otx": "pharmacy_only", "otc": "otc"}
+
+URL_PZN_RE = re.compile(r"/(\d{8})/?$")
+TEXT_PZN_RE = re.compile(r"PZN\W{0,3}(\d{8})\b")
+H1_RE = re.compile(r"<h1\b[^>]*>(.*?)</h1>", re.DOTALL | re.IGNORECASE)
+TAG_RE = re.compile(r"<[^>]+>")
+NUMBER = r"\d+(?:[.,]\d+)?"
+# "50 St", "30X0,5 ml", "3X60 ml", "180 g", "1 P" at the end of the name
+PACK_RE = re.compile(rf"({NUMBER}(?:\s*[xX]\s*{NUMBER})?\s*(?:St(?:ück)?|ml|g|kg|l|Btl|Beutel|Amp|P|Set))\.?\s*$",
+                     re.IGNORECASE)
+# "400 mg", "23,2 mg/g", "0,1%", "1000 I.E.", "500 mg/5 ml"; a bare "g" is a pack size
+STRENGTH_RE = re.compile(
+    rf"(?<![\w.,])({NUMBER}\s*(?:mg|µg|mcg|I\.\s?E\.|IE|%|g(?=\s*/))"
+    rf"(?:\s*/\s*(?:{NUMBER}\s*)?(?:ml|g|Hub|Dosis))?)(?![a-zäöüß])",
+    re.IGNORECASE,
+)
+
+
+def pzn_from_url(url: str) -> str | None:
+    m = URL_PZN_RE.search(urlparse(url).path)
+    return m.group(1) if m else None
+
+
+def strength_from_name(name: str) -> str | None:
+    """Every strength in a name, "; "-joined for combinations."""
+    name = PACK_RE.sub("", name)
+    found = list(dict.fromkeys(clean_name(m) for m in STRENGTH_RE.findall(name)))
+    return "; ".join(found) or None
+
+
+def pack_size_from_name(name: str) -> str | None:
+    m = PACK_RE.search(name)
+    return clean_name(m.group(1)) if m else None
+
+
+def _json_scripts(page: str):
+    for m in SCRIPT_RE.finditer(page):
+        attrs, body = m.group(1), m.group(2)
+        if "__NEXT_DATA__" in attrs or "application/ld+json" in attrs:
+            try:
+                yield attrs, json.loads(body)
+            except ValueError:
+                continue
+
+
+def _dicts(data):
+    stack = [data]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            yield node
+            stack.extend(node.values())
+        elif isinstance(node, list):
+            stack.extend(node)
+
+
+def product_props(page: str, pzn: str | None) -> dict | None:
+    """The product record in __NEXT_DATA__, preferring the one for this PZN."""
+    found = None
+    for attrs, data in _json_scripts(page):
+        if "__NEXT_DATA__" not in attrs:
+            continue
+        for node in _dicts(data):
+            if "sales_type" in node or "pharmaceutical_properties" in node:
+                if pzn is not None and node.get("lazy_id") == pzn:
+                    return node
+                found = found or node
+    return found
+
+
+def json_ld_product(page: str) -> dict | None:
+    for attrs, data in _json_scripts(page):
+        if "application/ld+json" not in attrs:
+            continue
+        for node in _dicts(data):
+            if node.get("@type") == "Product":
+                return node
+    return None
+
+
+def product_links(page: str, url: str, base: str) -> list[str]:
+    """Other product pages on the same host that this page links to (variants, recommendations)."""
+    host = urlparse(base).netloc
+    links = {}
+    for m in ANCHOR_RE.finditer(page):
+        href = HREF_RE.search(m.group(0))
+        if not href:
+            continue
+        link = urljoin(base, href.group(1) if href.group(1) is not None else href.group(2)).split("#")[0]
+        if link != url and urlparse(link).netloc == host and is_product_url(link):
+            links[link] = None
+    return list(links)
+
+
+def parse_product_page(page: str, url: str, base: str) -> dict:
+    """DETAIL_FIELDS of one product page, plus the product links it contains."""
+    url_pzn = pzn_from_url(url)
+    props = product_props(page, url_pzn) or {}
+    ld = json_ld_product(page) or {}
+    pharma = props.get("pharmaceutical_properties") or {}
+    attributes = props.get("attributes") or {}
+
+    name = props.get("name") or ld.get("name")
+    if not name and (m := H1_RE.search(page)):
+        name = TAG_RE.sub("", m.group(1))
+    name = clean_name(name) if name else None
+
+    text_pzn = TEXT_PZN_RE.search(page)
+    sku = str(ld.get("sku") or "")
+    pzn = props.get("lazy_id") or (sku if re.fullmatch(r"\d{8}", sku) else None) or \
+        (text_pzn.group(1) if text_pzn else None) or url_pzn
+
+    sales_type = (props.get("sales_type") or "").lower()
+    return {
+        "pzn": pzn,
+        "name": name,
+        "strength": strength_from_name(name) if name else None,
+        "pack_size": attributes.get("packaging_size") or (pack_size_from_name(name) if name else None),
+        "prescription_type": SALES_TYPES.get(sales_type, sales_type or "unknown"),
+        "pharmaceutical_form": pharma.get("pharmaceutical_form"),
+        "atc_code": pharma.get("atc_code"),
+        "active_ingredients": "; ".join(pharma.get("active_ingredients") or []) or None,
+        "links": product_links(page, url, base),
+    }
@@ -1,13 +1,29 @@
 import re
 import time
+import random
+import signal
+import asyncio
+import argparse
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
 from dataclasses import dataclass
+from pathlib import Path
 from urllib.parse import urljoin, urlparse
 
+import httpx
 import pandas as pd
 import requests
 from bs4 import BeautifulSoup
 from tqdm import tqdm
 
+from crawl_checkpoint import CrawlCheckpoint
+from detail_frontier import DetailFrontier
+from enrichment_store import MEDS_COLUMNS, EnrichmentStore, internal_category, medications_frame
+from http_cache import CachedResponse, HttpCache
+from listing_parsers import DOM_BACKENDS, available_dom_backends, next_page_from_html, parse_json
+from product_page import parse_product_page
+from substance_matcher import load_substance_map, matcher_for
+
 
 BASE = "https://www.docmorris.de"
 START = "https://www.docmorris.de/arzneimittel-gesundheit"  # the "Medikamente" entrypoint
@@ -24,10 +40,14 @@ class Category:
     url: str
 
 
-def get_soup(url: str, session: requests.Session) -> BeautifulSoup:
+def get_html(url: str, session: requests.Session) -> str:
     r = session.get(url, headers=HEADERS, timeout=30)
     r.raise_for_status()
-    return BeautifulSoup(r.text, "html.parser")
+    return r.text
+
+
+def get_soup(url: str, session: requests.Session) -> BeautifulSoup:
+    return BeautifulSoup(get_html(url, session), "html.parser")
 
 
 def extract_categories(session: requests.Session) -> list[Category]:
@@ -35,8 +55,10 @@ def extract_categories(session: requests.Session) -> list[Category]:
     Tries to extract the medication categories from the 'arzneimittel-gesundheit' landing page.
     You may need to adjust selectors if DocMorris changes markup.
     """
-    soup = get_soup(START, session)
+    return categories_from_soup(get_soup(START, session))
+
 
+def categories_from_soup(soup: BeautifulSoup) -> list[Category]:
     cats = []
 
     # Prefer the sidebar / navigation element that lists categories
@@ -204,9 +226,7 @@ def scrape_category_all_products(cat: Category, session: requests.Session, sleep
     while url and pages < max_pages:
         soup = get_soup(url, session)
         products = parse_products_from_listing(soup)
-        for p in products:
-            p["category"] = cat.name
-            p["category_url"] = cat.url
+        tag_category(products, cat)
         all_products.extend(products)
 
         pages += 1
@@ -217,143 +237,663 @@ def scrape_category_all_products(cat: Category, session: requests.Session, sleep
     return all_products
 
 
-def normalize_active_substance(name_display: str, mapping: dict[str, dict]) -> dict:
+def tag_category(products: list[dict], cat: Category) -> None:
+    for p in products:
+        p["category"] = cat.name
+        p["category_url"] = cat.url
+
+
+class TokenBucket:
     """
-    MVP normalization:
-    - detect active substance from the product name using a mapping dict (German spellings)
-    - returns {active_substance, atc_code, confidence}
+    Global politeness limit shared by all concurrent fetches: `rate` requests
+    per second on average, with bursts of at most `capacity`.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class AdaptiveRate:
+    """
+    Adjusts a TokenBucket from what the server tells us: additive increase
+    while responses stay fast, multiplicative decrease when latency climbs
+    past the target or the server answers 429/5xx.
+    """
+
+    def __init__(self, bucket: TokenBucket, min_rate: float, max_rate: float, target_latency_s: float = 1.5):
+        self.bucket = bucket
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.target_latency_s = target_latency_s
+        self.latency_ewma: float | None = None
+
+    def on_response(self, latency_s: float, status: int) -> None:
+        if self.latency_ewma is None:
+            self.latency_ewma = latency_s
+        else:
+            self.latency_ewma = 0.8 * self.latency_ewma + 0.2 * latency_s
+
+        rate = self.bucket.rate
+        if status == 429 or status >= 500:
+            rate *= 0.5
+        elif self.latency_ewma > self.target_latency_s:
+            rate *= 0.8
+        else:
+            rate += 0.05
+        self.bucket.rate = max(self.min_rate, min(self.max_rate, rate))
+
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+def permanent_failure(e: Exception) -> bool:
+    """An HTTP status that a later run would get again (404, 410, ...), unlike timeouts and 5xx."""
+    if isinstance(e, (httpx.HTTPStatusError, requests.HTTPError)) and e.response is not None:
+        return e.response.status_code not in RETRY_STATUS
+    return False
+
+
+def category_failed(checkpoint: CrawlCheckpoint | None, index: int, cat: Category, e: Exception) -> None:
+    """Warn; a permanent failure also finishes the category, transient ones stay resumable."""
+    if checkpoint is not None and permanent_failure(e):
+        checkpoint.fail_category(index, str(e))
+        print(f"[WARN] Failed {cat.name}, skipping it: {e}")
+    else:
+        print(f"[WARN] Failed {cat.name}: {e}")
+
+
+@dataclass
+class Page:
+    url: str
+    text: str
+    digest: str | None = None
+    # Cache entry with the same body, when there is one; its parse result can be reused
+    cached: CachedResponse | None = None
+
+    def cached_parse(self, version: str):
+        if self.cached is not None and self.cached.parse_version == version:
+            return self.cached.parsed
+        return None
+
+
+class AsyncFetcher:
+    """
+    Pooled keep-alive HTTP client for the async crawl. Every request waits
+    for a token; 429/5xx and connection errors are retried with exponential
+    backoff (honouring Retry-After). With a cache, requests are conditional
+    and offline=True serves only what the cache holds.
+    """
+
+    def __init__(self, rate: float = 2.0, max_rate: float = 4.0, min_rate: float = 0.2,
+                 max_connections: int = 8, retries: int = 4, backoff_s: float = 1.0,
+                 cache: HttpCache | None = None, offline: bool = False):
+        if offline and cache is None:
+            raise ValueError("offline replay needs a cache")
+        self.cache = cache
+        self.offline = offline
+        self.bucket = TokenBucket(rate, capacity=max(1.0, rate))
+        self.adaptive = AdaptiveRate(self.bucket, min_rate, max_rate)
+        self.retries = retries
+        self.backoff_s = backoff_s
+        self.client = httpx.AsyncClient(
+            headers=HEADERS,
+            timeout=30,
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+        self.requests = 0
+        self.retried = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.client.aclose()
+
+    def _backoff(self, attempt: int, response: httpx.Response | None) -> float:
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return float(retry_after)
+        return self.backoff_s * 2 ** attempt * (0.5 + random.random())
+
+    async def get_page(self, url: str) -> Page:
+        cache = self.cache
+        cached = cache.get(url, allow_stale=self.offline) if cache is not None else None
+        if self.offline:
+            if cached is None:
+                raise LookupError(f"Not in the HTTP cache (offline replay): {url}")
+            cache.hits += 1
+            return Page(url, cached.text, cached.body_hash, cached)
+
+        response = await self._get(url, cached.conditional_headers() if cached is not None else {})
+        if response.status_code == 304 and cached is not None:
+            cache.touch(url)
+            cache.hits += 1
+            cache.bytes_saved += len(cached.text)
+            return Page(url, cached.text, cached.body_hash, cached)
+        if cache is None:
+            return Page(url, response.text)
+
+        digest = cache.put(url, response.text, response.headers.get("etag"), response.headers.get("last-modified"))
+        if cached is not None and cached.body_hash == digest:
+            cache.unchanged += 1
+            return Page(url, response.text, digest, cached)
+        cache.misses += 1
+        return Page(url, response.text, digest)
+
+    def remember_parse(self, page: Page, parsed, version: str) -> None:
+        if self.cache is not None and page.digest is not None and not self.offline:
+            self.cache.put_parsed(page.url, page.digest, parsed, version)
+
+    async def get_text(self, url: str) -> str:
+        return (await self.get_page(url)).text
+
+    async def _get(self, url: str, headers: dict) -> httpx.Response:
+        for attempt in range(self.retries + 1):
+            await self.bucket.acquire()
+            self.requests += 1
+            start = time.monotonic()
+            response = None
+            try:
+                response = await self.client.get(url, headers=headers)
+                self.adaptive.on_response(time.monotonic() - start, response.status_code)
+                if response.status_code not in RETRY_STATUS:
+                    if response.status_code != 304:
+                        response.raise_for_status()
+                    return response
+                error = httpx.HTTPStatusError(f"HTTP {response.status_code}", request=response.request,
+                                              response=response)
+            except httpx.TransportError as e:
+                self.adaptive.on_response(time.monotonic() - start, 599)
+                error = e
+            if attempt == self.retries:
+                raise error
+            self.retried += 1
+            await asyncio.sleep(self._backoff(attempt, response))
+
+
+# Bump when parsing changes, so cached parse results of unchanged pages are not reused
+PARSE_VERSION = "3"
+PARSERS = ("auto", "json", "selectolax", "lxml", "bs4")
+# "auto": embedded JSON if the page has it, else the fastest installed DOM parser, else bs4
+LISTING_PARSER = "auto"
+
+
+def parse_listing_page(html: str, parser: str | None = None) -> tuple[list[dict], str | None]:
+    """
+    Products and next-page URL of a listing page. The next page is the one
+    next_page_from_html finds, whatever the parser; a DOM parser's own link
+    only counts when the regex finds none. The pooled crawls read the regex
+    link before the parse is done, so every crawl path pages the same way.
+    """
+    parser = parser or LISTING_PARSER
+    if parser in ("auto", "json"):
+        parsed = parse_json(html, BASE)
+        if parsed is not None:
+            return parsed
+        if parser == "json":
+            return [], next_page_from_html(html, BASE)
+        parser = next(iter(available_dom_backends()), "bs4")
+    if parser in DOM_BACKENDS:
+        products, next_url = DOM_BACKENDS[parser](html, BASE)
+    else:
+        soup = BeautifulSoup(html, "html.parser")
+        products, next_url = parse_products_from_listing(soup), find_next_page(soup)
+    return products, next_page_from_html(html, BASE) or next_url
+
+
+def parse_cache_tag() -> str:
+    return f"{PARSE_VERSION}:{LISTING_PARSER}"
+
+
+def _init_parse_worker(base: str) -> None:
+    global BASE
+    BASE = base
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl-C is handled by the crawl, which shuts the pool down
+
+
+class ParsePool:
+    """
+    Worker processes for parse_listing_page, so parsing large listing pages
+    runs on every core instead of holding up the fetch loop.
+    """
+
+    def __init__(self, workers: int, parser: str | None = None):
+        self.workers = workers
+        self.parser = parser or LISTING_PARSER
+        self.executor = ProcessPoolExecutor(workers, initializer=_init_parse_worker, initargs=(BASE,))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self) -> None:
+        self.executor.shutdown(cancel_futures=True)
+
+    def submit(self, html: str) -> Future:
+        return self.executor.submit(parse_listing_page, html, self.parser)
+
+    async def parse(self, html: str) -> tuple[list[dict], str | None]:
+        return await asyncio.wrap_future(self.submit(html))
+
+
+def scrape_category_pipelined(cat: Category, session: requests.Session, pool: ParsePool,
+                              sleep_s: float = 0.8, max_pages: int = 200) -> list[dict]:
+    """
+    scrape_category_all_products with the parsing in a ParsePool: only the
+    next-page link is read here, so the next request goes out while earlier
+    pages are still being parsed. At most pool.workers pages wait for a parse.
     """
-    s = name_display.lower()
+    url = cat.url
+    all_products = []
+    in_flight: deque[Future] = deque()
+    pages = 0
 
-    # Remove common manufacturer tokens that confuse matching
-    s = re.sub(r"\b(adgc|hexal|ratiopharm|al|abz|aristo|axicur|stada)\b", " ", s)
-    s = re.sub(r"\s+", " ", s).strip()
+    def collect() -> None:
+        products, _ = in_flight.popleft().result()
+        tag_category(products, cat)
+        all_products.extend(products)
 
-    best = None
-    for key, val in mapping.items():
-        if key in s:
-            best = val
-            break
+    while url and pages < max_pages:
+        html = get_html(url, session)
+        future = pool.submit(html)
+        in_flight.append(future)
+        pages += 1
+        # Same link as the parse returns (see parse_listing_page), without waiting for it
+        url = next_page_from_html(html, BASE) or future.result()[1]
+        while in_flight and (in_flight[0].done() or len(in_flight) > pool.workers):
+            collect()
+        time.sleep(sleep_s)
+
+    while in_flight:
+        collect()
+    return all_products
 
-    if best:
-        return {"active_substance": best["active_substance"], "atc_code": best.get("atc_code"), "confidence": 0.9}
 
-    return {"active_substance": None, "atc_code": None, "confidence": 0.0}
+async def scrape_category_async(cat: Category, fetcher: AsyncFetcher, max_pages: int = 200,
+                                start_url: str | None = None, pages: int = 0, on_page=None,
+                                pool: ParsePool | None = None) -> list[dict]:
+    """
+    Async twin of scrape_category_all_products; pages of one category are fetched in order.
+    With on_page(products, next_url) each page is handed over instead of collected,
+    and start_url/pages continue a category from a checkpoint. With a pool, pages
+    are parsed in worker processes while the next ones are fetched, as in
+    scrape_category_pipelined; on_page still sees them in page order.
+    """
+    url = start_url or cat.url
+    all_products = []
+    in_flight: deque[tuple[asyncio.Future, str | None]] = deque()
+
+    async def parse(page: Page) -> tuple[list[dict], str | None]:
+        parsed = page.cached_parse(parse_cache_tag())
+        if parsed is None:
+            if pool is None:
+                # Parse off the event loop so other categories keep fetching
+                parsed = await asyncio.to_thread(parse_listing_page, page.text)
+            else:
+                parsed = await pool.parse(page.text)
+            fetcher.remember_parse(page, parsed, parse_cache_tag())
+        return parsed
+
+    def deliver(products: list[dict], next_url: str | None) -> None:
+        tag_category(products, cat)
+        if on_page is not None:
+            on_page(products, next_url)
+        else:
+            all_products.extend(products)
+
+    try:
+        while url and pages < max_pages:
+            page = await fetcher.get_page(url)
+            pages += 1
+            if pool is None:
+                products, url = await parse(page)
+                deliver(products, url)
+                continue
+            task = asyncio.ensure_future(parse(page))
+            # Same link as the parse returns (see parse_listing_page), without waiting for it
+            url = next_page_from_html(page.text, BASE) or (await task)[1]
+            in_flight.append((task, url))
+            while in_flight and (in_flight[0][0].done() or len(in_flight) > pool.workers):
+                task, next_url = in_flight.popleft()
+                deliver((await task)[0], next_url)
+
+        while in_flight:
+            task, next_url = in_flight.popleft()
+            deliver((await task)[0], next_url)
+    finally:
+        for task, _ in in_flight:
+            task.cancel()
+
+    return all_products
 
 
-def build_mvp_medications(products_df: pd.DataFrame) -> pd.DataFrame:
+async def crawl_categories(cats: list[Category], fetcher: AsyncFetcher, concurrency: int = 4,
+                           checkpoint: CrawlCheckpoint | None = None, pool: ParsePool | None = None) -> list[dict]:
+    """
+    Crawl categories concurrently under the fetcher's global rate limit. Rows
+    come back in category order, exactly as the sequential crawl returns them.
+    With a checkpoint, rows are streamed into it instead (in arrival order) and
+    categories continue from its frontier; nothing is returned. A pool moves
+    the parsing into worker processes.
+    """
+    results: list[list[dict]] = [[] for _ in cats]
+    slots = asyncio.Semaphore(concurrency)
+
+    async def run(i: int, cat: Category) -> None:
+        async with slots:
+            try:
+                if checkpoint is None:
+                    results[i] = await scrape_category_async(cat, fetcher, pool=pool)
+                else:
+                    entry = checkpoint.frontier[i]
+                    await scrape_category_async(
+                        cat, fetcher, start_url=entry.next_url, pages=entry.pages,
+                        on_page=lambda products, next_url: checkpoint.record(i, products, next_url), pool=pool,
+                    )
+                    checkpoint.finish_category(i)  # also when max_pages cut it short
+            except Exception as e:
+                category_failed(checkpoint, i, cat, e)
+            progress.update(1)
+
+    todo = [i for i in range(len(cats)) if checkpoint is None or not checkpoint.frontier[i].done]
+    with tqdm(total=len(todo), desc="Scraping categories") as progress:
+        await asyncio.gather(*(run(i, cats[i]) for i in todo))
+    return [row for rows in results for row in rows]
+
+
+async def crawl_async(args: argparse.Namespace, checkpoint: CrawlCheckpoint, pool: ParsePool | None = None) -> None:
+    cache = None
+    if args.cache:
+        cache = HttpCache(Path(args.cache), ttl_seconds=args.cache_ttl_days * 86400,
+                          max_bytes=args.cache_max_mb * 1024 * 1024)
+    try:
+        async with AsyncFetcher(rate=args.rate, max_rate=max(args.rate, args.max_rate),
+                                cache=cache, offline=args.offline) as fetcher:
+            cats = resume_categories(checkpoint, args.fresh)
+            if cats is None:
+                start = await fetcher.get_page(START)
+                cats = categories_from_soup(BeautifulSoup(start.text, "html.parser"))
+                print(f"Found {len(cats)} possible categories.")
+                checkpoint.start(cats)
+
+            await crawl_categories(cats, fetcher, concurrency=args.concurrency, checkpoint=checkpoint, pool=pool)
+            print(f"{fetcher.requests} requests, {fetcher.retried} retries, "
+                  f"final rate {fetcher.bucket.rate:.2f} req/s")
+    finally:
+        if cache is not None:
+            # A replay must not expire what it replays from
+            removed = 0 if args.offline else cache.evict()
+            print(f"HTTP cache: {cache.stats()}, {removed} evicted")
+            cache.close()
+
+
+async def crawl_details(frontier: DetailFrontier, fetcher: AsyncFetcher, todo: list[tuple[str, str]],
+                        concurrency: int = 4, follow_links: bool = False) -> None:
+    """
+    Fetch the product pages in todo (url, category) in that order and record
+    their details in the frontier. With follow_links, product links on the
+    pages are queued for a later run.
+    """
+    queue = deque(todo)
+
+    async def worker() -> None:
+        while queue:
+            url, category = queue.popleft()
+            try:
+                page = await fetcher.get_page(url)
+                details = await asyncio.to_thread(parse_product_page, page.text, url, BASE)
+            except httpx.HTTPStatusError as e:
+                frontier.fail(url, f"HTTP {e.response.status_code}", gone=e.response.status_code in (404, 410))
+            except Exception as e:
+                frontier.fail(url, str(e) or type(e).__name__)
+            else:
+                frontier.record(url, details)
+                if follow_links:
+                    frontier.discover(details["links"], category)
+            progress.update(1)
+
+    with tqdm(total=len(todo), desc="Product pages") as progress:
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+async def details_async(args: argparse.Namespace, frontier: DetailFrontier) -> None:
+    todo = frontier.due(args.max_age_days * 86400, args.priority or [], args.details_limit or None)
+    print(f"{len(todo)} product pages due ({frontier.stats()}).")
+    # No HTTP cache: pages are revisited after max_age, long past its TTL
+    async with AsyncFetcher(rate=args.rate, max_rate=max(args.rate, args.max_rate)) as fetcher:
+        await crawl_details(frontier, fetcher, todo, concurrency=args.concurrency, follow_links=args.follow_links)
+        print(f"{fetcher.requests} requests, {fetcher.retried} retries, "
+              f"final rate {fetcher.bucket.rate:.2f} req/s")
+
+
+def enrich_details(args: argparse.Namespace) -> None:
+    """Second stage: product pages of the listing crawl's output, resumable and staleness-driven."""
+    products_df = pd.read_csv(args.output, dtype=str, keep_default_na=False)
+    frontier = DetailFrontier(Path(args.details_db))
+    try:
+        print(f"{frontier.add_listing(products_df)} new product pages queued.")
+        try:
+            asyncio.run(details_async(args, frontier))
+        except KeyboardInterrupt:
+            print("Interrupted; rerun to continue with the remaining pages.")
+        frontier.flush()
+        print(f"{frontier.fetched} fetched, {frontier.failed} failed, {frontier.discovered} links queued; "
+              f"{frontier.stats()}")
+        details = frontier.details(products_df)
+    finally:
+        frontier.close()
+    details.to_csv("docmorris_product_details.csv", index=False, encoding="utf-8")
+    print(f"Wrote docmorris_product_details.csv with {int(details['fetched_at'].notna().sum())} "
+          f"of {len(details)} products detailed.")
+
+
+def resume_categories(checkpoint: CrawlCheckpoint, fresh: bool) -> list[Category] | None:
+    """The categories of an interrupted crawl, with the checkpoint opened on them; else None."""
+    if fresh or not checkpoint.resume():
+        return None
+    left = sum(not f.done for f in checkpoint.frontier)
+    print(f"Resuming crawl: {checkpoint.written} rows written, {left}/{len(checkpoint.frontier)} categories left.")
+    return [Category(f.name, f.url) for f in checkpoint.frontier]
+
+
+# MVP mapping for allergy (extend later, or pass --substances with a full list)
+# Keys are German spellings you expect in product names.
+ALLERGY_MAP = {
+    "cetirizin": {"active_substance": "Cetirizine", "atc_code": "R06AE07"},
+    "levocetirizin": {"active_substance": "Levocetirizine", "atc_code": "R06AE09"},
+    "loratadin": {"active_substance": "Loratadine", "atc_code": "R06AX13"},
+    "desloratadin": {"active_substance": "Desloratadine", "atc_code": "R06AX27"},
+    "fexofenadin": {"active_substance": "Fexofenadine", "atc_code": "R06AX26"},
+    "bilastin": {"active_substance": "Bilastine", "atc_code": "R06AX29"},
+    "mometason": {"active_substance": "Mometasone", "atc_code": "R01AD09"},
+    "azelastin": {"active_substance": "Azelastine", "atc_code": "R01AC03"},
+    "cromoglicinsäure": {"active_substance": "Cromoglicic acid", "atc_code": "R01AC01"},
+    "dimetinden": {"active_substance": "Dimetindene", "atc_code": "R06AB03"},
+    # add more as you expand categories
+}
+
+
+def normalize_active_substance(name_display: str, mapping: dict[str, dict]) -> dict:
+    """
+    MVP normalization:
+    - detect active substances in the product name using a mapping dict (German spellings);
+      the longest key wins, so "levocetirizin" is not read as "cetirizin"
+    - returns {active_substance, atc_code, confidence, active_substances}; combination
+      products list every substance in active_substances, the first one is primary
+    """
+    return matcher_for(mapping).normalize(name_display)
+
+
+def build_mvp_medications(products_df: pd.DataFrame, mapping: dict[str, dict] | None = None,
+                          fuzzy: bool = False) -> pd.DataFrame:
     """
     Create a canonical medications list from raw products:
     - one row per (active_substance, atc_code, category)
     - prescription_type stays unknown
+    - with fuzzy, names without an exact hit are matched by spelling similarity
     """
     # If there are no products or the expected columns are missing, return empty structures
     if products_df is None or products_df.empty or "name_display" not in products_df.columns:
         empty_out = products_df.copy() if isinstance(products_df, pd.DataFrame) else pd.DataFrame()
         # ensure normalization columns exist
-        for col in ("active_substance", "atc_code", "confidence"):
+        for col in ("active_substance", "atc_code", "confidence", "active_substances"):
             if col not in empty_out.columns:
                 empty_out[col] = None
 
-        meds_cols = [
-            "id",
-            "name_display",
-            "active_substance",
-            "atc_code",
-            "category",
-            "prescription_type",
-            "country",
-            "source",
-            "verified",
-            "evidence_count",
-        ]
-        meds_mvp = pd.DataFrame(columns=meds_cols)
+        meds_mvp = pd.DataFrame(columns=MEDS_COLUMNS)
         return empty_out, meds_mvp
 
-    # MVP mapping for allergy (extend later!)
-    # Keys are German spellings you expect in product names.
-    allergy_map = {
-        "cetirizin": {"active_substance": "Cetirizine", "atc_code": "R06AE07"},
-        "levocetirizin": {"active_substance": "Levocetirizine", "atc_code": "R06AE09"},
-        "loratadin": {"active_substance": "Loratadine", "atc_code": "R06AX13"},
-        "desloratadin": {"active_substance": "Desloratadine", "atc_code": "R06AX27"},
-        "fexofenadin": {"active_substance": "Fexofenadine", "atc_code": "R06AX26"},
-        "bilastin": {"active_substance": "Bilastine", "atc_code": "R06AX29"},
-        "mometason": {"active_substance": "Mometasone", "atc_code": "R01AD09"},
-        "azelastin": {"active_substance": "Azelastine", "atc_code": "R01AC03"},
-        "cromoglicinsäure": {"active_substance": "Cromoglicic acid", "atc_code": "R01AC01"},
-        "dimetinden": {"active_substance": "Dimetindene", "atc_code": "R06AB03"},
-        # add more as you expand categories
-    }
-
-    norm = products_df["name_display"].apply(lambda n: normalize_active_substance(n, allergy_map))
-    norm_df = pd.json_normalize(norm)
+    # One pass of the compiled matcher over the whole column
+    norm_df = matcher_for(mapping or ALLERGY_MAP, fuzzy).match_series(products_df["name_display"])
     out = pd.concat([products_df, norm_df], axis=1)
 
     # Build canonical meds from matched rows
     meds = out.dropna(subset=["active_substance"]).copy()
 
     # Map DocMorris category names to your internal category taxonomy
-    # (You can expand this mapping for all categories)
-    meds["category_internal"] = meds["category"].str.lower().map(lambda x: "allergy" if "allerg" in x else "other")
+    meds["category_internal"] = meds["category"].map(internal_category)
 
     # Create medications table rows
-    meds_mvp = (
+    counts = (
         meds.groupby(["active_substance", "atc_code", "category_internal"], dropna=False)
         .size()
         .reset_index(name="evidence_count")
+        .rename(columns={"category_internal": "category"})
     )
-
-    meds_mvp["name_display"] = meds_mvp["active_substance"]  # MVP: show substance; later add common strength variants
-    meds_mvp["prescription_type"] = "unknown"
-    meds_mvp["country"] = "DE"
-    meds_mvp["source"] = "manual"  # because we used heuristics; set 'atc' when you import from ATC dataset
-    meds_mvp["verified"] = False   # make True only when validated via ATC import or manual review
-
-    # Add an id placeholder (UUID should be generated by DB on insert)
-    meds_mvp["id"] = None
-
-    # Order columns like your schema
-    meds_mvp = meds_mvp[[
-        "id",
-        "name_display",
-        "active_substance",
-        "atc_code",
-        "category_internal",
-        "prescription_type",
-        "country",
-        "source",
-        "verified",
-        "evidence_count"
-    ]].rename(columns={"category_internal": "category"})
+    meds_mvp = medications_frame(counts)
 
     return out, meds_mvp
 
 
 def main():
-    with requests.Session() as session:
-        cats = extract_categories(session)
-
-        print(f"Found {len(cats)} possible categories.")
-        # Optional: filter to the ones you want first (e.g., Allergy only)
-        # cats = [c for c in cats if c.name.lower().startswith("allerg")]
-
-        all_rows = []
-        for cat in tqdm(cats, desc="Scraping categories"):
-            try:
-                rows = scrape_category_all_products(cat, session)
-                all_rows.extend(rows)
-            except Exception as e:
-                print(f"[WARN] Failed {cat.name}: {e}")
-
-        products_df = pd.DataFrame(all_rows).drop_duplicates(subset=["product_url"])
-        products_df.to_csv("docmorris_products_raw.csv", index=False, encoding="utf-8")
-        print(f"Wrote docmorris_products_raw.csv with {len(products_df)} rows.")
-
-        enriched_df, meds_mvp = build_mvp_medications(products_df)
-        enriched_df.to_csv("docmorris_products_enriched.csv", index=False, encoding="utf-8")
-        meds_mvp.to_csv("kinrelay_medications_mvp.csv", index=False, encoding="utf-8")
-        print(f"Wrote kinrelay_medications_mvp.csv with {len(meds_mvp)} canonical meds.")
+    parser = argparse.ArgumentParser(description="Scrape DocMorris medication listings")
+    parser.add_argument("--sync", action="store_true", help="old sequential crawl with requests + sleep")
+    parser.add_argument("--concurrency", type=int, default=4, help="categories crawled at once")
+    parser.add_argument("--rate", type=float, default=2.0, help="initial requests/second across all categories")
+    parser.add_argument("--max-rate", type=float, default=4.0, help="ceiling for the adaptive rate")
+    parser.add_argument("--cache", default="http_cache.sqlite3", help="HTTP cache file ('' disables)")
+    parser.add_argument("--cache-ttl-days", type=float, default=7)
+    parser.add_argument("--cache-max-mb", type=int, default=500)
+    parser.add_argument("--offline", action="store_true", help="replay from the HTTP cache, no network")
+    parser.add_argument("--parser", choices=PARSERS, default="auto", help="listing page parser (async crawl)")
+    parser.add_argument("--parse-workers", type=int, default=0,
+                        help="parse pages in this many processes while fetching goes on (0 parses in-process)")
+    parser.add_argument("--output", default="docmorris_products_raw.csv", help="raw products CSV")
+    parser.add_argument("--state", default="crawl_state.json", help="crawl checkpoint, resumed if present")
+    parser.add_argument("--fresh", action="store_true", help="ignore an interrupted crawl and start over")
+    parser.add_argument("--store", default="enrichment.sqlite3",
+                        help="incremental enrichment store ('' rebuilds the CSVs from scratch)")
+    parser.add_argument("--full-export", action="store_true", help="with --store, also write the full CSVs")
+    parser.add_argument("--substances", default="substances_de.csv",
+                        help="CSV of key,active_substance,atc_code ('' uses the built-in allergy map)")
+    parser.add_argument("--fuzzy", action=argparse.BooleanOptionalAction, default=True,
+                        help="match misspelled or abbreviated substances that have no exact hit")
+    parser.add_argument("--details", action="store_true",
+                        help="instead of the listing crawl, visit the product pages in --output for their details")
+    parser.add_argument("--details-db", default="product_details.sqlite3", help="detail crawl frontier")
+    parser.add_argument("--max-age-days", type=float, default=30, help="revisit product pages older than this")
+    parser.add_argument("--priority", action="append", metavar="CATEGORY",
+                        help="crawl categories containing this first (repeatable, in order)")
+    parser.add_argument("--details-limit", type=int, default=0, help="product pages per run (0: all due)")
+    parser.add_argument("--follow-links", action="store_true", help="also queue product pages linked from them")
+    args = parser.parse_args()
+
+    if args.parser in DOM_BACKENDS and args.parser not in available_dom_backends():
+        parser.error(f"--parser {args.parser} is not installed")
+    global LISTING_PARSER
+    LISTING_PARSER = args.parser
+
+    if args.details:
+        enrich_details(args)
+        return
+
+    checkpoint = CrawlCheckpoint(Path(args.output), Path(args.state))
+    # The sync crawl always parsed with BeautifulSoup; its pool keeps doing so
+    pool = ParsePool(args.parse_workers, "bs4" if args.sync else None) if args.parse_workers > 0 else None
+    try:
+        if args.sync:
+            with requests.Session() as session:
+                cats = resume_categories(checkpoint, args.fresh)
+                if cats is None:
+                    cats = extract_categories(session)
+                    print(f"Found {len(cats)} possible categories.")
+                    # Optional: filter to the ones you want first (e.g., Allergy only)
+                    # cats = [c for c in cats if c.name.lower().startswith("allerg")]
+                    checkpoint.start(cats)
+
+                # The sync crawl checkpoints whole categories
+                for i, cat in enumerate(tqdm(cats, desc="Scraping categories")):
+                    if checkpoint.frontier[i].done:
+                        continue
+                    try:
+                        if pool is None:
+                            products = scrape_category_all_products(cat, session)
+                        else:
+                            products = scrape_category_pipelined(cat, session, pool)
+                        checkpoint.record(i, products, None)
+                    except Exception as e:
+                        category_failed(checkpoint, i, cat, e)
+        else:
+            asyncio.run(crawl_async(args, checkpoint, pool))
+    except KeyboardInterrupt:
+        print("Interrupted.")
+    finally:
+        finished = checkpoint.close()
+        if pool is not None:
+            pool.close()
+
+    if not finished:
+        left = [f.name for f in checkpoint.frontier if not f.done]
+        print(f"{len(left)} categories unfinished ({', '.join(left[:5])}{', ...' if len(left) > 5 else ''}); "
+              f"rerun to resume them from {args.state}, or pass --fresh to start over.")
+        return
+    print(f"Wrote {args.output} with {checkpoint.written} rows ({checkpoint.duplicates} duplicate URLs skipped).")
+    if checkpoint.failed:
+        print(f"[WARN] {len(checkpoint.failed)} categories failed and were skipped: "
+              + "; ".join(f"{f.name} ({f.failed})" for f in checkpoint.failed))
+    products_df = pd.read_csv(args.output, dtype=str, keep_default_na=False)
+
+    mapping = load_substance_map(args.substances) if args.substances else None
+    if not args.store:
+        enriched_df, meds_mvp = build_mvp_medications(products_df, mapping, args.fuzzy)
+        write_enrichment(enriched_df, meds_mvp)
+        return
+
+    store = EnrichmentStore(Path(args.store))
+    try:
+        result = store.sync(products_df, mapping or ALLERGY_MAP, args.fuzzy)
+        print(result.summary())
+        diff = result.diff()
+        diff.to_csv("kinrelay_medications_diff.csv", index=False, encoding="utf-8")
+        print(f"Wrote kinrelay_medications_diff.csv with {len(diff)} changed meds.")
+        if args.full_export:
+            write_enrichment(store.products(), store.medications())
+    finally:
+        store.close()
+
+
+def write_enrichment(enriched_df: pd.DataFrame, meds_mvp: pd.DataFrame) -> None:
+    enriched_df.to_csv("docmorris_products_enriched.csv", index=False, encoding="utf-8")
+    meds_mvp.to_csv("kinrelay_medications_mvp.csv", index=False, encoding="utf-8")
+    print(f"Wrote kinrelay_medications_mvp.csv with {len(meds_mvp)} canonical meds.")
 
 
 if __name__ == "__main__":
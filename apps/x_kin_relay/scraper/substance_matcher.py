@@ -0,0 +1,161 @@
+"""
+Multi-pattern active-substance matching for product names.
+All mapping keys are compiled once into a single automaton, so a name is
+scanned in one pass instead of once per substance in the mapping.
+Matches are resolved leftmost-longest ("levocetirizin" beats "cetirizin")
+and every distinct substance in a name is reported, for combination products.
+Uses pyahocorasick when installed, else a trie-shaped regex that re runs in C.
+With fuzzy=True, names without an exact hit go through fuzzy_index.
+"""
+
+import re
+from dataclasses import dataclass
+
+import pandas as pd
+
+from fuzzy_index import TrigramIndex, fold
+
+try:
+    import ahocorasick
+except ImportError:  # optional
+    ahocorasick = None
+
+# Manufacturer tokens that confuse matching
+MANUFACTURER_RE = re.compile(r"\b(adgc|hexal|ratiopharm|al|abz|aristo|axicur|stada)\b")
+WHITESPACE_RE = re.compile(r"\s+")
+MATCH_CONFIDENCE = 0.9
+
+
+def clean_product_name(name_display: str) -> str:
+    s = MANUFACTURER_RE.sub(" ", fold(name_display))
+    return WHITESPACE_RE.sub(" ", s).strip()
+
+
+@dataclass(frozen=True)
+class SubstanceMatch:
+    key: str
+    start: int
+    end: int
+    active_substance: str
+    atc_code: str | None
+
+
+def trie_pattern(keys: list[str]) -> re.Pattern:
+    """
+    The keys as one regex shaped like their trie, e.g. cetirizin, cetirizindihydrochlorid
+    and cromoglicinsäure -> c(?:etirizin(?:dihydrochlorid)?|romoglicinsäure). Alternatives at a node differ in their first
+    character and a key that ends mid-trie is an optional (greedy) tail, so re
+    walks the trie in C and finditer yields leftmost-longest, non-overlapping hits.
+    """
+    trie: dict = {}
+    for key in keys:
+        node = trie
+        for ch in key:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node: dict) -> str:
+        alts = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not alts:
+            return ""
+        if len(alts) == 1 and "" not in node:
+            return alts[0]
+        return "(?:" + "|".join(alts) + (")?" if "" in node else ")")
+
+    return re.compile(build(trie))
+
+
+class SubstanceMatcher:
+    """Built once per mapping of {name key: {"active_substance", "atc_code"}}."""
+
+    def __init__(self, mapping: dict[str, dict], fuzzy: bool = False):
+        # Umlauts are folded on both sides, so "säure" and "saeure" match alike
+        self.values = {fold(key): value for key, value in mapping.items()}
+        keys = [key for key in self.values if key]
+        self.fuzzy = TrigramIndex(keys) if fuzzy else None
+        self._automaton = self._pattern = None
+        if not keys:
+            self.backend = "empty"
+        elif ahocorasick is not None:
+            self.backend = "pyahocorasick"
+            self._automaton = ahocorasick.Automaton()
+            for key in keys:
+                self._automaton.add_word(key, key)
+            self._automaton.make_automaton()
+        else:
+            self.backend = "trie-regex"
+            self._pattern = trie_pattern(keys)
+
+    def _spans(self, text: str):
+        """(start, end, key), leftmost-longest and non-overlapping."""
+        if self._automaton is not None:
+            for end, key in self._automaton.iter_long(text):
+                yield end - len(key) + 1, end + 1, key
+        elif self._pattern is not None:
+            for m in self._pattern.finditer(text):
+                yield m.start(), m.end(), m.group()
+
+    def find(self, cleaned_name: str) -> list[SubstanceMatch]:
+        """Leftmost-longest matches; one per distinct substance, in name order."""
+        matches, seen = [], set()
+        for start, end, key in self._spans(cleaned_name):
+            value = self.values[key]
+            if value["active_substance"] in seen:
+                continue
+            seen.add(value["active_substance"])
+            matches.append(SubstanceMatch(key, start, end, value["active_substance"], value.get("atc_code")))
+        return matches
+
+    def normalize(self, name_display: str) -> dict:
+        """
+        Same shape as normalize_active_substance; the first substance in the name
+        is primary. Fuzzy hits are ordered by score and carry its calibrated confidence.
+        """
+        cleaned = clean_product_name(name_display)
+        matches = self.find(cleaned)
+        if matches:
+            return self._row([(m.active_substance, m.atc_code) for m in matches], MATCH_CONFIDENCE)
+        if self.fuzzy is not None and (hits := self.fuzzy.search(cleaned)):
+            values = [self.values[hit.key] for hit in hits]
+            return self._row([(v["active_substance"], v.get("atc_code")) for v in values], hits[0].confidence)
+        return self._row([], 0.0)
+
+    @staticmethod
+    def _row(substances: list[tuple[str, str | None]], confidence: float) -> dict:
+        if not substances:
+            return {"active_substance": None, "atc_code": None, "confidence": 0.0, "active_substances": None}
+        names = list(dict.fromkeys(name for name, _ in substances))
+        return {
+            "active_substance": substances[0][0],
+            "atc_code": substances[0][1],
+            "confidence": confidence,
+            "active_substances": "; ".join(names),
+        }
+
+    def match_series(self, names: pd.Series) -> pd.DataFrame:
+        """Batch normalization of a name column; each distinct name is matched once."""
+        names = names.fillna("").astype(str)
+        rows = {name: self.normalize(name) for name in names.unique()}
+        return pd.DataFrame([rows[name] for name in names], index=names.index)
+
+
+_matchers: dict[tuple[int, bool], tuple[dict, int, SubstanceMatcher]] = {}
+
+
+def matcher_for(mapping: dict[str, dict], fuzzy: bool = False) -> SubstanceMatcher:
+    """The compiled matcher for a mapping, built on first use."""
+    cached = _matchers.get((id(mapping), fuzzy))
+    if cached is None or cached[0] is not mapping or cached[1] != len(mapping):
+        cached = (mapping, len(mapping), SubstanceMatcher(mapping, fuzzy))
+        _matchers[(id(mapping), fuzzy)] = cached
+    return cached[2]
+
+
+def load_substance_map(path: str) -> dict[str, dict]:
+    """CSV with columns key, active_substance, atc_code (e.g. an ATC/INN export)."""
+    df = pd.read_csv(path, dtype=str).dropna(subset=["key", "active_substance"])
+    return {
+        row.key.strip().lower(): {"active_substance": row.active_substance.strip(),
+                                  "atc_code": row.atc_code if isinstance(row.atc_code, str) else None}
+        for row in df.itertuples(index=False)
+    }
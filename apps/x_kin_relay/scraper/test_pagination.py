@@ -0,0 +1,76 @@
+"""
+Every crawl path must page through a category the same way: the plain
+async crawl, the async crawl with a parse pool and the pipelined sync crawl.
+
+    python -m pytest test_pagination.py
+"""
+
+import asyncio
+
+import pytest
+
+import scraper
+from scraper import BASE, Category, Page, ParsePool
+
+# Page 1 disagrees with itself: the regex sees a commented-out <link rel=next>,
+# a DOM parser only the anchor. Page 2 links on with an anchor alone.
+PAGES = {
+    f"{BASE}/c": """<html><head><!-- <link rel="next" href="/c?page=3"> --></head><body>
+        <a href="/p/1001">Produkt 1001</a>
+        <a rel="next" href="/c?page=2">Weiter</a></body></html>""",
+    f"{BASE}/c?page=2": """<html><body>
+        <a href="/p/1002">Produkt 1002</a>
+        <a aria-label="Nächste Seite" href="/c?page=3">Weiter</a></body></html>""",
+    f"{BASE}/c?page=3": """<html><body>
+        <a href="/p/1003">Produkt 1003</a></body></html>""",
+}
+CATEGORY = Category("Test", f"{BASE}/c")
+
+
+class PageFetcher:
+    """Serves PAGES in place of AsyncFetcher and logs what was requested."""
+
+    def __init__(self):
+        self.fetched: list[str] = []
+
+    async def get_page(self, url: str) -> Page:
+        self.fetched.append(url)
+        return Page(url, PAGES[url])
+
+    def remember_parse(self, page: Page, parsed, version: str) -> None:
+        pass
+
+
+def crawl_async(pool: ParsePool | None) -> tuple[list[str], list[str | None]]:
+    fetcher = PageFetcher()
+    next_urls = []
+    asyncio.run(scraper.scrape_category_async(
+        CATEGORY, fetcher, pool=pool, on_page=lambda products, next_url: next_urls.append(next_url),
+    ))
+    return fetcher.fetched, next_urls
+
+
+@pytest.mark.parametrize("parser", ["bs4", "auto"])
+def test_pool_pages_like_plain_crawl(parser, monkeypatch):
+    monkeypatch.setattr(scraper, "LISTING_PARSER", parser)
+    plain = crawl_async(None)
+    with ParsePool(2, parser) as pool:
+        pooled = crawl_async(pool)
+    assert pooled == plain
+    fetched, next_urls = plain
+    assert next_urls[-1] is None
+    assert next_urls[:-1] == fetched[1:]
+
+
+def test_pipelined_sync_crawl_pages_like_async_crawl(monkeypatch):
+    monkeypatch.setattr(scraper, "LISTING_PARSER", "bs4")
+    fetched = []
+
+    def get_html(url, session):
+        fetched.append(url)
+        return PAGES[url]
+
+    monkeypatch.setattr(scraper, "get_html", get_html)
+    with ParsePool(2, "bs4") as pool:
+        scraper.scrape_category_pipelined(CATEGORY, None, pool, sleep_s=0)
+    assert fetched == crawl_async(None)[0]